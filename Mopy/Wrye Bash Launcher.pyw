@@ -84,6 +84,9 @@ if not hasattr(sys,'frozen'):
     sys.meta_path = [UnicodeImporter()]
 
 if __name__ == '__main__':
+    # Standalone builds need this for ModFile.load's parse workers
+    import multiprocessing
+    multiprocessing.freeze_support()
     from bash import bash, barg
     opts = barg.parse()
     bash.main(opts)
@@ -66,7 +66,7 @@
 import wx
 
 #--Local
-from .. import bush, bosh, bolt, bass, env, load_order, archives
+from .. import bush, bosh, bolt, bass, env, load_order, archives, brec
 from ..bolt import GPath, SubProgress, deprint, round_size
 from ..bosh import omods
 from ..cint import CBashApi
@@ -4031,6 +4031,7 @@ def on_closing(self, destroy=True):
     def SaveSettings(self, destroy=False):
         """Save application data."""
         # Purge some memory
+        brec.clear_long_fids()
         bolt.GPathPurge()
         # Clean out unneeded settings
         self.CleanSettings()
@@ -30,7 +30,7 @@
 import time
 from datetime import timedelta
 from . import BashFrame ##: drop this - decouple !
-from .. import balt, bass, bolt, bosh, bush, env, load_order
+from .. import balt, bass, bolt, bosh, brec, bush, env, load_order
 from ..balt import Link, Resources, HorizontalLine
 from ..bolt import SubProgress, GPath, Path
 from ..exception import BoltError, CancelError, FileEditError, \
@@ -173,7 +173,7 @@ def ShowPatcher(self,patcher):
     def PatchExecute(self): # TODO(ut): needs more work to reduce P/C differences to an absolute minimum
         """Do the patch."""
         self.accept_modal()
-        patchFile = progress = None
+        patchFile = progress = profiler = None
         try:
             patch_name = self.patchInfo.name
             patch_size = self.patchInfo.size
@@ -186,6 +186,9 @@ def PatchExecute(self): # TODO(ut): needs more work to reduce P/C differences to
             patchers = [p for p in self._gui_patchers if p.isEnabled]
             patchFile = CBash_PatchFile(patch_name, patchers) if self.doCBash \
                    else PatchFile(self.patchInfo, patchers)
+            if not self.doCBash and bass.inisettings['ProfileBashedPatch']:
+                profiler = brec.RecordProfiler()
+                profiler.enable()
             patchFile.init_patchers_data(SubProgress(progress, 0, 0.1)) #try to speed this up!
             if self.doCBash:
                 #try to speed this up!
@@ -204,6 +207,7 @@ def PatchExecute(self): # TODO(ut): needs more work to reduce P/C differences to
                 progress.setCancel(False, patch_name.s+u'\n'+_(u'Saving...'))
                 progress(0.9)
                 self._save_pbash(patchFile, patch_name)
+                if profiler: self._save_profile(profiler, patch_name)
             #--Done
             progress.Destroy(); progress = None
             timer2 = time.clock()
@@ -292,6 +296,8 @@ def PatchExecute(self): # TODO(ut): needs more work to reduce P/C differences to
                 except:
                     bolt.deprint(u'Failed to close CBash collection',
                                  traceback=True)
+            else: brec.clear_long_fids() # the patch's fids aren't needed now
+            if profiler: profiler.disable()
             if progress: progress.Destroy()
 
     def _save_pbash(self, patchFile, patch_name):
@@ -300,7 +306,8 @@ def _save_pbash(self, patchFile, patch_name):
                 # FIXME will keep displaying a bogus UAC prompt if file is
                 # locked - aborting bogus UAC dialog raises SkipError() in
                 # shellMove, not sure if ever a Windows or Cancel are raised
-                patchFile.safeSave()
+                patchFile.safeSave(compression_level=bass.inisettings[
+                    'BashedPatchCompressionLevel'], threaded_compress=True)
                 return
             except (CancelError, SkipError, OSError) as werr:
                 if isinstance(werr, OSError) and werr.errno != errno.EACCES:
@@ -309,6 +316,20 @@ def _save_pbash(self, patchFile, patch_name):
                     continue
                 raise # will raise the SkipError which is correctly processed
 
+    @staticmethod
+    def _save_profile(profiler, patch_name):
+        """Logs the stats collected while building the patch and saves them
+        to a JSON file in the game's My Games folder."""
+        profiler.disable()
+        bolt.deprint(u'Bashed Patch profile:\n' + u'\n'.join(
+            profiler.get_report()))
+        profile_path = bass.dirs['saveBase'].join(
+            patch_name.sroot + u'.profile.json')
+        try:
+            profiler.save_json(profile_path)
+        except (IOError, OSError):
+            bolt.deprint(u'Failed to save %s' % profile_path, traceback=True)
+
     def _save_cbash(self, patchFile, patch_name):
         patchFile.save()
         patchTime = self.patchInfo.mtime
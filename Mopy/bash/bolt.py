@@ -26,6 +26,8 @@
 #--Standard
 from __future__ import division, print_function
 import StringIO
+import array
+import bisect
 import cPickle as pickle  # PY3
 import chardet
 import codecs
@@ -34,6 +36,7 @@
 import csv
 import datetime
 import errno
+import mmap
 import os
 import re
 import shutil
@@ -60,6 +63,23 @@
 struct_pack = struct.pack
 struct_unpack = struct.unpack
 
+# Precompiled structs, keyed by format string. The struct module's own cache
+# is wiped whenever it holds 100 formats, which the record definitions alone
+# exceed - so it would be rebuilt constantly while loading plugins
+_struct_cache = {}
+def get_struct(fmt):
+    """Return a precompiled struct.Struct for the specified format.
+
+    :rtype: struct.Struct"""
+    try:
+        return _struct_cache[fmt]
+    except KeyError:
+        # Formats built at runtime (e.g. '%uI' for arrays) could make this
+        # grow without bound, so start over once it gets too big
+        if len(_struct_cache) >= 2048: _struct_cache.clear()
+        compiled = _struct_cache[fmt] = struct.Struct(fmt)
+        return compiled
+
 #-- To make commands executed with Popen hidden
 startupinfo = None
 if os.name == u'nt':
@@ -1951,19 +1971,82 @@ def __call__(self,state,message=u''):
         self.state = state
 
 #------------------------------------------------------------------------------
-def readCString(ins, file_path):
-    """Read null terminated string, dropping the final null byte."""
-    byte_list = []
-    for b in iter(partial(ins.read, 1), ''):
-        if b == '\0': break
-        byte_list.append(b)
-    else:
-        raise exception.FileError(file_path,
-                                  u'Reached end of file while expecting null')
-    return ''.join(byte_list)
+class _StringsFile(object):
+    """A memory-mapped .STRINGS, .DLSTRINGS or .ILSTRINGS file, see
+    StringTable. Its directory is kept in two arrays, sorted by string id."""
+    __slots__ = ('path', 'ids', '_offsets', '_mapped', '_strings_start',
+                 '_formatted', '_backup_encoding')
+
+    def __init__(self, path, mapped, ids, offsets, strings_start, formatted,
+                 backup_encoding):
+        self.path = path
+        self.ids = ids
+        self._offsets = offsets
+        self._mapped = mapped
+        self._strings_start = strings_start
+        self._formatted = formatted
+        self._backup_encoding = backup_encoding
+
+    def has_string(self, id_):
+        """Returns True if this file has a string with the specified id."""
+        ids = self.ids
+        index = bisect.bisect_left(ids, id_)
+        return index < len(ids) and ids[index] == id_
+
+    def get_string(self, id_):
+        """Returns the decoded string with the specified id, or None if this
+        file has no such string (or it can't be read)."""
+        ids = self.ids
+        # The last entry for id_ wins, as it would when reading them in order
+        index = bisect.bisect_right(ids, id_) - 1
+        if index < 0 or ids[index] != id_: return None
+        mapped = self._mapped
+        pos = self._strings_start + self._offsets[index]
+        try:
+            if self._formatted:
+                size, = _uint32_struct.unpack_from(mapped, pos)
+                value = cstrip(mapped[pos + 4:pos + 4 + size])
+            else:
+                end = mapped.find('\x00', pos)
+                if end == -1:
+                    raise exception.FileError(self.path,
+                        u'Reached end of file while expecting null')
+                value = mapped[pos:end]
+        except (struct.error, exception.FileError):
+            deprint(u'Error reading string %d from %s (offset %d)' % (
+                id_, self.path, pos), traceback=True)
+            return None
+        try:
+            return unicode(value, 'utf-8')
+        except UnicodeDecodeError:
+            pass
+        try:
+            return unicode(value, self._backup_encoding)
+        except UnicodeDecodeError:
+            deprint(u'Error decoding string %d from %s (offset %d)' % (
+                id_, self.path, pos), traceback=True)
+            return None
+
+    def unmap(self):
+        """Copies the file into memory and closes its map."""
+        if isinstance(self._mapped, mmap.mmap):
+            mapped, self._mapped = self._mapped, self._mapped[:]
+            mapped.close()
 
-class StringTable(dict):
-    """For reading .STRINGS, .DLSTRINGS, .ILSTRINGS files."""
+    def close(self):
+        if isinstance(self._mapped, mmap.mmap):
+            self._mapped.close()
+        self._mapped = ''
+
+_uint32_struct = get_struct(u'I')
+_strings_header_struct = get_struct(u'=2I')
+
+class StringTable(object):
+    """For reading .STRINGS, .DLSTRINGS, .ILSTRINGS files. Maps string ids to
+    strings like a dict, but the files are memory-mapped and only their
+    directories are read on load - strings are decoded when looked up.
+    Strings can be set like in a dict as well, they are kept until a file
+    with the same id is loaded, or the table is cleared."""
     encodings = {
         # Encoding to fall back to if UTF-8 fails, based on language
         # Default is 1252 (Western European), so only list languages
@@ -1971,6 +2054,11 @@ class StringTable(dict):
         u'russian': 'cp1251',
         }
 
+    def __init__(self):
+        self._decoded = {}
+        self._assigned = {} # strings set via __setitem__, see loadFile
+        self._files = [] # later files take precedence, see loadFile
+
     def load(self, modFilePath, lang=u'English', progress=Progress()):
         baseName = modFilePath.tail.body
         baseDir = modFilePath.head.join(u'Strings')
@@ -1984,62 +2072,110 @@ def load(self, modFilePath, lang=u'English', progress=Progress()):
             self.loadFile(file,SubProgress(progress,i,i+1))
 
     def loadFile(self, path, progress, lang=u'english'):
-        formatted = path.cext != u'.strings'
+        """Maps the specified strings file and reads its directory. Its
+        strings override strings with the same ids from files loaded
+        earlier - including ones set since."""
+        formatted = path.ext.lower() != u'.strings'
         backupEncoding = self.encodings.get(lang.lower(), 'cp1252')
         try:
             with open(path.s, 'rb') as ins:
-                insSeek = ins.seek
-                insTell = ins.tell
-
-                insSeek(0,os.SEEK_END)
-                eof = insTell()
-                insSeek(0)
-                if eof < 8:
-                    deprint(u"Warning: Strings file '%s' file size (%d) is "
-                            u"less than 8 bytes.  8 bytes are the minimum "
-                            u"required by the expected format, assuming the "
-                            u"Strings file is empty." % (path, eof))
-                    return
-
-                numIds,dataSize = unpack_many(ins, '=2I')
-                progress.setFull(max(numIds,1))
-                stringsStart = 8 + (numIds*8)
-                if stringsStart != eof-dataSize:
-                    deprint(u"Warning: Strings file '%s' dataSize element "
-                            u"(%d) results in a string start location of %d, "
-                            u"but the expected location is %d"
-                            % (path, dataSize, eof-dataSize, stringsStart))
-
-                id_ = -1
-                offset = -1
-                for x in xrange(numIds):
-                    try:
-                        progress(x)
-                        id_,offset = unpack_many(ins, '=2I')
-                        pos = insTell()
-                        insSeek(stringsStart+offset)
-                        if formatted:
-                            value = unpack_str32(ins) # TODO(ut): unpack_str32_null
-                            # seems needed, strings are null terminated
-                            value = cstrip(value)
-                        else:
-                            value = readCString(ins, path) #drops the null byte
-                        try:
-                            value = unicode(value,'utf-8')
-                        except UnicodeDecodeError:
-                            value = unicode(value,backupEncoding)
-                        insSeek(pos)
-                        self[id_] = value
-                    except:
-                        deprint(u'Error reading string file:')
-                        deprint(u'id:', id_)
-                        deprint(u'offset:', offset)
-                        deprint(u'filePos:',  insTell())
-                        raise
+                try:
+                    mapped = mmap.mmap(ins.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+                except ValueError: # empty file, those can't be mapped
+                    mapped = ''
+            eof = len(mapped)
+            if eof < 8:
+                deprint(u"Warning: Strings file '%s' file size (%d) is "
+                        u"less than 8 bytes.  8 bytes are the minimum "
+                        u"required by the expected format, assuming the "
+                        u"Strings file is empty." % (path, eof))
+                return
+            numIds,dataSize = _strings_header_struct.unpack_from(mapped)
+            progress.setFull(1)
+            stringsStart = 8 + (numIds*8)
+            if stringsStart != eof-dataSize:
+                deprint(u"Warning: Strings file '%s' dataSize element "
+                        u"(%d) results in a string start location of %d, "
+                        u"but the expected location is %d"
+                        % (path, dataSize, eof-dataSize, stringsStart))
+            # The directory is an array of (id, offset) uint32 pairs
+            directory = array.array('I', mapped[8:stringsStart])
+            if sys.byteorder != 'little': directory.byteswap()
+            ids, offsets = directory[0::2], directory[1::2]
+            sorted_ids = sorted(ids)
+            if sorted_ids != ids.tolist():
+                # sorted is stable, so duplicate ids keep their order
+                order = sorted(xrange(len(ids)), key=ids.__getitem__)
+                ids = array.array('I', sorted_ids)
+                offsets = array.array('I', [offsets[i] for i in order])
+            strings_file = _StringsFile(path, mapped, ids, offsets,
+                                        stringsStart, formatted, backupEncoding)
+            self._files.append(strings_file)
+            self._decoded.clear() # may be overridden by the new file
+            assigned = self._assigned
+            for id_ in [i for i in assigned if strings_file.has_string(i)]:
+                del assigned[id_]
+            progress(1)
         except:
             deprint(u'Error loading string file:', path.stail, traceback=True)
             return
 
+    def unmap(self):
+        """Copies the files the strings come from into memory and closes
+        their maps, so that they aren't kept open (and locked on Windows)
+        while strings may still be looked up."""
+        for strings_file in self._files:
+            strings_file.unmap()
+
+    def clear(self):
+        """Forgets all strings and closes the files they came from."""
+        self._decoded.clear()
+        self._assigned.clear()
+        for strings_file in self._files:
+            strings_file.close()
+        del self._files[:]
+
+    #--Dict emulation
+    def get(self, id_, default=None):
+        try:
+            return self._decoded[id_]
+        except KeyError:
+            pass
+        try:
+            return self._assigned[id_]
+        except KeyError:
+            pass
+        for strings_file in reversed(self._files):
+            value = strings_file.get_string(id_)
+            if value is not None:
+                self._decoded[id_] = value
+                return value
+        return default
+
+    def __getitem__(self, id_):
+        value = self.get(id_)
+        if value is None: raise KeyError(id_)
+        return value
+
+    def __setitem__(self, id_, value):
+        self._assigned[id_] = self._decoded[id_] = value
+
+    def __contains__(self, id_):
+        return self.get(id_) is not None
+
+    def __iter__(self):
+        all_ids = set(self._assigned)
+        for strings_file in self._files:
+            all_ids.update(strings_file.ids)
+        return iter(all_ids)
+
+    def __len__(self):
+        return sum(1 for _id in self)
+
+    def __nonzero__(self):
+        return bool(self._assigned or any(f.ids for f in self._files))
+
 #------------------------------------------------------------------------------
 _digit_re = re.compile(u'([0-9]+)')
 
@@ -58,7 +58,7 @@
     SaveFileError, SaveHeaderError, SkipError, StateError
 from ..ini_files import IniFile, OBSEIniFile, DefaultIniFile, GameIni, \
     get_ini_type_and_encoding
-from ..parsers import ModFile
+from ..parsers import ModFile, ModHeaderReader
 
 # Singletons, Constants -------------------------------------------------------
 #--Constants
@@ -384,7 +384,7 @@ def get_extension(self):
     def has_esm_flag(self):
         """Check if the mod info is a master file based on master flag -
         header must be set"""
-        return int(self.header.flags1) & 1 == 1
+        return self.header.flags1_int & 1 == 1
 
     def is_esl(self):
         """Check if this is a light plugin - .esl files are automatically
@@ -399,7 +399,7 @@ def isInvertedMod(self):
             raise ArgumentError(
                 u'isInvertedMod: %s - only esm/esp allowed' % mod_ext)
         return (self.header and
-                mod_ext != (u'.esp', u'.esm')[int(self.header.flags1) & 1])
+                mod_ext != (u'.esp', u'.esm')[self.header.flags1_int & 1])
 
     def setType(self, esm_or_esp):
         """Sets the file's internal type."""
@@ -442,6 +442,56 @@ def crc_string(self):
         except TypeError: # None, should not happen so let it show
             return u'UNKNOWN!'
 
+    # Bump whenever the pickled format of ModHeaderIndex changes
+    _header_index_version = 2
+
+    @staticmethod
+    def header_index_path(mod_name):
+        """Return the path the record index of the specified plugin is cached
+        at, see get_header_index."""
+        return dirs['modsBash'].join(u'Record Index', mod_name.s + u'.idx')
+
+    def get_header_index(self, read_eids=False, skip_eid_groups=frozenset(),
+                         progress=None):
+        """Return a ModHeaderIndex of this plugin. EDIDs are only guaranteed
+        to be included if read_eids is True, since reading them means
+        decompressing every compressed record - except for the records in the
+        top groups with the signatures in skip_eid_groups. The index is cached
+        in modsBash\\Record Index and only reread if the plugin changed since
+        - same stat check as _file_changed, plus the crc. progress is only
+        updated if the plugin has to be read.
+
+        :rtype: parsers.ModHeaderIndex"""
+        read_args = (self, read_eids, skip_eid_groups, progress)
+        cache_path = self.header_index_path(self.name)
+        stat_tuple = self._stat_tuple()
+        if self._file_changed(stat_tuple): # not refreshed yet, don't cache
+            return ModHeaderReader.read_header_index(*read_args)
+        cache_key = (self._header_index_version, self.name.s, stat_tuple,
+                     self.cached_mod_crc())
+        try:
+            with cache_path.open('rb') as ins:
+                if pickle.load(ins) == cache_key:
+                    header_index = pickle.load(ins)
+                    # An index with (more) EDIDs serves both kinds of callers
+                    if not read_eids or (header_index.eids is not None and
+                            header_index.eids_skipped <= skip_eid_groups):
+                        return header_index
+        except (IOError, OSError, EOFError, ValueError, TypeError,
+                AttributeError, pickle.UnpicklingError):
+            pass # missing, corrupt or outdated - reread it below
+        header_index = ModHeaderReader.read_header_index(*read_args)
+        try:
+            cache_path.head.makedirs()
+            with cache_path.temp.open('wb') as out:
+                pickle.dump(cache_key, out, -1)
+                pickle.dump(header_index, out, -1)
+            cache_path.untemp()
+        except (IOError, OSError):
+            deprint(u'Failed to cache the record index of %s' % self.name,
+                    traceback=True)
+        return header_index
+
     def setmtime(self, set_time=0, crc_changed=False):
         """Set mtime and if crc_changed is True recalculate the crc."""
         set_time = FileInfo.setmtime(self, set_time)
@@ -1930,6 +1980,8 @@ def refresh(self, refresh_infos=True, booting=False, _modTimesChange=False):
             change = FileInfos.refresh(self, booting=booting)
             if change: _added, _updated, deleted = change
             hasChanged = bool(change)
+            # Plugins may have been removed while we were not running
+            if booting: self._evict_header_indexes()
         # If refresh_infos is False and mods are added _do_ manually refresh
         _modTimesChange = _modTimesChange and not load_order.using_txt_file()
         lo_changed = self.refreshLoadOrder(
@@ -2510,6 +2562,7 @@ def _rename_operation(self, oldName, newName):
         if isSelected:
             self.lo_deactivate(oldName, doSave=False) # will save later
         super(ModInfos, self)._rename_operation(oldName, newName)
+        self._evict_header_indexes([oldName])
         # rename in load order caches
         oldIndex = self._lo_wip.index(oldName)
         self._lo_caches_remove_mods([oldName])
@@ -2542,6 +2595,7 @@ def delete_refresh(self, deleted, paths_to_keys, check_existence,
         deleted = super(ModInfos, self).delete_refresh(deleted, paths_to_keys,
                                                        check_existence)
         if not deleted: return
+        self._evict_header_indexes(deleted)
         # temporarily track deleted mods so BAIN can update its UI
         if _in_refresh: return
         self._lo_caches_remove_mods(deleted)
@@ -2551,6 +2605,21 @@ def delete_refresh(self, deleted, paths_to_keys, check_existence,
         self._refreshMissingStrings()
         self._refreshMergeable()
 
+    def _evict_header_indexes(self, mod_names=None):
+        """Removes the cached record indexes of the specified plugins - by
+        default, of all plugins that are gone. See ModInfo.get_header_index.
+        """
+        if mod_names is None:
+            cached_names = (GPath(f.sroot) for f in dirs['modsBash'].join(
+                u'Record Index').list() if f.cext == u'.idx')
+            mod_names = [m for m in cached_names if m not in self]
+        for mod_name in mod_names:
+            try:
+                ModInfo.header_index_path(mod_name).remove()
+            except OSError:
+                deprint(u'Failed to remove the cached record index of %s' %
+                        mod_name, traceback=True)
+
     def _additional_deletes(self, fileInfo, toDelete):
         super(ModInfos, self)._additional_deletes(fileInfo, toDelete)
         # Add ghosts - the file may exist in both states (bug, or user mistake)
@@ -3187,6 +3256,9 @@ def initDefaultSettings():
     inisettings['PromptActivateBashedPatch'] = True
     inisettings['WarnTooManyFiles'] = True
     inisettings['SkippedBashInstallersDirs'] = u''
+    inisettings['BashedPatchCompressionLevel'] = 6
+    inisettings['ProfileBashedPatch'] = False
+    inisettings['PatchParseProcesses'] = 0
 
 def initOptions(bashIni):
     initDefaultTools()
@@ -3233,6 +3305,12 @@ def initOptions(bashIni):
                 elif compValue != compDefaultValue:
                     usedSettings[usedKey] = value
 
+    # zlib only accepts -1 (its default) to 9, don't fail after building
+    compression_level = inisettings['BashedPatchCompressionLevel']
+    if not -1 <= compression_level <= 9:
+        deprint(u'Invalid iBashedPatchCompressionLevel %d, using 6 instead'
+                % compression_level)
+        inisettings['BashedPatchCompressionLevel'] = 6
     tooldirs['Tes4ViewPath'] = tooldirs['Tes4EditPath'].head.join(u'TES4View.exe')
     tooldirs['Tes4TransPath'] = tooldirs['Tes4EditPath'].head.join(u'TES4Trans.exe')
 
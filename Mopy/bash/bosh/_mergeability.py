@@ -25,10 +25,11 @@
 import os
 from .. import bass, bush
 from ..bolt import GPath
+from ..brec import MreRecord
 from ..cint import ObCollection
 from ..exception import ModError
 from ..load_order import cached_is_active
-from ..parsers import LoadFactory, ModFile, ModHeaderReader
+from ..parsers import LoadFactory, ModFile
 
 def _is_mergeable_no_load(modInfo, reasons):
     verbose = reasons is not None
@@ -105,7 +106,7 @@ def isPBashMergeable(modInfo, minfos, reasons):
     for top_type,block in modFile.tops.iteritems():
         for record in block.getActiveRecords():
             if record.fid >> 24 >= lenMasters:
-                if record.flags1.deleted: continue #if new records exist but are deleted just skip em.
+                if record.flags1_int & MreRecord.deleted_mask: continue #if new records exist but are deleted just skip em.
                 if not verbose: return False
                 newblocks.append(top_type)
                 break
@@ -136,25 +137,19 @@ def is_esl_capable(modInfo, _minfos, reasons):
                     return value of this method is of interest.
     :return: True if the specified mod could be flagged as ESL."""
     verbose = reasons is not None
-    record_headers = {}
+    record_fids = []
     try:
-        record_headers = ModHeaderReader.read_mod_headers(modInfo)
+        record_fids = modInfo.get_header_index().record_fids()
     except ModError as e:
         if not verbose: return False
         reasons.append(u'%s.' % e)
-    # Check for new FormIDs greater then 0xFFF
-    num_masters = len(modInfo.header.masters)
-    has_new_recs = False
-    for _rec_type, rec_headers in record_headers.iteritems():
-        for header in rec_headers:
-            if header.fid >> 24 >= num_masters:
-                if (header.fid & 0xFFFFFF) > 0xFFF:
-                    has_new_recs = True
-                    break
-        if has_new_recs:
-            if not verbose: return False
-            reasons.append(_(u'New FormIDs greater than 0xFFF.'))
-            break
+    # Check for new FormIDs greater then 0xFFF - new records are the ones
+    # with a mod index >= num_masters
+    first_new_fid = len(modInfo.header.masters) << 24
+    if any(fid >= first_new_fid and (fid & 0xFFFFFF) > 0xFFF
+           for fid in record_fids):
+        if not verbose: return False
+        reasons.append(_(u'New FormIDs greater than 0xFFF.'))
     return False if reasons else True
 
 def _modIsMergeableLoad(modInfo, minfos, reasons):
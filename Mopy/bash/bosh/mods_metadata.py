@@ -29,7 +29,7 @@
 from .loot_parser import libloot_version, LOOTParser
 from .. import balt, bolt, bush, bass, load_order
 from ..bolt import GPath, deprint, sio, struct_pack, struct_unpack
-from ..brec import ModReader, MreRecord, RecordHeader
+from ..brec import ModReader, MemoryModReader, MreRecord, RecordHeader
 from ..cint import ObBaseRecord, ObCollection
 from ..exception import BoltError, CancelError, ModError
 
@@ -344,6 +344,11 @@ class ModCleaner(object):
     FOG     = 0x04  # Nvidia Fog Fix
     ALL = UDR|ITM|FOG
     DEFAULT = UDR|ITM
+    # Record types that can be UDRs
+    _udr_sigs = {'ACRE',               #--Oblivion only
+                 'ACHR', 'REFR',       #--Both
+                 'NAVM', 'PHZD', 'PGRE', #--Skyrim only
+                 }
 
     class UdrInfo(object):
         # UDR info
@@ -540,7 +545,19 @@ def _scan_Python(modInfos,what,progress,detailed=False):
             #--UDR stuff
             udr = {}
             parents_to_scan = {}
-            if len(modInfo.masterNames) > 0:
+            if len(modInfo.masterNames) > 0 and not (detailed or doFog):
+                # Record headers are all we need - use the cached index
+                try:
+                    header_index = modInfo.get_header_index()
+                    fids, flags = header_index.fids, header_index.flags
+                    for j, rtype in enumerate(header_index.signatures):
+                        if flags[j] & 0x20 and rtype in ModCleaner._udr_sigs:
+                            udr[fids[j]] = ModCleaner.UdrInfo(fids[j])
+                except (ModError, OSError, IOError):
+                    deprint(u'Error scanning %s:\n' % modInfo.name.s,
+                            traceback=True)
+                    udr = itm = fog = None
+            elif len(modInfo.masterNames) > 0:
                 subprogress = bolt.SubProgress(progress,i,i+1)
                 if detailed:
                     subprogress.setFull(max(modInfo.size*2,1))
@@ -553,7 +570,7 @@ def _scan_Python(modInfos,what,progress,detailed=False):
                 parentFid = None
                 parentParentFid = None
                 # Location (Interior = #, Exteror = (X,Y)
-                with ModReader(modInfo.name,path.open('rb')) as ins:
+                with MemoryModReader.from_path(modInfo.name, path) as ins:
                     try:
                         insAtEnd = ins.atEnd
                         insTell = ins.tell
@@ -589,11 +606,8 @@ def _scan_Python(modInfos,what,progress,detailed=False):
                                     else: # 3,4,5,7 - Topic Children
                                         pass
                             else:
-                                if doUDR and header.flags1 & 0x20 and rtype in (
-                                    'ACRE',               #--Oblivion only
-                                    'ACHR','REFR',        #--Both
-                                    'NAVM','PHZD','PGRE', #--Skyrim only
-                                    ):
+                                if doUDR and header.flags1 & 0x20 and \
+                                        rtype in ModCleaner._udr_sigs:
                                     if not detailed:
                                         udr[header.fid] = ModCleaner.UdrInfo(header.fid)
                                     else:
@@ -877,47 +891,27 @@ def __init__(self):
         self.group_records = {} #--group_records[group] = [(fid0,eid0),(fid1,eid1),...]
 
     def readFromMod(self, modInfo, progress=None):
-        """Extracts details from mod file."""
-        def getRecordReader(flags, size):
-            """Decompress record data as needed."""
-            if not MreRecord.flags1_(flags).compressed:
-                return ins,ins.tell()+size
-            else:
-                import zlib
-                sizeCheck, = struct_unpack('I', ins.read(4))
-                decomp = zlib.decompress(ins.read(size-4))
-                if len(decomp) != sizeCheck:
-                    raise ModError(ins.inName,
-                        u'Mis-sized compressed data. Expected %d, got %d.' % (size,len(decomp)))
-                reader = ModReader(modInfo.name,sio(decomp))
-                return reader,sizeCheck
+        """Extracts details from mod file, via its cached record index."""
         progress = progress or bolt.Progress()
+        # The records of these groups are not shown, don't read their EDIDs
+        skipped_groups = frozenset(('CELL', 'WRLD', 'DIAL'))
+        header_index = modInfo.get_header_index(
+            read_eids=True, skip_eid_groups=skipped_groups, progress=progress)
+        fids, eids = header_index.fids, header_index.eids
+        parents = header_index.parents
         group_records = self.group_records = {}
-        records = group_records[bush.game.Esp.plugin_header_sig] = []
-        with ModReader(modInfo.name,modInfo.getPath().open('rb')) as ins:
-            while not ins.atEnd():
-                header = ins.unpackRecHeader()
-                recType, rec_siz = header.recType, header.size
-                if recType == 'GRUP':
-                    # FIXME(ut): monkey patch for fallout QUST GRUP
-                    if bush.game.fsName == u'Fallout4' and header.groupType == 10:
-                        ins.seek(rec_siz - header.__class__.rec_header_size, 1)
-                        continue
-                    label = header.label
-                    progress(1.0*ins.tell()/modInfo.size,_(u"Scanning: ")+label)
-                    records = group_records.setdefault(label,[])
-                    if label in ('CELL', 'WRLD', 'DIAL'): # skip these groups
-                        ins.seek(rec_siz - header.__class__.rec_header_size, 1)
-                elif recType != 'GRUP':
-                    eid = u''
-                    nextRecord = ins.tell() + rec_siz
-                    recs, endRecs = getRecordReader(header.flags1, rec_siz)
-                    while recs.tell() < endRecs:
-                        (recType, rec_siz) = recs.unpackSubHeader()
-                        if recType == 'EDID':
-                            eid = recs.readString(rec_siz)
-                            break
-                        recs.seek(rec_siz, 1)
-                    records.append((header.fid,eid))
-                    ins.seek(nextRecord)
-        del group_records[bush.game.Esp.plugin_header_sig]
+        # Maps the index of each top group to the list its records go into,
+        # or to None for the groups we skip. Records in nested groups are
+        # skipped too (e.g. the QUST children of Fallout 4).
+        top_records = {}
+        for i, rec_sig in enumerate(header_index.signatures):
+            parent = parents[i]
+            if rec_sig == b'GRUP':
+                if parent != -1: continue
+                label = struct_pack('=I', fids[i])
+                records = group_records.setdefault(label, [])
+                top_records[i] = None if label in skipped_groups else records
+            else:
+                records = top_records.get(parent)
+                if records is not None:
+                    records.append((fids[i], eids[i]))
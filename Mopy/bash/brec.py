@@ -25,17 +25,25 @@
 """This module contains all of the basic types used to read ESP/ESM mod files.
 """
 from __future__ import division, print_function
+import array
 import cPickle as pickle  # PY3
 import copy
+import json
+import keyword
+import mmap
 import os
 import re
 import struct
 import zlib
-from operator import attrgetter
+from functools import partial
+from itertools import imap, islice, izip
+from operator import attrgetter, itemgetter
+from timeit import default_timer
 
 from . import bolt
 from . import exception
-from .bolt import decode, encode, sio, GPath, struct_pack, struct_unpack
+from .bolt import decode, encode, sio, GPath, struct_pack, struct_unpack, \
+    get_struct
 
 # Util Functions --------------------------------------------------------------
 #--Type coercion
@@ -87,10 +95,118 @@ def getFormIndices(fid):
     """Returns tuple of modIndex and ObjectIndex of fid."""
     return int(fid >> 24),int(fid & 0x00FFFFFF)
 
+#--Long fids - (master name, objectIndex) tuples - are interned: there is a
+# single tuple per FormID, shared by all plugins referencing it, so that sets
+# and dicts of long fids don't hold copies and mostly compare them by identity
+_long_fids = {} # master name -> {objectIndex -> long fid}
+
+def get_long_fids(master):
+    """Returns the dict mapping object indices of the specified master (a
+    bolt.Path) to its interned long fids. Used by ModFile.getLongMapper."""
+    try:
+        return _long_fids[master]
+    except KeyError:
+        return _long_fids.setdefault(master, {})
+
+def clear_long_fids():
+    """Forgets all interned long fids - e.g. once a patch is built."""
+    _long_fids.clear()
+
+class FidCache(dict):
+    """Memo for a fid mapper, so that each distinct fid only gets mapped
+    once. Pass its __getitem__ on as the mapper - for fids that were already
+    mapped, that costs a dict lookup instead of a python call."""
+    __slots__ = ('_mapper',)
+
+    def __init__(self, mapper):
+        super(FidCache, self).__init__()
+        self._mapper = mapper
+
+    def __missing__(self, fid):
+        self[fid] = mapped = self._mapper(fid)
+        return mapped
+
+#--Code generation
+_plain_attr = re.compile(u'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def _is_plain_attr(attr):
+    """Returns True if attr can be written as-is in generated source code."""
+    return bool(_plain_attr.match(attr)) and not keyword.iskeyword(attr)
+
+def _compile_function(func_name, func_globals, func_args, func_body):
+    """Compiles a function from the specified lines of source code. The
+    function can use the names defined in func_globals."""
+    func_source = u'def %s(%s):\n%s\n' % (func_name, func_args, u'\n'.join(
+        u'    ' + line for line in func_body))
+    exec(compile(func_source, u'<generated %s>' % func_name, u'exec'),
+         func_globals)
+    return func_globals[func_name]
+
 # Mod I/O ---------------------------------------------------------------------
+# Formats that never change between games - see RecordHeader for the others
+_uint32_struct = get_struct(u'I')
+_xxxx_header_struct = get_struct(u'=4sHI')
+_compressed_flag = 0x00040000 # see MreRecord.flags1_
+
+def _decompress(inName, data):
+    """Decompresses the data of a compressed record. The first four bytes of
+    data hold the size of the decompressed data."""
+    size, = _uint32_struct.unpack(data[:4])
+    decomp = zlib.decompress(data[4:])
+    if len(decomp) != size:
+        raise exception.ModError(inName,
+            u'Mis-sized compressed data. Expected %d, got %d.'
+                                 % (size,len(decomp)))
+    return decomp
+
+def _compress(data, compression_level=6):
+    """Compresses the data of a record, prepending the size of the
+    uncompressed data as the game expects."""
+    return struct_pack('=I', len(data)) + zlib.compress(data,
+                                                        compression_level)
+
+def _decompress_chunk(inName, chunk):
+    """Decompresses a list of compressed record datas - runs in a worker
+    thread, see MemoryModReader.prefetch_decompressed."""
+    return [_decompress(inName, data) for data in chunk]
+
+#--Decoding of plugin strings - EDIDs, names, model paths etc. are nearly
+# always plain ASCII and are repeated all over a load order, so they are
+# decoded directly and the results of short ones are cached and shared
+_decoded_strings = {}
+_decoded_strings_encoding = None # the bolt.pluginEncoding they were decoded with
+_max_cached_len = 256 # longer strings (descriptions, etc.) aren't cached
+_max_cached_strings = 65536
+
+def _decode_plugin_string(byte_str):
+    """Decodes a zero-terminated string read from a plugin using
+    bolt.pluginEncoding, see ModReader.readString."""
+    global _decoded_strings_encoding
+    if _decoded_strings_encoding != bolt.pluginEncoding:
+        _decoded_strings.clear()
+        _decoded_strings_encoding = bolt.pluginEncoding
+    try:
+        return _decoded_strings[byte_str]
+    except KeyError:
+        pass
+    stripped = bolt.cstrip(byte_str)
+    try:
+        # ASCII decodes the same in all encodings we may use
+        decoded = unicode(stripped, 'ascii')
+    except UnicodeDecodeError:
+        decoded = u'\n'.join(decode(x, bolt.pluginEncoding,
+                                    avoidEncodings=('utf8', 'utf-8'))
+                             for x in stripped.split('\n'))
+    if len(byte_str) <= _max_cached_len:
+        if len(_decoded_strings) >= _max_cached_strings:
+            _decoded_strings.clear()
+        _decoded_strings[byte_str] = decoded
+    return decoded
+
 #------------------------------------------------------------------------------
 class RecordHeader(object):
-    """Pack or unpack the record's header."""
+    """Pack or unpack the record's header. GRUP headers are represented by
+    the GrupHeader subclass."""
     rec_header_size = 24 # Record header size, e.g. 20 for Oblivion
     # Record pack format, e.g. 4sIIII for Oblivion
     # Given as a list here, where each string matches one subrecord in the
@@ -114,44 +230,34 @@ class RecordHeader(object):
     recordTypes = set()
     #--Plugin form version, we must pack this in the TES4 header
     plugin_form_version = 0
-
-    def __init__(self, recType='TES4', size=0, arg1=0, arg2=0, arg3=0, arg4=0):
-        """RecordHeader defining different sets of attributes based on recType
-        is a huge smell and must be fixed. The fact that Oblivion has different
-        unpack formats than other games adds to complexity - we need a proper
-        class or better add __slots__ and iterate over them in pack. Both
-        issues should be fixed at once.
-        :param recType: signature of record
-                      : For GRUP this is always GRUP
-                      : For Records this will be TES4, GMST, KYWD, etc
+    __slots__ = ('recType', 'size', 'flags1', 'fid', 'flags2', 'extra')
+
+    def __init__(self, recType='TES4', size=0, flags1=0, fid=0, flags2=0,
+                 extra=0):
+        """The fields of a record header. The number of fields that are
+        actually stored in the file depends on the game (see
+        rec_pack_format), missing ones are left at zero.
+        :param recType: signature of record, e.g. TES4, GMST, KYWD
         :param size : size of current record, not entire file
-        :param arg1 : For GRUP type of records to follow, GMST, KYWD, etc
-                    : For Records this is the record flags
-        :param arg2 : For GRUP Group Type 0 to 10 see UESP Wiki
-                    : Record FormID, TES4 records have FormID of 0
-        :param arg3 : For GRUP 2h, possible time stamp, unknown
-                    : Record possible version control in CK
-        :param arg4 : For GRUP 0 for known mods (2h, form_version, unknown ?)
-                    : For Records 2h, form_version, unknown
+        :param flags1 : the record flags
+        :param fid : the record FormID, TES4 records have FormID of 0
+        :param flags2 : possible version control in CK
+        :param extra : 2h, form_version, unknown
         """
         self.recType = recType
         self.size = size
-        if self.recType == 'GRUP':
-            self.label = arg1
-            self.groupType = arg2
-            self.stamp = arg3
-        else:
-            self.flags1 = arg1
-            self.fid = arg2
-            self.flags2 = arg3
-        self.extra = arg4
+        self.flags1 = flags1
+        self.fid = fid
+        self.flags2 = flags2
+        self.extra = extra
 
     @staticmethod
     def unpack(ins):
-        """Return a RecordHeader object by reading the input stream."""
+        """Return a RecordHeader (or GrupHeader) object by reading the input
+        stream."""
         # args = rec_type, size, uint0, uint1, uint2[, uint3]
-        args = ins.unpack(RecordHeader.rec_pack_format_str,
-                          RecordHeader.rec_header_size, 'REC_HEADER')
+        args = ins.unpack_struct(get_struct(RecordHeader.rec_pack_format_str),
+                                 RecordHeader.rec_header_size, 'REC_HEADER')
         #--Bad type?
         rec_type = args[0]
         if rec_type not in RecordHeader.recordTypes:
@@ -159,58 +265,82 @@ def unpack(ins):
                                      u'Bad header type: ' + repr(rec_type))
         #--Record
         if rec_type != 'GRUP':
-            pass
+            return RecordHeader(*args)
         #--Top Group
-        elif args[3] == 0: #groupType == 0 (Top Type)
-            args = list(args)
-            str0 = struct_pack('I', args[2])
-            if str0 in RecordHeader.topTypes:
-                args[2] = str0
-            else:
+        if args[3] == 0: #groupType == 0 (Top Type)
+            label = _uint32_struct.pack(args[2])
+            if label not in RecordHeader.topTypes:
                 raise exception.ModError(ins.inName,
-                                         u'Bad Top GRUP type: ' + repr(str0))
-        return RecordHeader(*args)
+                                         u'Bad Top GRUP type: ' + repr(label))
+            return GrupHeader(args[1], label, *args[3:])
+        return GrupHeader(*args[1:])
 
     def pack(self):
         """Return the record header packed into a bitstream to be written to
-        file. We decide what kind of GRUP we have based on the type of
-        label, hacky but to redo this we must revisit records code."""
-        if self.recType == 'GRUP':
-            if isinstance(self.label, str):
-                pack_args = [RecordHeader.pack_formats[0], self.recType,
-                             self.size, self.label, self.groupType, self.stamp]
-            elif isinstance(self.label, tuple):
-                pack_args = [RecordHeader.pack_formats[4], self.recType,
-                             self.size, self.label[0], self.label[1],
-                             self.groupType, self.stamp]
-            else:
-                pack_args = [RecordHeader.pack_formats[1], self.recType,
-                             self.size, self.label, self.groupType, self.stamp]
-            if RecordHeader.plugin_form_version:
-                pack_args.append(self.extra)
-        else:
-            pack_args = [RecordHeader.rec_pack_format_str, self.recType,
-                         self.size, self.flags1, self.fid, self.flags2]
-            if RecordHeader.plugin_form_version:
-                extra1, extra2 = struct_unpack('=2h',
-                                               struct_pack('=I', self.extra))
-                extra1 = RecordHeader.plugin_form_version
-                self.extra = \
-                    struct_unpack('=I', struct_pack('=2h', extra1, extra2))[0]
-                pack_args.append(self.extra)
-        return struct_pack(*pack_args)
+        file."""
+        rec_struct = get_struct(RecordHeader.rec_pack_format_str)
+        form_version = RecordHeader.plugin_form_version
+        if not form_version:
+            return rec_struct.pack(self.recType, self.size, self.flags1,
+                                   self.fid, self.flags2)
+        # The low half of extra is the form version, which we must update
+        self.extra = (self.extra & 0xFFFF0000) | (form_version & 0xFFFF)
+        return rec_struct.pack(self.recType, self.size, self.flags1,
+                               self.fid, self.flags2, self.extra)
 
     @property
     def form_version(self):
         if self.plugin_form_version == 0 : return 0
-        return struct_unpack('=2h', struct_pack('=I', self.extra))[0]
+        form_version = self.extra & 0xFFFF
+        return form_version - 0x10000 if form_version & 0x8000 else \
+            form_version
 
     def __repr__(self):
-        if self.recType == 'GRUP':
-            return u'<GRUP Header: %s v%u>' % (self.label, self.form_version)
+        return u'<Record Header: %s v%u>' % (strFid(self.fid),
+                                              self.form_version)
+
+class GrupHeader(RecordHeader):
+    """Pack or unpack the header of a GRUP. Does not have the flags1, fid and
+    flags2 fields of records."""
+    __slots__ = ('label', 'groupType', 'stamp')
+
+    def __init__(self, size=0, label=0, groupType=0, stamp=0, extra=0):
+        """
+        :param size : size of the entire group, including its header
+        :param label : For top groups, type of records to follow (GMST, KYWD,
+                       etc.). For exterior cell blocks, a tuple of the block
+                       coordinates. Otherwise, a FormID or a block number
+        :param groupType : Group Type 0 to 10 see UESP Wiki
+        :param stamp : possible time stamp, unknown
+        :param extra : 0 for known mods (2h, form_version, unknown ?)
+        """
+        self.recType = 'GRUP'
+        self.size = size
+        self.label = label
+        self.groupType = groupType
+        self.stamp = stamp
+        self.extra = extra
+
+    def pack(self):
+        """Return the group header packed into a bitstream to be written to
+        file. We decide what kind of GRUP we have based on the type of
+        label, hacky but to redo this we must revisit records code."""
+        if isinstance(self.label, str):
+            pack_args = [RecordHeader.pack_formats[0], self.recType,
+                         self.size, self.label, self.groupType, self.stamp]
+        elif isinstance(self.label, tuple):
+            pack_args = [RecordHeader.pack_formats[4], self.recType,
+                         self.size, self.label[0], self.label[1],
+                         self.groupType, self.stamp]
         else:
-            return u'<Record Header: %s v%u>' % (strFid(self.fid),
-                                                  self.form_version)
+            pack_args = [RecordHeader.pack_formats[1], self.recType,
+                         self.size, self.label, self.groupType, self.stamp]
+        if RecordHeader.plugin_form_version:
+            pack_args.append(self.extra)
+        return get_struct(pack_args[0]).pack(*pack_args[1:])
+
+    def __repr__(self):
+        return u'<GRUP Header: %s v%u>' % (self.label, self.form_version)
 
 #------------------------------------------------------------------------------
 class ModReader(object):
@@ -237,6 +367,12 @@ def setStringTable(self, table):
         self.hasStrings = bool(table)
         self.strings = table or {} # table may be None
 
+    def take_decompressed(self, data_pos):
+        """Returns the decompressed data of the compressed record whose data
+        starts at data_pos, if it was handed to a thread pool by
+        MemoryModReader.prefetch_decompressed - else None."""
+        return None
+
     #--I/O Stream -----------------------------------------
     def seek(self,offset,whence=os.SEEK_SET,recType='----'):
         """File seek."""
@@ -283,7 +419,7 @@ def readLString(self,size,recType='----'):
         zero-terminated string."""
         if self.hasStrings:
             if size != 4:
-                endPos = self.ins.tell() + size
+                endPos = self.tell() + size
                 raise exception.ModReadError(self.inName, recType, endPos, self.size)
             id_, = self.unpack('I',4,recType)
             if id_ == 0: return u''
@@ -298,8 +434,7 @@ def readString32(self, recType='----'):
 
     def readString(self,size,recType='----'):
         """Read string from file, stripping zero terminator."""
-        return u'\n'.join(decode(x,bolt.pluginEncoding,avoidEncodings=('utf8','utf-8')) for x in
-                          bolt.cstrip(self.read(size,recType)).split('\n'))
+        return _decode_plugin_string(self.read(size,recType))
 
     def readStrings(self,size,recType='----'):
         """Read strings from file, stripping zero terminator."""
@@ -308,29 +443,37 @@ def readStrings(self,size,recType='----'):
 
     def unpack(self,format,size,recType='----'):
         """Read file and unpack according to struct format."""
+        return self.unpack_struct(get_struct(format), size, recType)
+
+    def unpack_struct(self, struct_obj, size, recType='----'):
+        """Read file and unpack according to a precompiled struct.Struct.
+        Like unpack, size must match the size of the struct.
+
+        :type struct_obj: struct.Struct"""
         endPos = self.ins.tell() + size
         if endPos > self.size:
             raise exception.ModReadError(self.inName, recType, endPos, self.size)
-        return struct_unpack(format, self.ins.read(size))
+        return struct_obj.unpack(self.ins.read(size))
 
     def unpackRef(self):
         """Read a ref (fid)."""
-        return self.unpack('I',4)[0]
+        return self.unpack_struct(_uint32_struct, 4)[0]
 
     def unpackRecHeader(self): return RecordHeader.unpack(self)
 
     def unpackSubHeader(self,recType='----',expType=None,expSize=0):
         """Unpack a subrecord header.  Optionally checks for match with expected
         type and size."""
-        selfUnpack = self.unpack
-        (rec_type, size) = selfUnpack(RecordHeader.sub_header_fmt,
+        selfUnpack = self.unpack_struct
+        sub_header_struct = get_struct(RecordHeader.sub_header_fmt)
+        (rec_type, size) = selfUnpack(sub_header_struct,
                                       RecordHeader.sub_header_size,
                                       recType + u'.SUB_HEAD')
         #--Extended storage?
         while rec_type == 'XXXX':
-            size = selfUnpack('I',4,recType+'.XXXX.SIZE.')[0]
+            size = selfUnpack(_uint32_struct,4,recType+'.XXXX.SIZE.')[0]
             # Throw away size here (always == 0)
-            rec_type = selfUnpack(RecordHeader.sub_header_fmt,
+            rec_type = selfUnpack(sub_header_struct,
                                   RecordHeader.sub_header_size,
                                   recType + u'.XXXX.TYPE')[0]
         #--Match expected name?
@@ -343,6 +486,156 @@ def unpackSubHeader(self,recType='----',expType=None,expSize=0):
                                          (expSize,), size)
         return rec_type,size
 
+#------------------------------------------------------------------------------
+class MemoryModReader(ModReader):
+    """ModReader backed by an in-memory buffer instead of a file object - that
+    is a str (e.g. decompressed record data) or a memory-mapped plugin, see
+    from_path. Keeps track of its own position and unpacks straight from the
+    buffer via struct.unpack_from, so no per-read tell() calls or intermediate
+    byte strings are needed."""
+
+    def __init__(self, inName, buff, _mmap=None):
+        self.inName = inName
+        self.ins = buff # mirrors ModReader.ins
+        self._mmap = _mmap
+        self._pos = 0
+        self.size = len(buff)
+        self.strings = {}
+        self.hasStrings = False
+        self._prefetched = self._prefetch_state = None
+
+    @classmethod
+    def from_path(cls, inName, path):
+        """Return a MemoryModReader for the file at the specified path, using
+        a read-only memory map of it. The map is released when the reader is
+        closed, so nothing read from it may be a view into it - read() and
+        friends always return new strings.
+
+        :type path: bolt.Path"""
+        with path.open('rb') as ins:
+            try:
+                mapped = mmap.mmap(ins.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty file, those can't be mapped
+                return cls(inName, '')
+        return cls(inName, mapped, _mmap=mapped)
+
+    def __exit__(self, exc_type, exc_value, exc_traceback): self.close()
+
+    # Number of records decompressed by each task of prefetch_decompressed
+    _prefetch_chunk = 32
+    # Number of chunks decompressed ahead of the record being parsed
+    _prefetch_window = 8
+
+    def prefetch_decompressed(self, endPos, pool):
+        """Hands the data of the compressed records between the current
+        position and endPos (descending into groups, except for the cell
+        children groups MobCell keeps raw) to pool, a ThreadPool,
+        for decompression. zlib releases the GIL, so the records are
+        decompressed on other cores while this thread parses them - see
+        take_decompressed. Only a window of _prefetch_window chunks is
+        decompressed ahead, take_decompressed hands out more as the records
+        get taken. Does not change the position."""
+        self._prefetched = {}
+        # Scan position, end position, pool and number of the next chunk
+        self._prefetch_state = [self._pos, min(endPos, self.size), pool, 0]
+        for _i in xrange(self._prefetch_window):
+            if not self._submit_chunk(): break
+
+    def _submit_chunk(self):
+        """Scans for the next chunk of compressed records to prefetch and
+        submits it. Returns False if there were none left."""
+        scan_pos, endPos, pool, chunk_num = state = self._prefetch_state
+        buff = self.ins
+        header_unpack = get_struct(RecordHeader.rec_pack_format_str).unpack_from
+        header_size = RecordHeader.rec_header_size
+        chunk_size = self._prefetch_chunk
+        chunk, chunk_positions = [], []
+        pos = scan_pos
+        while pos + header_size <= endPos and len(chunk) < chunk_size:
+            header_args = header_unpack(buff, pos)
+            pos += header_size
+            if header_args[0] == 'GRUP':
+                if header_args[3] in (6, 8, 9, 10):
+                    # Cell children are kept raw by MobCell, skip them
+                    pos += header_args[1] - header_size
+                continue # else descend into the group
+            size = header_args[1]
+            if header_args[2] & _compressed_flag:
+                chunk.append(buff[pos:pos + size])
+                chunk_positions.append(pos)
+            pos += size
+        state[0] = pos
+        if not chunk: return False
+        task = pool.apply_async(_decompress_chunk, (self.inName, chunk))
+        prefetched = self._prefetched
+        for i, data_pos in enumerate(chunk_positions):
+            prefetched[data_pos] = (task, i, chunk_num)
+        state[3] = chunk_num + 1
+        return True
+
+    def take_decompressed(self, data_pos):
+        prefetched = self._prefetched
+        if not prefetched: return None
+        try:
+            task, i, chunk_num = prefetched.pop(data_pos)
+        except KeyError:
+            return None
+        # Keep the window ahead of this record filled
+        while (self._prefetch_state[3] <= chunk_num + self._prefetch_window
+               and self._submit_chunk()): pass
+        return task.get()[i]
+
+    #--I/O Stream -----------------------------------------
+    def seek(self,offset,whence=os.SEEK_SET,recType='----'):
+        if whence == os.SEEK_CUR:
+            newPos = self._pos + offset
+        elif whence == os.SEEK_END:
+            newPos = self.size + offset
+        else:
+            newPos = offset
+        if newPos < 0 or newPos > self.size:
+            raise exception.ModReadError(self.inName, recType, newPos, self.size)
+        self._pos = newPos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def atEnd(self,endPos=-1,recType='----'):
+        if endPos == -1:
+            return self._pos == self.size
+        elif self._pos > endPos:
+            raise exception.ModError(self.inName, u'Exceeded limit of: ' + recType)
+        else:
+            return self._pos == endPos
+
+    #--Read/Unpack ----------------------------------------
+    def read(self,size,recType='----'):
+        pos = self._pos
+        endPos = pos + size
+        if endPos > self.size:
+            raise exception.ModSizeError(self.inName, recType, (endPos,),
+                                         self.size)
+        self._pos = endPos
+        return self.ins[pos:endPos]
+
+    def unpack_struct(self, struct_obj, size, recType='----'):
+        pos = self._pos
+        endPos = pos + size
+        if endPos > self.size:
+            raise exception.ModReadError(self.inName, recType, endPos, self.size)
+        # unpack_from would happily ignore trailing bytes - keep the checks
+        # struct.unpack performs on the exact-size string ModReader reads
+        if struct_obj.size != size:
+            raise struct.error(u'unpack requires a string argument of length '
+                               u'%d' % struct_obj.size)
+        self._pos = endPos
+        return struct_obj.unpack_from(self.ins, pos)
+
 #------------------------------------------------------------------------------
 class ModWriter(object):
     """Wrapper around a TES4 output stream.  Adds utility functions."""
@@ -362,7 +655,7 @@ def close(self): self.out.close()
 
     #--Additional functions -------------------------------
     def pack(self,format,*data):
-        self.out.write(struct_pack(format, *data))
+        self.out.write(get_struct(format).pack(*data))
 
     def packSub(self, sub_rec_type, data, *values):
         """Write subrecord header and data to output stream.
@@ -372,21 +665,33 @@ def packSub(self, sub_rec_type, data, *values):
         with size > 0xFFFF."""
         try:
             if data is None: return
-            if values: data = struct_pack(data, *values)
+            if values: data = get_struct(data).pack(*values)
             outWrite = self.out.write
             lenData = len(data)
+            sub_header_struct = get_struct(RecordHeader.sub_header_fmt)
             if lenData <= 0xFFFF:
-                outWrite(struct_pack(RecordHeader.sub_header_fmt, sub_rec_type,
-                                     lenData))
+                outWrite(sub_header_struct.pack(sub_rec_type, lenData))
             else:
-                outWrite(struct_pack('=4sHI', 'XXXX', 4, lenData))
-                outWrite(struct_pack(RecordHeader.sub_header_fmt, sub_rec_type,
-                                     0))
+                outWrite(_xxxx_header_struct.pack('XXXX', 4, lenData))
+                outWrite(sub_header_struct.pack(sub_rec_type, 0))
             outWrite(data)
         except Exception:
             bolt.deprint(u'%r: Failed packing: %s, %s, %s' % (
                 self, sub_rec_type, data, values), traceback=True)
 
+    def pack_sub_struct(self, sub_rec_type, struct_obj, *values):
+        """Write subrecord header and values packed with a precompiled
+        struct.Struct to output stream. Equivalent to
+        packSub(sub_rec_type,struct_obj.format,*values)."""
+        try:
+            data = struct_obj.pack(*values)
+        except Exception:
+            bolt.deprint(u'%r: Failed packing: %s, %s, %s' % (
+                self, sub_rec_type, struct_obj.format, values),
+                traceback=True)
+            return
+        self.packSub(sub_rec_type, data)
+
     def packSub0(self, sub_rec_type, data):
         """Write subrecord header plus zero terminated string to output
         stream."""
@@ -395,19 +700,19 @@ def packSub0(self, sub_rec_type, data):
             data = encode(data,firstEncoding=bolt.pluginEncoding)
         lenData = len(data) + 1
         outWrite = self.out.write
+        sub_header_struct = get_struct(RecordHeader.sub_header_fmt)
         if lenData < 0xFFFF:
-            outWrite(struct_pack(RecordHeader.sub_header_fmt, sub_rec_type,
-                                 lenData))
+            outWrite(sub_header_struct.pack(sub_rec_type, lenData))
         else:
-            outWrite(struct_pack('=4sHI', 'XXXX', 4, lenData))
-            outWrite(struct_pack(RecordHeader.sub_header_fmt, sub_rec_type, 0))
+            outWrite(_xxxx_header_struct.pack('XXXX', 4, lenData))
+            outWrite(sub_header_struct.pack(sub_rec_type, 0))
         outWrite(data)
         outWrite('\x00')
 
     def packRef(self, sub_rec_type, fid):
         """Write subrecord header and fid reference."""
         if fid is not None:
-            self.out.write(struct_pack('=4sHI', sub_rec_type, 4, fid))
+            self.out.write(_xxxx_header_struct.pack(sub_rec_type, 4, fid))
 
     def writeGroup(self,size,label,groupType,stamp):
         if type(label) is str:
@@ -439,27 +744,94 @@ def write_string(self, sub_type, string_val, max_size=0, min_size=0,
 
 #------------------------------------------------------------------------------
 class MelObject(object):
-    """An empty class used by group and structure elements for data storage."""
+    """An empty class used by group and structure elements for data storage.
+    Elements store their data in instances of slotted subclasses created by
+    get_mel_object_class - instantiating MelObject itself returns an object
+    that accepts arbitrary attributes instead."""
+    __slots__ = ()
+
+    def __new__(cls, *args, **kwargs):
+        if cls is MelObject: cls = _MelDictObject
+        return object.__new__(cls)
+
+    def _get_attrs(self):
+        """Returns a dict mapping the attributes set on this object to their
+        values."""
+        obj_attrs = {}
+        for obj_attr in _get_class_slots(type(self)):
+            try:
+                obj_attrs[obj_attr] = getattr(self, obj_attr)
+            except AttributeError: pass # unset slot
+        obj_dict = getattr(self, u'__dict__', None)
+        if obj_dict: obj_attrs.update(obj_dict)
+        return obj_attrs
+
     def __eq__(self,other):
         """Operator: =="""
-        return isinstance(other,MelObject) and self.__dict__ == other.__dict__
+        return isinstance(other,MelObject) and \
+               self._get_attrs() == other._get_attrs()
 
     def __ne__(self,other):
         """Operator: !="""
-        return not isinstance(other,MelObject) or self.__dict__ != other.__dict__
+        return not isinstance(other,MelObject) or \
+               self._get_attrs() != other._get_attrs()
 
     def __repr__(self):
         """Carefully try to show as much info about ourselves as possible."""
-        to_show = []
-        if hasattr(self, '__slots__'):
-            for obj_attr in self.__slots__:
-                # attrs starting with _ are internal - union types,
-                # distributor states, etc.
-                if not obj_attr.startswith(u'_') and hasattr(self, obj_attr):
-                    to_show.append(
-                        u'%s: %r' % (obj_attr, getattr(self, obj_attr)))
+        # attrs starting with _ are internal - union types, distributor
+        # states, etc.
+        to_show = [u'%s: %r' % (obj_attr, obj_val) for obj_attr, obj_val
+                   in self._get_attrs().iteritems()
+                   if not obj_attr.startswith(u'_')]
         return u'<%s>' % u', '.join(sorted(to_show)) # is sorted() needed here?
 
+    def __reduce__(self):
+        """Pickles the object by its attributes - the slotted subclasses are
+        created at runtime, so they can't be pickled by reference."""
+        obj_class = type(self)
+        obj_slots = None if obj_class is _MelDictObject else \
+            _get_class_slots(obj_class)
+        return _load_mel_object, (obj_slots, self._get_attrs())
+
+class _MelDictObject(MelObject):
+    """A MelObject that can hold any attributes. Used for MelObjects created
+    by hand, e.g. by patchers that add new entries to a record."""
+
+_mel_object_classes = {}
+
+def get_mel_object_class(obj_slots):
+    """Returns a MelObject subclass whose instances have exactly the specified
+    slots. Classes are shared between all callers asking for the same slots.
+
+    :param obj_slots: The attributes the instances need to hold.
+    :type obj_slots: list[str]|tuple[str]"""
+    obj_slots = tuple(obj_slots)
+    try:
+        return _mel_object_classes[obj_slots]
+    except KeyError:
+        unique_slots = []
+        for obj_attr in obj_slots:
+            if obj_attr not in unique_slots: unique_slots.append(obj_attr)
+        # Keywords are fine here, we never write these out as source code
+        if all(_plain_attr.match(a) for a in unique_slots):
+            obj_class = type('MelObject', (MelObject,), {
+                '__slots__': tuple(str(a) for a in unique_slots)})
+        else: # can't be slots - leave it to a __dict__ instead
+            obj_class = _MelDictObject
+        # Also register it for its unique slots, see _load_mel_object
+        obj_class = _mel_object_classes.setdefault(tuple(unique_slots),
+                                                   obj_class)
+        _mel_object_classes[obj_slots] = obj_class
+        return obj_class
+
+def _load_mel_object(obj_slots, obj_attrs):
+    """Unpickles a MelObject - see MelObject.__reduce__."""
+    mel_obj = (_MelDictObject if obj_slots is None else
+               get_mel_object_class(obj_slots))()
+    for obj_attr, obj_val in obj_attrs.iteritems():
+        setattr(mel_obj, obj_attr, obj_val)
+    return mel_obj
+
 #-----------------------------------------------------------------------------
 class MelBase(object):
     """Represents a mod record raw element. Typically used for unknown elements.
@@ -715,7 +1087,7 @@ class MelFidList(MelFids):
 
     def loadData(self, record, ins, sub_type, size_, readId):
         if not size_: return
-        fids = ins.unpack(repr(size_ // 4) + 'I', size_, readId)
+        fids = struct_unpack(repr(size_ // 4) + 'I', ins.read(size_, readId))
         record.__setattr__(self.attr,list(fids))
 
     def dumpData(self,record,out):
@@ -806,6 +1178,8 @@ def __init__(self,attr,*elements):
         """:type attr: str"""
         MelSequential.__init__(self, *elements)
         self.attr, self.loaders = attr, {}
+        self._mel_object_class = get_mel_object_class(
+            s for element in self.elements for s in element.getSlotsUsed())
 
     def getDefaulters(self,defaulters,base):
         defaulters[base+self.attr] = self
@@ -823,7 +1197,7 @@ def setDefault(self,record):
         record.__setattr__(self.attr,None)
 
     def getDefault(self):
-        target = MelObject()
+        target = self._mel_object_class()
         for element in self.elements:
             element.setDefault(target)
         return target
@@ -832,8 +1206,6 @@ def loadData(self, record, ins, sub_type, size_, readId):
         target = record.__getattribute__(self.attr)
         if target is None:
             target = self.getDefault()
-            target.__slots__ = [s for element in self.elements for s in
-                                element.getSlotsUsed()]
             record.__setattr__(self.attr,target)
         self.loaders[sub_type].loadData(target, ins, sub_type, size_, readId)
 
@@ -873,8 +1245,6 @@ def loadData(self, record, ins, sub_type, size_, readId):
         if sub_type in self._init_sigs:
             # We've hit one of the initial signatures, make a new object
             target = self.getDefault()
-            target.__slots__ = [s for element in self.elements for s in
-                                element.getSlotsUsed()]
             record.__getattribute__(self.attr).append(target)
         else:
             # Add to the existing element
@@ -1036,7 +1406,7 @@ def __init__(self, loader, decider):
         :type decider: ADecider"""
         self._loader = loader
         # A bit hacky, but we need MelStruct to assign the attributes
-        self._load_size = struct.calcsize(loader.format)
+        self._load_size = loader._static_struct.size
         self._decider = decider
         # This works because MelUnion._get_element_from_record does not use
         # self.__class__ to access can_decide_at_dump
@@ -1321,14 +1691,63 @@ class MelStruct(MelBase):
     def __init__(self, subType, format, *elements, **kwdargs):
         dumpExtra = kwdargs.get('dumpExtra', None)
         self.subType, self.format = subType, format
+        self._static_struct = get_struct(format)
         self.attrs,self.defaults,self.actions,self.formAttrs = MelBase.parseElements(*elements)
         if dumpExtra:
             self.attrs += (dumpExtra,)
             self.defaults += ('',)
             self.actions += (None,)
-            self.formatLen = struct.calcsize(format)
+            self.formatLen = self._static_struct.size
         else:
             self.formatLen = -1
+            self._compile_accessors()
+
+    def _compile_accessors(self):
+        """Replaces loadData and dumpData with functions generated for the
+        attributes of this struct, which assign and read the slots directly
+        instead of looping over attrs and actions. Subclasses that override
+        either method keep their own version."""
+        struct_len = len(self._static_struct.unpack(
+            null1 * self._static_struct.size))
+        if struct_len != len(self.attrs) or not all(
+                _is_plain_attr(a) for a in self.attrs): return
+        func_globals = {u'_struct': self._static_struct,
+                        u'_sub_type': self.subType}
+        rec_attrs = [u'record.' + a for a in self.attrs]
+        load_targets, load_actions, dump_values = [], [], []
+        for index, (rec_attr, action) in enumerate(zip(rec_attrs,
+                                                       self.actions)):
+            if action:
+                func_globals[u'_action%u' % index] = action
+                load_targets.append(u'_val%u' % index)
+                load_actions.append(u'%s = _action%u(_val%u)' % (
+                    rec_attr, index, index))
+                dump_values.append(rec_attr + u'.dump()')
+            else:
+                load_targets.append(rec_attr)
+                dump_values.append(rec_attr)
+        if self.__class__.loadData.im_func is MelStruct.loadData.im_func:
+            self.loadData = _compile_function(
+                u'loadData', func_globals,
+                u'record, ins, sub_type, size_, readId',
+                [u'%s, = ins.unpack_struct(_struct, size_, readId)' %
+                 u', '.join(load_targets)] + load_actions)
+        dump_body = [u'out.pack_sub_struct(_sub_type, _struct, %s)' %
+                     u', '.join(dump_values)]
+        dump_impl = self.__class__.dumpData.im_func
+        if dump_impl is MelOptStruct.dumpData.im_func:
+            # Only dump if any value differs from its default
+            for index, default in enumerate(self.defaults):
+                func_globals[u'_default%u' % index] = default
+            dump_body = [u'if %s:' % u' or '.join(
+                u'(%s is not None and %s != _default%u)' % (
+                    rec_attr, rec_attr, index)
+                for index, rec_attr in enumerate(rec_attrs)),
+                u'    ' + dump_body[0]]
+        elif dump_impl is not MelStruct.dumpData.im_func:
+            return
+        self.dumpData = _compile_function(
+            u'dumpData', func_globals, u'record, out', dump_body)
 
     def getSlotsUsed(self):
         return self.attrs
@@ -1344,7 +1763,7 @@ def setDefault(self,record):
 
     def loadData(self, record, ins, sub_type, size_, readId):
         readsize = self.formatLen if self.formatLen >= 0 else size_
-        unpacked = ins.unpack(self.format,readsize,readId)
+        unpacked = ins.unpack_struct(self._static_struct, readsize, readId)
         setter = record.__setattr__
         for attr,value,action in zip(self.attrs,unpacked,self.actions):
             if action: value = action(value)
@@ -1361,13 +1780,14 @@ def dumpData(self,record,out):
             value = getter(attr)
             if action: value = value.dump()
             valuesAppend(value)
-        if self.formatLen >= 0:
-            extraLen = len(values[-1])
-            format = self.format + repr(extraLen) + 's'
-        else:
-            format = self.format
         try:
-            out.packSub(self.subType,format,*values)
+            if self.formatLen >= 0:
+                extraLen = len(values[-1])
+                out.packSub(self.subType, self.format + repr(extraLen) + 's',
+                            *values)
+            else:
+                out.pack_sub_struct(self.subType, self._static_struct,
+                                    *values)
         except struct.error:
             bolt.deprint(u'Failed to dump struct: %s (%r)' % (
                 self.subType, self))
@@ -1384,7 +1804,7 @@ def mapFids(self,record,function,save=False):
     def static_size(self):
         # dumpExtra means we can't know the size
         if self.formatLen == -1:
-            return struct.calcsize(self.format)
+            return self._static_struct.size
         raise exception.AbstractError()
 
 #------------------------------------------------------------------------------
@@ -1414,15 +1834,13 @@ def __init__(self, array_attr, element):
         # Use this instead of element.subType to support e.g. unions
         MelBase.__init__(self, next(iter(element.signatures)), array_attr)
         self._element = element
-        # Underscore means internal usage only - e.g. distributor state
-        self._element_attrs = [s for s in element.getSlotsUsed()
-                              if not s.startswith('_')]
+        self._entry_class = get_mel_object_class(element.getSlotsUsed())
 
     class _DirectModWriter(ModWriter):
         """ModWriter that does not write out any subrecord headers."""
         def packSub(self, sub_rec_type, data, *values):
             if data is None: return
-            if values: data = struct_pack(data, *values)
+            if values: data = get_struct(data).pack(*values)
             self.out.write(data)
 
         def packSub0(self, sub_rec_type, data):
@@ -1430,7 +1848,7 @@ def packSub0(self, sub_rec_type, data):
             self.out.write('\x00')
 
         def packRef(self, sub_rec_type, fid):
-            if fid is not None: self.pack('I', fid)
+            if fid is not None: self.out.write(_uint32_struct.pack(fid))
 
     def hasFids(self, formElements):
         temp_elements = set()
@@ -1449,13 +1867,12 @@ def mapFids(self,record,function,save=False):
 
     def loadData(self, record, ins, sub_type, size_, readId):
         append_entry = getattr(record, self.attr).append
-        entry_slots = self._element_attrs
+        entry_class = self._entry_class
         entry_size = self._element_size
         load_entry = self._element.loadData
         for x in xrange(size_ // entry_size):
-            arr_entry = MelObject()
+            arr_entry = entry_class()
             append_entry(arr_entry)
-            arr_entry.__slots__ = entry_slots
             load_entry(arr_entry, ins, sub_type, entry_size, readId)
 
     def dumpData(self, record, out):
@@ -1467,6 +1884,151 @@ def dumpData(self, record, out):
             dump_entry(arr_entry, array_data)
         out.packSub(self.subType, array_data.getvalue())
 
+#------------------------------------------------------------------------------
+# array.array typecodes for the struct format characters StructArray supports
+_array_typecodes = {'b': 'b', 'B': 'B', 'h': 'h', 'H': 'H', 'i': 'i',
+                    'I': 'I', 'l': 'i', 'L': 'I', 'f': 'f', 'd': 'd'}
+
+class StructArray(object):
+    """An array of fixed-size numeric structs, as loaded by MelStructArray.
+    Holds on to the packed data it was loaded from until it is first
+    accessed, then keeps one array.array per struct field (a column), so that
+    even huge arrays don't need an object per entry. Untouched arrays are
+    dumped as they were loaded, as are bytes trailing the last whole struct.
+    Stores the format of its structs rather than a struct.Struct, so that it
+    can be pickled."""
+    __slots__ = ('fields', '_typecodes', '_row_format', '_data', '_columns',
+                 '_trailing')
+
+    def __init__(self, row_format, fields, typecodes, data=''):
+        self.fields = fields
+        self._typecodes = typecodes
+        self._row_format = row_format
+        self._data = data
+        self._columns = None
+        self._trailing = ''
+
+    def _get_columns(self):
+        if self._columns is None:
+            data, typecodes = self._data, self._typecodes
+            num_fields = len(typecodes)
+            row_size = get_struct(self._row_format).size
+            count = len(data) // row_size
+            self._trailing = data[count * row_size:]
+            data = data[:count * row_size]
+            if len(set(typecodes)) == 1: # decode all in one go
+                flat = array.array(typecodes[0], data)
+            else:
+                flat = self._array_struct(count).unpack(data)
+            self._columns = [array.array(typecode, flat[i::num_fields])
+                             for i, typecode in enumerate(typecodes)]
+            self._data = None
+        return self._columns
+
+    def _array_struct(self, count):
+        # Not cached via get_struct - there would be one per array size
+        return struct.Struct('=' + self._row_format[1:] * count)
+
+    def column(self, field):
+        """Returns the array.array holding the values of the specified
+        field. Changes to it change this array."""
+        return self._get_columns()[self.fields.index(field)]
+
+    def tostring(self):
+        """Returns the packed data of this array."""
+        if self._columns is None: return self._data
+        columns, typecodes = self._columns, self._typecodes
+        count = len(self)
+        if len(set(typecodes)) == 1:
+            num_fields = len(columns)
+            flat = array.array(typecodes[0], [0]) * (count * num_fields)
+            for i, col in enumerate(columns):
+                flat[i::num_fields] = col
+            return flat.tostring() + self._trailing
+        return self._array_struct(count).pack(
+            *[value for row in izip(*columns) for value in row]
+        ) + self._trailing
+
+    #--Sequence of rows (tuples)
+    def __len__(self):
+        if self._columns is None:
+            return len(self._data) // get_struct(self._row_format).size
+        return len(self._columns[0])
+
+    def __nonzero__(self): # trailing bytes alone still get dumped
+        if self._columns is None: return bool(self._data)
+        return bool(len(self) or self._trailing)
+
+    def __getitem__(self, index):
+        return tuple(col[index] for col in self._get_columns())
+
+    def __setitem__(self, index, row):
+        for col, value in izip(self._get_columns(), row):
+            col[index] = value
+
+    def __iter__(self):
+        return izip(*self._get_columns())
+
+    def append(self, row):
+        for col, value in izip(self._get_columns(), row):
+            col.append(value)
+
+    def __eq__(self, other):
+        if not isinstance(other, StructArray): return NotImplemented
+        return (self.fields == other.fields and
+                self.tostring() == other.tostring())
+
+    def __ne__(self, other):
+        if not isinstance(other, StructArray): return NotImplemented
+        return not self == other
+
+    def __deepcopy__(self, memo):
+        copied = StructArray(self._row_format, self.fields, self._typecodes,
+                             self._data)
+        if self._columns is not None:
+            copied._columns = [col[:] for col in self._columns]
+            copied._trailing = self._trailing
+        return copied
+
+    def __repr__(self):
+        return u'StructArray(%s, %d entries)' % (
+            u', '.join(self.fields), len(self))
+
+class MelStructArray(MelBase):
+    """Like MelArray(array_attr, MelStruct(subType, format, *fields)) for
+    structs consisting of plain numbers only (no fids, strings or flags),
+    but loads the subrecord into a StructArray instead of a list of
+    MelObjects. Meant for big arrays, like navmesh vertices."""
+    def __init__(self, subType, array_attr, format, *fields):
+        MelBase.__init__(self, subType, array_attr)
+        self._row_struct = get_struct(u'=' + format.lstrip(u'=<>!@'))
+        typecodes = []
+        for count, fmt_char in re.findall(u'([0-9]*)(.)',
+                                          self._row_struct.format[1:]):
+            if fmt_char not in _array_typecodes:
+                raise SyntaxError(u'MelStructArray does not support the '
+                                  u'struct format character %r' % fmt_char)
+            typecodes.extend(_array_typecodes[fmt_char] * int(count or 1))
+        if len(typecodes) != len(fields):
+            raise SyntaxError(u'MelStructArray: format %r does not match '
+                              u'the fields %r' % (format, fields))
+        self._fields = fields
+        self._typecodes = tuple(typecodes)
+
+    def setDefault(self, record):
+        setattr(record, self.attr, StructArray(
+            self._row_struct.format, self._fields, self._typecodes))
+
+    def loadData(self, record, ins, sub_type, size_, readId):
+        setattr(record, self.attr, StructArray(
+            self._row_struct.format, self._fields, self._typecodes,
+            ins.read(size_, readId)))
+
+    def dumpData(self, record, out):
+        array_val = getattr(record, self.attr)
+        if array_val: # don't dump out empty arrays
+            out.packSub(self.subType, array_val.tostring())
+
 #------------------------------------------------------------------------------
 class MelTruncatedStruct(MelStruct):
     """Works like a MelStruct, but automatically upgrades certain older,
@@ -1493,21 +2055,21 @@ def __init__(self, sub_sig, sub_fmt, *elements, **kwargs):
                               u'set')
         self._is_optional = kwargs.pop('is_optional', False)
         MelStruct.__init__(self, sub_sig, sub_fmt, *elements, **kwargs)
-        self._all_formats = {struct.calcsize(alt_fmt): alt_fmt for alt_fmt
-                             in old_versions}
-        self._all_formats[struct.calcsize(sub_fmt)] = sub_fmt
+        self._all_structs = {s.size: s for s in (get_struct(alt_fmt)
+                             for alt_fmt in old_versions)}
+        self._all_structs[self._static_struct.size] = self._static_struct
 
     def loadData(self, record, ins, sub_type, size_, readId):
         # Try retrieving the format - if not possible, wrap the error to make
         # it more informative
         try:
-            target_fmt = self._all_formats[size_]
+            target_struct = self._all_structs[size_]
         except KeyError:
             raise exception.ModSizeError(
-                ins.inName, readId, tuple(self._all_formats.keys()), size_)
+                ins.inName, readId, tuple(self._all_structs.keys()), size_)
         # Actually unpack the struct and pad it with defaults if it's an older,
         # truncated version
-        unpacked_val = ins.unpack(target_fmt, size_, readId)
+        unpacked_val = ins.unpack_struct(target_struct, size_, readId)
         unpacked_val = self._pre_process_unpacked(unpacked_val)
         # Apply any actions and then set the attributes according to the values
         # we just unpacked
@@ -1768,6 +2330,131 @@ def __init__(self, wthr_sub_sig):
             ('unused3', null1), 'nightRed', 'nightGreen', 'nightBlue',
             ('unused4', null1))
 
+#------------------------------------------------------------------------------
+# Lazy Loading ----------------------------------------------------------------
+#------------------------------------------------------------------------------
+# Pass as do_unpack to have MelRecords keep their raw data and only decode the
+# subrecords behind an attribute once that attribute is first accessed
+LAZY_UNPACK = 3
+
+# loadData implementations that only ever assign the attributes of their own
+# element - MelSet can run them on their own for lazily loaded records
+_self_contained_loads = {mel_class.loadData.im_func for mel_class in (
+    MelBase, MelCounter, MelFid, MelFids, MelFidList, MelGroup, MelGroups,
+    MelString, MelUnicode, MelLString, MelStrings, MelStruct, MelArray,
+    MelTruncatedStruct)}
+
+def _is_slot_set(record, attr):
+    """Returns True if the specified slot of record has been assigned. Does
+    not trigger any lazy decoding."""
+    try:
+        object.__getattribute__(record, attr)
+        return True
+    except AttributeError:
+        return False
+
+class _LazySubrecords(object):
+    """What a lazily loaded MelRecord needs to decode its subrecords later on.
+    The subrecord offsets are only collected the first time a single
+    attribute has to be decoded."""
+    __slots__ = ('strings', 'fid_mappers', 'decompressed', 'sub_offsets')
+
+    def __init__(self, ins):
+        self.strings = ins.strings if ins.hasStrings else None
+        self.fid_mappers = [] # convertFids calls made while still lazy
+        self.decompressed = None
+        self.sub_offsets = None
+
+    def get_reader(self, record):
+        """Returns a MemoryModReader over the decompressed data of record."""
+        if self.decompressed is None:
+            self.decompressed = record.getDecompressed()
+        reader = MemoryModReader(record.inName, self.decompressed)
+        if self.strings is not None: reader.setStringTable(self.strings)
+        return reader
+
+    def get_sub_offsets(self, record, ins):
+        """Returns a tuple of (type, data position, size) tuples for every
+        subrecord of record, in the order they appear in its data."""
+        if self.sub_offsets is None:
+            rec_type = record.recType
+            ins_at_end = ins.atEnd
+            load_sub_header = ins.unpackSubHeader
+            ins_tell = ins.tell
+            ins_seek = ins.seek
+            sub_offsets = []
+            sub_offsets_append = sub_offsets.append
+            while not ins_at_end(ins.size, rec_type):
+                sub_type, sub_size = load_sub_header(rec_type)
+                sub_pos = ins_tell()
+                sub_offsets_append((sub_type, sub_pos, sub_size))
+                ins_seek(sub_pos + sub_size)
+            self.sub_offsets = tuple(sub_offsets)
+        return self.sub_offsets
+
+#------------------------------------------------------------------------------
+# Record copying - see MelSet.copy_record
+# Values of these types can't be modified in place, so copies may share them
+_immutable_types = {int, long, float, bool, str, unicode, type(None),
+                    bolt.Path}
+# Elements that only ever store immutable values (MelStruct and subclasses
+# only for attributes without an action)
+_scalar_elements = {MelBase, MelFid, MelString, MelUnicode, MelLString,
+                    MelEdid, MelFull, MelStruct, MelOptStruct, MelFloat,
+                    MelSInt8, MelSInt16, MelSInt32, MelUInt8, MelUInt16,
+                    MelUInt32, MelOptFloat, MelOptSInt8, MelOptSInt16,
+                    MelOptSInt32, MelOptUInt8, MelOptUInt16, MelOptUInt32,
+                    MelOptFid, MelTruncatedStruct, MelCoordinates}
+# Elements that store flat lists of immutable values (fids or strings)
+_flat_list_elements = {MelFids, MelFidList, MelSortedFidList, MelStrings}
+_class_slots = {}
+
+def _get_class_slots(obj_class):
+    """Returns all slots that instances of obj_class have, including the
+    ones declared by its bases."""
+    try:
+        return _class_slots[obj_class]
+    except KeyError:
+        all_slots = []
+        for klass in reversed(obj_class.__mro__):
+            klass_slots = klass.__dict__.get('__slots__', ())
+            if isinstance(klass_slots, basestring): klass_slots = klass_slots,
+            all_slots.extend(s for s in klass_slots if s not in all_slots
+                             and s not in (u'__dict__', u'__weakref__'))
+        _class_slots[obj_class] = all_slots = tuple(all_slots)
+        return all_slots
+
+def _copy_value(value):
+    """Returns a copy of value that shares everything immutable with it.
+    Used instead of copy.deepcopy for record attributes."""
+    value_type = type(value)
+    if value_type in _immutable_types: return value
+    if value_type is list: return [_copy_value(v) for v in value]
+    if value_type is tuple:
+        if all(type(v) in _immutable_types for v in value): # long fids
+            return value
+        return tuple(_copy_value(v) for v in value)
+    if isinstance(value, MelObject):
+        copied = value_type.__new__(value_type)
+        for attr in _get_class_slots(value_type):
+            try:
+                setattr(copied, attr, _copy_value(getattr(value, attr)))
+            except AttributeError: pass # unset slot
+        value_dict = getattr(value, u'__dict__', None)
+        if value_dict:
+            copied.__dict__.update((k, _copy_value(v)) for k, v
+                                   in value_dict.iteritems())
+        return copied
+    if value_type is bolt.Flags: return value() # clone
+    return copy.deepcopy(value)
+
+def _copy_flat_list(value):
+    return None if value is None else value[:]
+
+def _copy_header(header):
+    return RecordHeader(header.recType, header.size, header.flags1,
+                        header.fid, header.flags2, header.extra)
+
 #------------------------------------------------------------------------------
 # Mod Element Sets ------------------------------------------------------------
 #------------------------------------------------------------------------------
@@ -1780,21 +2467,208 @@ def __init__(self,*elements):
         self.loaders = {}
         self.formElements = set()
         self.firstFull = None
+        self._lazy_loaders = None
+        self._copiers = {}
         for element in self.elements:
             element.getDefaulters(self.defaulters,'')
             element.getLoaders(self.loaders)
             element.hasFids(self.formElements)
+        # Elements may use attributes that MreRecord has too (e.g. 'data') -
+        # those are set on lazily loaded records before anything is decoded,
+        # so such records have to be decoded right away
+        self._can_load_lazily = set(self.getSlotsUsed()).isdisjoint(
+            MreRecord.__slots__)
+        self._bind_elements()
+
+    def _bind_elements(self):
+        """Caches the loadData and dumpData callables of the elements, so
+        that they don't have to be looked up for every subrecord."""
+        self._sig_loaders = {sub_type: loader.loadData for sub_type, loader
+                             in self.loaders.iteritems()}
+        self._dumpers = tuple((element, element.dumpData)
+                              for element in self.elements)
 
     def getSlotsUsed(self):
         """This function returns all of the attributes used in record instances that use this instance."""
-        return [s for element in self.elements for s in element.getSlotsUsed()]
+        # PY3: drop the str() - attribute names are byte strings in python 2,
+        # this way pickling (see parsers.ModFile.load) doesn't have to
+        # write out and decode unicode ones for every record
+        return [str(s) for element in self.elements
+                for s in element.getSlotsUsed()]
 
     def initRecord(self, record, header, ins, do_unpack):
         """Initialize record, setting its attributes based on its elements."""
-        for element in self.elements:
-            element.setDefault(record)
+        if do_unpack == LAZY_UNPACK and not (
+                ins and self._can_load_lazily and
+                record.__class__.loadData.im_func is
+                MelRecord.loadData.im_func):
+            # Shadowed MreRecord attributes or custom loadData
+            do_unpack = True
+        if do_unpack != LAZY_UNPACK:
+            for element in self.elements:
+                element.setDefault(record)
         MreRecord.__init__(record, header, ins, do_unpack)
 
+    def _get_lazy_loaders(self):
+        """Returns a dict mapping each attribute that can be decoded on its
+        own to its loader and the signatures that loader handles, plus a set
+        of all attributes that decoding may produce."""
+        if self._lazy_loaders is None:
+            loader_sigs = {}
+            for sub_type, loader in self.loaders.iteritems():
+                loader_sigs.setdefault(loader, set()).add(sub_type)
+            attr_counts = {}
+            for loader in loader_sigs:
+                for attr in loader.getSlotsUsed():
+                    attr_counts[attr] = attr_counts.get(attr, 0) + 1
+            attr_loaders = {}
+            for loader, sigs in loader_sigs.iteritems():
+                # Skip loaders that depend on other attributes, that only get
+                # some of their subrecords (e.g. due to a distributor) or that
+                # share an attribute with another loader
+                loader_attrs = loader.getSlotsUsed()
+                if (loader.__class__.loadData.im_func not in
+                        _self_contained_loads or sigs != loader.signatures or
+                        any(attr_counts[a] != 1 for a in loader_attrs)):
+                    continue
+                for attr in loader_attrs:
+                    attr_loaders[attr] = (loader, frozenset(sigs))
+            self._lazy_loaders = (attr_loaders, frozenset(self.getSlotsUsed()))
+        return self._lazy_loaders
+
+    @staticmethod
+    def _get_scratch(record):
+        """Returns an empty copy of record to decode subrecords into, so that
+        attributes which were already set on record are left alone."""
+        rec_class = record.__class__
+        scratch = rec_class.__new__(rec_class)
+        for attr in MreRecord.__slots__:
+            setattr(scratch, attr, getattr(record, attr))
+        scratch._lazy_subs = None
+        return scratch
+
+    @staticmethod
+    def _copy_decoded(record, scratch, attrs, fid_elements, fid_mappers):
+        """Catches fids in scratch up with any convertFids calls made while
+        record was still lazy, then copies attrs that are not set on record
+        yet over from scratch."""
+        for mapper in fid_mappers:
+            for element in fid_elements:
+                element.mapFids(scratch, mapper, True)
+        for attr in attrs:
+            if not _is_slot_set(record, attr) and _is_slot_set(scratch, attr):
+                setattr(record, attr, getattr(scratch, attr))
+
+    def load_lazy_attr(self, record, attr):
+        """Decodes the subrecords of lazily loaded record that attr is loaded
+        from and returns attr's value. If attr can't be decoded on its own,
+        decodes the whole record instead."""
+        attr_loaders, mel_attrs = self._get_lazy_loaders()
+        if attr not in mel_attrs:
+            raise AttributeError(u"'%s' object has no attribute '%s'" % (
+                record.__class__.__name__, attr))
+        try:
+            loader, loader_sigs = attr_loaders[attr]
+        except KeyError:
+            self.load_lazy(record)
+            return object.__getattribute__(record, attr)
+        lazy_subs = record._lazy_subs
+        scratch = self._get_scratch(record)
+        loader.setDefault(scratch)
+        load_sub = loader.loadData
+        read_id_prefix = record.recType + '.'
+        with lazy_subs.get_reader(record) as ins:
+            ins_seek = ins.seek
+            for sub_type, sub_pos, sub_size in lazy_subs.get_sub_offsets(
+                    record, ins):
+                if sub_type not in loader_sigs: continue
+                ins_seek(sub_pos)
+                try:
+                    load_sub(scratch, ins, sub_type, sub_size,
+                             read_id_prefix + sub_type)
+                except Exception as error:
+                    self._handle_load_error(error, scratch, ins, sub_type,
+                                            sub_size)
+        fid_elements = set()
+        loader.hasFids(fid_elements)
+        self._copy_decoded(record, scratch, loader.getSlotsUsed(),
+                           fid_elements, lazy_subs.fid_mappers)
+        return object.__getattribute__(record, attr)
+
+    def load_lazy(self, record):
+        """Decodes everything that has not been decoded yet for a lazily
+        loaded record. Does nothing for records that were fully loaded."""
+        lazy_subs = record._lazy_subs
+        if lazy_subs is None: return
+        scratch = self._get_scratch(record)
+        for element in self.elements:
+            element.setDefault(scratch)
+        with lazy_subs.get_reader(record) as ins:
+            self.loadData(scratch, ins, ins.size)
+        record._lazy_subs = None
+        self._copy_decoded(record, scratch, self.getSlotsUsed(),
+                           self.formElements, lazy_subs.fid_mappers)
+
+    def copy_record(self, record):
+        """Returns a copy of the (fully loaded) record, like copy.deepcopy
+        would. Uses a function generated for the record's class, which copies
+        the slots directly, shares immutable values and only copies mutable
+        values (lists, MelObjects, flags) the way their elements need it."""
+        rec_class = record.__class__
+        try:
+            copier = self._copiers[rec_class]
+        except KeyError:
+            copier = self._copiers[rec_class] = self._compile_copier(
+                rec_class)
+        return copier(record)
+
+    def _compile_copier(self, rec_class):
+        """Generates the copy function used by copy_record for instances of
+        rec_class."""
+        # How to copy each attribute of the elements - anything not known
+        # to be safe to share gets copied by _copy_value
+        attr_copiers, unsafe_attrs = {}, set()
+        for element in self.elements:
+            element_type = type(element)
+            if element_type in _scalar_elements:
+                actions = getattr(element, u'actions', None) or ()
+                for attr, action in map(None, element.getSlotsUsed(),
+                                        actions):
+                    if action is None: attr_copiers[attr] = u''
+                    else: unsafe_attrs.add(attr)
+            elif element_type in _flat_list_elements:
+                for attr in element.getSlotsUsed():
+                    attr_copiers[attr] = u'_copy_flat_list'
+            else:
+                unsafe_attrs.update(element.getSlotsUsed())
+        for attr in unsafe_attrs: attr_copiers.pop(attr, None)
+        # Record attributes that are set anew by getTypeCopy or immutable
+        attr_copiers.update({u'recType': u'', u'fid': u'', u'size': u'',
+                             u'flags1_int': u'', u'flags2': u'', u'changed': u'', u'data': u'',
+                             u'inName': u'', u'longFids': u'',
+                             u'header': u'_copy_header'})
+        func_body = [u'copied = _new(_rec_class)']
+        for attr in _get_class_slots(rec_class):
+            if attr == u'_lazy_subs':
+                func_body.append(u'copied._lazy_subs = None')
+                continue
+            attr_copier = attr_copiers.get(attr, u'_copy_value')
+            if _is_plain_attr(attr):
+                func_body.append(u'try: copied.%s = %s(record.%s)' % (
+                    attr, attr_copier, attr))
+            else:
+                func_body.append(u'try: setattr(copied, %r, %s(getattr('
+                                 u'record, %r)))' % (attr, attr_copier, attr))
+            func_body.append(u'except AttributeError: pass') # unset slot
+        if rec_class.__dictoffset__:
+            func_body.append(u'copied.__dict__.update((k, _copy_value(v)) '
+                             u'for k, v in record.__dict__.iteritems())')
+        func_body.append(u'return copied')
+        return _compile_function(u'copy_' + rec_class.__name__, {
+            u'_new': object.__new__, u'_rec_class': rec_class,
+            u'_copy_value': _copy_value, u'_copy_flat_list': _copy_flat_list,
+            u'_copy_header': _copy_header}, u'record', func_body)
+
     def getDefault(self,attr):
         """Returns default instance of specified instance. Only useful for
         MelGroup and MelGroups."""
@@ -1803,7 +2677,7 @@ def getDefault(self,attr):
     def loadData(self,record,ins,endPos):
         """Loads data from input stream. Called by load()."""
         rec_type = record.recType
-        loaders = self.loaders
+        sig_loaders = self._sig_loaders
         # Load each subrecord
         ins_at_end = ins.atEnd
         load_sub_header = ins.unpackSubHeader
@@ -1811,8 +2685,8 @@ def loadData(self,record,ins,endPos):
         while not ins_at_end(endPos, rec_type):
             sub_type, sub_size = load_sub_header(rec_type)
             try:
-                loaders[sub_type].loadData(record, ins, sub_type, sub_size,
-                                           read_id_prefix + sub_type)
+                sig_loaders[sub_type](record, ins, sub_type, sub_size,
+                                      read_id_prefix + sub_type)
             except KeyError:
                 # Wrap this error to make it more understandable
                 self._handle_load_error(
@@ -1833,11 +2707,51 @@ def _handle_load_error(self, error, record, ins, sub_type, sub_size):
         bolt.deprint(u'  file pos = %d' % ins.tell())
         raise error
 
-    def dumpData(self,record, out):
-        """Dumps state into out. Called by getSize()."""
+    def _get_raw_elements(self, record):
+        """Returns a dict mapping the elements of lazily loaded record that
+        were never decoded to the signatures of their subrecords. Those can't
+        have changed, so dumpData writes their original subrecords. Returns
+        an empty dict if any other element still needs decoding."""
+        lazy_subs = record._lazy_subs
+        if lazy_subs is None: return {}
+        attr_loaders = self._get_lazy_loaders()[0]
+        raw_elements = {}
         for element in self.elements:
+            element_attrs = element.getSlotsUsed()
+            if all(_is_slot_set(record, a) for a in element_attrs):
+                continue # decoded (or assigned) already, dump it normally
+            # Give up if it's partly decoded, can't be decoded on its own or
+            # convertFids was called on its original subrecords' fids
+            if (any(_is_slot_set(record, a) for a in element_attrs) or
+                    any(attr_loaders.get(a, (None,))[0] is not element
+                        for a in element_attrs) or
+                    (lazy_subs.fid_mappers and element in self.formElements)):
+                return {}
+            raw_elements[element] = attr_loaders[element_attrs[0]][1]
+        return raw_elements
+
+    def dumpData(self,record, out):
+        """Dumps state into out. Called by getSize(). Elements of lazily
+        loaded records that were never decoded are written straight from their
+        original subrecords."""
+        raw_elements = self._get_raw_elements(record)
+        if raw_elements:
+            lazy_subs = record._lazy_subs
+            with lazy_subs.get_reader(record) as ins:
+                sub_offsets = lazy_subs.get_sub_offsets(record, ins)
+                raw_data = ins.ins
+        else:
+            self.load_lazy(record)
+        for element, dump_element in self._dumpers:
             try:
-                element.dumpData(record,out)
+                if element in raw_elements:
+                    element_sigs = raw_elements[element]
+                    for sub_type, sub_pos, sub_size in sub_offsets:
+                        if sub_type in element_sigs:
+                            out.packSub(sub_type, raw_data[
+                                sub_pos:sub_pos + sub_size])
+                else:
+                    dump_element(record,out)
             except:
                 bolt.deprint(u'Error dumping data: ', traceback=True)
                 bolt.deprint(u'Occurred while dumping '
@@ -1855,6 +2769,7 @@ def dumpData(self,record, out):
 
     def mapFids(self,record,mapper,save=False):
         """Maps fids of subelements."""
+        self.load_lazy(record)
         for element in self.formElements:
             element.mapFids(record,mapper,save)
 
@@ -1863,14 +2778,49 @@ def convertFids(self,record, mapper,toLong):
         toLong should be True if converting to long format or False if converting to short format."""
         if record.longFids == toLong: return
         record.fid = mapper(record.fid)
-        for element in self.formElements:
+        form_elements = self.formElements
+        lazy_subs = record._lazy_subs
+        if lazy_subs is not None:
+            # Map what has already been decoded (or assigned) now, the rest
+            # gets mapped once it is decoded
+            decoded = set()
+            for element in form_elements:
+                attrs_set = [_is_slot_set(record, a)
+                             for a in element.getSlotsUsed()]
+                if all(attrs_set):
+                    decoded.add(element)
+                elif any(attrs_set):
+                    # Can't tell which half needs mapping, decode everything
+                    self.load_lazy(record)
+                    break
+            else:
+                lazy_subs.fid_mappers.append(mapper)
+                form_elements = decoded
+        for element in form_elements:
             element.mapFids(record,mapper,True)
         record.longFids = toLong
         record.setChanged()
 
+    def convert_fids_bulk(self, records, mapper, toLong):
+        """Converts fids of all the specified records (instances of classes
+        using this MelSet) like convertFids does, but maps the fids of fully
+        loaded records in a single loop over records and form elements."""
+        element_mappers = [element.mapFids for element in self.formElements]
+        for record in records:
+            if record.longFids == toLong: continue
+            if record._lazy_subs is not None:
+                self.convertFids(record, mapper, toLong)
+                continue
+            record.fid = mapper(record.fid)
+            for map_fids in element_mappers:
+                map_fids(record, mapper, True)
+            record.longFids = toLong
+            record.setChanged()
+
     def updateMasters(self,record,masters):
         """Updates set of master names according to masters actually used."""
         if not record.longFids: raise exception.StateError("Fids not in long format")
+        self.load_lazy(record)
         def updater(fid):
             masters.add(fid)
         updater(record.fid)
@@ -1893,6 +2843,7 @@ def with_distributor(self, distributor_config):
         self.elements += (distributor,)
         distributor.getLoaders(self.loaders)
         distributor.set_mel_set(self)
+        self._bind_elements()
         return self
 
 #------------------------------------------------------------------------------
@@ -2207,6 +3158,23 @@ def dump(self,out):
         if not self.data: raise exception.StateError(u'Data undefined: ' + self.subType)
         out.packSub(self.subType,self.data)
 
+#------------------------------------------------------------------------------
+class _RecordFlags(bolt.Flags):
+    """bolt.Flags view of the flags1_int of a record, see MreRecord.flags1."""
+    __slots__ = ('_record',)
+
+    def __init__(self, record):
+        object.__setattr__(self, '_record', record)
+        object.__setattr__(self, '_names', MreRecord.flags1_._names)
+
+    @property
+    def _field(self):
+        return self._record.flags1_int
+
+    @_field.setter
+    def _field(self, value):
+        self._record.flags1_int = value
+
 #------------------------------------------------------------------------------
 class MreRecord(object):
     """Generic Record. flags1 are game specific see comments."""
@@ -2309,7 +3277,13 @@ class MreRecord(object):
         # MultiBound
         (31,'multiBound'), # {0x80000000}
         ))
-    __slots__ = ['header','recType','fid','flags1','size','flags2','changed','subrecords','data','inName','longFids',]
+    #--Masks for the most often checked flags, see flags1_ - hot code should
+    # test flags1_int against these rather than go through flags1
+    deleted_mask = 0x00000020
+    persistent_mask = 0x00000400
+    ignored_mask = 0x00001000
+    compressed_mask = _compressed_flag
+    __slots__ = ['header','recType','fid','flags1_int','size','flags2','changed','subrecords','data','inName','longFids',]
     #--Set at end of class data definitions.
     type_class = None
     simpleTypes = None
@@ -2319,7 +3293,7 @@ def __init__(self, header, ins=None, do_unpack=False):
         self.header = header
         self.recType = header.recType
         self.fid = header.fid
-        self.flags1 = MreRecord.flags1_(header.flags1)
+        self.flags1_int = int(header.flags1)
         self.size = header.size
         self.flags2 = header.flags2
         self.longFids = False #--False: Short (numeric); True: Long (espname,objectindex)
@@ -2337,6 +3311,16 @@ def __repr__(self):
                                      and self.eid is not None else u''),
         }
 
+    @property
+    def flags1(self):
+        """A bolt.Flags view of the record flags (see flags1_), created on
+        demand - setting flags on it sets them on the record."""
+        return _RecordFlags(self)
+
+    @flags1.setter
+    def flags1(self, flags):
+        self.flags1_int = int(flags)
+
     def getHeader(self):
         """Returns header tuple."""
         return self.header
@@ -2371,14 +3355,8 @@ def mergeFilter(self,modSet):
 
     def getDecompressed(self):
         """Return self.data, first decompressing it if necessary."""
-        if not self.flags1.compressed: return self.data
-        size, = struct_unpack('I', self.data[:4])
-        decomp = zlib.decompress(self.data[4:])
-        if len(decomp) != size:
-            raise exception.ModError(self.inName,
-                u'Mis-sized compressed data. Expected %d, got %d.'
-                                     % (size,len(decomp)))
-        return decomp
+        if not self.flags1_int & _compressed_flag: return self.data
+        return _decompress(self.inName, self.data)
 
     def load(self, ins=None, do_unpack=False):
         """Load data from ins stream or internal data buffer."""
@@ -2387,17 +3365,20 @@ def load(self, ins=None, do_unpack=False):
         if not do_unpack:
             self.data = ins.read(self.size,type)
         #--Unbuffered analysis?
-        elif ins and not self.flags1.compressed:
+        elif ins and not self.flags1_int & _compressed_flag:
             inPos = ins.tell()
             self.data = ins.read(self.size,type)
             ins.seek(inPos,0,type+'_REWIND') # type+'_REWIND' is just for debug
             self.loadData(ins,inPos+self.size)
         #--Buffered analysis (subclasses only)
         else:
+            decomp = None
             if ins:
+                decomp = ins.take_decompressed(ins.tell())
                 self.data = ins.read(self.size,type)
             if not self.__class__ == MreRecord:
-                with self.getReader() as reader:
+                with (self.getReader() if decomp is None else
+                      MemoryModReader(self.inName, decomp)) as reader:
                     # Check This
                     if ins and ins.hasStrings: reader.setStringTable(ins.strings)
                     self.loadData(reader,reader.size)
@@ -2450,20 +3431,59 @@ def setData(self,data):
     def getSize(self):
         """Return size of self.data, after, if necessary, packing it."""
         if not self.changed: return self.size
+        #--Pack data and return size.
+        self.data = self._dump_uncompressed()
+        if self.flags1_int & _compressed_flag:
+            self.data = _compress(self.data)
+        self.size = len(self.data)
+        self.setChanged(False)
+        return self.size
+
+    def _dump_uncompressed(self):
+        """Returns the packed data of this record, before compression."""
         if self.longFids: raise exception.StateError(
             u'Packing Error: %s %s: Fids in long format.'
             % (self.recType,self.fid))
-        #--Pack data and return size.
         with ModWriter(sio()) as out:
             self.dumpData(out)
-            self.data = out.getvalue()
-        if self.flags1.compressed:
-            dataLen = len(self.data)
-            comp = zlib.compress(self.data,6)
-            self.data = struct_pack('=I', dataLen) + comp
-        self.size = len(self.data)
-        self.setChanged(False)
-        return self.size
+            return out.getvalue()
+
+    # Number of records pack_compressed dumps at a time
+    _pack_batch_size = 256
+
+    @staticmethod
+    def pack_compressed(records, compression_level=6, pool=None):
+        """Packs the changed, compressed records among records at the
+        specified zlib compression level, so that getSize won't have to. If
+        pool (a ThreadPool) is given, the packed data is compressed by its
+        worker threads - zlib releases the GIL. Records are dumped in
+        batches, with a pool the next batch is dumped while the last one is
+        compressed - so at most two batches of uncompressed data are held."""
+        to_pack = (r for r in records if r.changed
+                   and r.flags1_int & _compressed_flag)
+        compress = partial(_compress, compression_level=compression_level)
+        pending = None # batch being compressed by pool and its result
+        while True:
+            batch = list(islice(to_pack, MreRecord._pack_batch_size))
+            if batch:
+                datas = [r._dump_uncompressed() for r in batch]
+                if pool is None:
+                    MreRecord._set_packed(batch, imap(compress, datas))
+                    continue
+                result = pool.map_async(compress, datas, chunksize=16)
+            if pending is not None:
+                MreRecord._set_packed(pending[0], pending[1].get())
+            if not batch: break
+            pending = batch, result
+
+    @staticmethod
+    def _set_packed(records, packed):
+        """Sets the compressed datas in packed on the matching records - see
+        pack_compressed."""
+        for record, data in izip(records, packed):
+            record.data = data
+            record.size = len(data)
+            record.setChanged(False)
 
     def dumpData(self,out):
         """Dumps state into data. Called by getSize(). This default version
@@ -2477,19 +3497,20 @@ def dumpData(self,out):
     def dump(self,out):
         """Dumps all data to output stream."""
         if self.changed: raise exception.StateError(u'Data changed: ' + self.recType)
-        if not self.data and not self.flags1.deleted and self.size > 0:
+        if not self.data and not self.flags1_int & MreRecord.deleted_mask \
+                and self.size > 0:
             raise exception.StateError(u'Data undefined: ' + self.recType + u' ' + hex(self.fid))
         #--Update the header so it 'packs' correctly
         self.header.size = self.size
         if self.recType != 'GRUP':
-            self.header.flags1 = self.flags1
+            self.header.flags1 = self.flags1_int
             self.header.fid = self.fid
         out.write(self.header.pack())
         if self.size > 0: out.write(self.data)
 
     def getReader(self):
         """Returns a ModReader wrapped around (decompressed) self.data."""
-        return ModReader(self.inName,sio(self.getDecompressed()))
+        return MemoryModReader(self.inName, self.getDecompressed())
 
     #--Accessing subrecords ---------------------------------------------------
     def getSubString(self,subType):
@@ -2501,7 +3522,7 @@ def getSubString(self,subType):
         # If not MreRecord, then we will have info in data.
         if self.__class__ != MreRecord:
             if attr not in self.__slots__: return value
-            return self.__getattribute__(attr)
+            return getattr(self, attr)
         # Subrecords available?
         if self.subrecords is not None:
             for subrecord in self.subrecords:
@@ -2533,11 +3554,46 @@ def loadInfos(self,ins,endPos,infoClass):
 class MelRecord(MreRecord):
     """Mod record built from mod record elements."""
     melSet = None #--Subclasses must define as MelSet(*mels)
-    __slots__ = []
+    __slots__ = ['_lazy_subs']
 
     def __init__(self, header, ins=None, do_unpack=False):
+        self._lazy_subs = None
         self.__class__.melSet.initRecord(self, header, ins, do_unpack)
 
+    def __getattr__(self, attr):
+        # Only called for attributes that are not set - if this record was
+        # loaded with LAZY_UNPACK, they may still have to be decoded
+        try:
+            lazy_subs = object.__getattribute__(self, '_lazy_subs')
+        except AttributeError:
+            lazy_subs = None
+        if lazy_subs is None:
+            raise AttributeError(u"'%s' object has no attribute '%s'" % (
+                self.__class__.__name__, attr))
+        return self.__class__.melSet.load_lazy_attr(self, attr)
+
+    def load(self, ins=None, do_unpack=False):
+        """Load data from ins stream or internal data buffer. With
+        LAZY_UNPACK, only reads the data - see MelSet.load_lazy_attr."""
+        if do_unpack != LAZY_UNPACK:
+            MreRecord.load(self, ins, do_unpack)
+        else:
+            decomp = ins.take_decompressed(ins.tell())
+            self.data = ins.read(self.size, self.recType)
+            self._lazy_subs = _LazySubrecords(ins)
+            self._lazy_subs.decompressed = decomp
+
+    def getTypeCopy(self,mapper=None):
+        """Returns a type class copy of self, optionaly mapping fids to long."""
+        melSet = self.__class__.melSet
+        melSet.load_lazy(self)
+        myCopy = melSet.copy_record(self)
+        if mapper and not myCopy.longFids:
+            myCopy.convertFids(mapper,True)
+        myCopy.changed = True
+        myCopy.data = None
+        return myCopy
+
     def getDefault(self,attr):
         """Returns default instance of specified instance. Only useful for
         MelGroup and MelGroups."""
@@ -2564,6 +3620,157 @@ def updateMasters(self,masters):
         """Updates set of master names according to masters actually used."""
         self.__class__.melSet.updateMasters(self,masters)
 
+#------------------------------------------------------------------------------
+class RecordProfiler(object):
+    """Opt-in profiling of record loading and dumping. Counts the calls,
+    bytes and time spent in MelSet.loadData, MelSet.load_lazy_attr,
+    MelSet.dumpData, MreRecord.getSize, MreRecord.pack_compressed and
+    MobObjects.loadData per record signature and plugin. Enabling it
+    replaces those methods with timing wrappers and disabling it puts the
+    originals back, so it costs nothing while it is not enabled.
+
+    Lazy attribute loads only count attributes decoded on their own - a
+    lazy record decoded in full goes through loadData and is counted as a
+    record load. Records packed by pack_compressed are counted as record
+    packs, with the time of the whole call split between their signatures
+    by packed size, since a pool compresses several of them at once."""
+    # Reported operations, in the order they are reported in
+    _operations = (u'group load', u'record load', u'lazy attribute load',
+                   u'record dump', u'record pack')
+
+    def __init__(self):
+        # (operation, signature, plugin) -> [count, bytes, seconds]
+        self.stats = {}
+        self._originals = []
+
+    def _get_stat(self, operation, signature, plugin):
+        stat_key = (operation, signature, plugin)
+        try:
+            return self.stats[stat_key]
+        except KeyError:
+            self.stats[stat_key] = stat = [0, 0, 0.0]
+            return stat
+
+    def enable(self):
+        """Starts collecting stats by wrapping the profiled methods."""
+        if self._originals: return # already enabled
+        from .record_groups import MobObjects
+        get_stat, timer = self._get_stat, default_timer
+        def group_load(group, ins, endPos, _load=MobObjects.loadData.__func__):
+            start_pos, start = ins.tell(), timer()
+            _load(group, ins, endPos)
+            stat = get_stat(u'group load', group.label, ins.inName)
+            stat[0] += 1
+            stat[1] += endPos - start_pos
+            stat[2] += timer() - start
+        def record_load(mel_set, record, ins, endPos,
+                        _load=MelSet.loadData.__func__):
+            start_pos, start = ins.tell(), timer()
+            _load(mel_set, record, ins, endPos)
+            stat = get_stat(u'record load', record.recType, ins.inName)
+            stat[0] += 1
+            stat[1] += endPos - start_pos
+            stat[2] += timer() - start
+        def lazy_load(mel_set, record, attr,
+                      _load=MelSet.load_lazy_attr.__func__):
+            attr_loaders = mel_set._get_lazy_loaders()[0]
+            if attr not in attr_loaders: # decodes the whole record
+                return _load(mel_set, record, attr)
+            lazy_subs, start = record._lazy_subs, timer()
+            attr_value = _load(mel_set, record, attr)
+            seconds = timer() - start
+            loader_sigs = attr_loaders[attr][1]
+            stat = get_stat(u'lazy attribute load', record.recType,
+                            record.inName)
+            stat[0] += 1
+            stat[1] += sum(sub_size for sub_type, sub_pos, sub_size
+                           in lazy_subs.sub_offsets if sub_type in loader_sigs)
+            stat[2] += seconds
+            return attr_value
+        def record_dump(mel_set, record, out, _dump=MelSet.dumpData.__func__):
+            start_pos, start = out.tell(), timer()
+            _dump(mel_set, record, out)
+            stat = get_stat(u'record dump', record.recType, record.inName)
+            stat[0] += 1
+            stat[1] += out.tell() - start_pos
+            stat[2] += timer() - start
+        def record_pack(record, _get_size=MreRecord.getSize.__func__):
+            if not record.changed: return _get_size(record) # nothing to pack
+            start = timer()
+            packed_size = _get_size(record)
+            stat = get_stat(u'record pack', record.recType, record.inName)
+            stat[0] += 1
+            stat[1] += packed_size
+            stat[2] += timer() - start
+            return packed_size
+        def records_pack(records, compression_level=6, pool=None,
+                         _pack=MreRecord.pack_compressed):
+            records = [r for r in records if r.changed
+                       and r.flags1_int & _compressed_flag]
+            start = timer()
+            _pack(records, compression_level, pool)
+            seconds = timer() - start
+            total_size = sum(r.size for r in records) or 1
+            for record in records:
+                stat = get_stat(u'record pack', record.recType, record.inName)
+                stat[0] += 1
+                stat[1] += record.size
+                stat[2] += seconds * record.size / total_size
+        for owner, method_name, wrapper in (
+                (MobObjects, 'loadData', group_load),
+                (MelSet, 'loadData', record_load),
+                (MelSet, 'load_lazy_attr', lazy_load),
+                (MelSet, 'dumpData', record_dump),
+                (MreRecord, 'getSize', record_pack),
+                (MreRecord, 'pack_compressed', staticmethod(records_pack))):
+            self._originals.append(
+                (owner, method_name, owner.__dict__[method_name]))
+            setattr(owner, method_name, wrapper)
+
+    def disable(self):
+        """Stops collecting stats, restoring the profiled methods. The stats
+        collected so far are kept."""
+        for owner, method_name, original in reversed(self._originals):
+            setattr(owner, method_name, original)
+        del self._originals[:]
+
+    def get_report(self):
+        """Returns the collected stats as lines of text, summed up per
+        signature and per plugin for each operation, slowest first."""
+        report = []
+        for operation in self._operations:
+            for title, key_index in ((u'signature', 1), (u'plugin', 2)):
+                totals = {}
+                for stat_key, (count, size, seconds) in self.stats.iteritems():
+                    if stat_key[0] != operation: continue
+                    total = totals.setdefault(
+                        u'%s' % (stat_key[key_index] or u'<none>'),
+                        [0, 0, 0.0])
+                    total[0] += count
+                    total[1] += size
+                    total[2] += seconds
+                if not totals: continue
+                report.append(u'== %s per %s' % (operation, title))
+                report.append(u'%10s %14s %10s  %s' % (
+                    u'count', u'bytes', u'seconds', title))
+                for key, (count, size, seconds) in sorted(
+                        totals.iteritems(), key=lambda t: -t[1][2]):
+                    report.append(u'%10d %14d %10.3f  %s' % (
+                        count, size, seconds, key))
+        return report
+
+    def save_json(self, json_path):
+        """Writes the collected stats to the specified JSON file, one entry
+        per operation, signature and plugin."""
+        json_stats = sorted(({u'operation': operation, u'signature': signature,
+            u'plugin': u'%s' % (plugin or u'<none>'), u'count': count,
+            u'bytes': size, u'seconds': seconds} for
+            (operation, signature, plugin), (count, size, seconds)
+            in self.stats.iteritems()), key=itemgetter(
+            u'operation', u'signature', u'plugin'))
+        with json_path.open('wb') as out:
+            json.dump(json_stats, out, indent=1)
+
 #------------------------------------------------------------------------------
 #-- Common Records
 #------------------------------------------------------------------------------
@@ -2691,9 +3898,10 @@ class MreLand(MelRecord):
 
     melSet = MelSet(
         MelBase('DATA', 'unknown'),
-        MelBase('VNML', 'vertex_normals'),
+        MelStructArray('VNML', 'vertex_normals', '3B', 'x', 'y', 'z'),
         MelBase('VHGT', 'vertex_height_map'),
-        MelBase('VCLR', 'vertex_colors'),
+        MelStructArray('VCLR', 'vertex_colors', '3B', 'red', 'green',
+                       'blue'),
         MelGroups('layers',
             # Start a new layer each time we hit one of these
             MelUnion({
@@ -2764,11 +3972,11 @@ def mergeWith(self,other,otherMod):
         #--Relevel or not?
         if other.relevs:
             for attr in self.__class__.top_copy_attrs:
-                self.__setattr__(attr,other.__getattribute__(attr))
+                self.__setattr__(attr,getattr(other, attr))
             self.flags = other.flags()
         else:
             for attr in self.__class__.top_copy_attrs:
-                otherAttr = other.__getattribute__(attr)
+                otherAttr = getattr(other, attr)
                 if otherAttr is not None:
                     self.__setattr__(attr, otherAttr)
             self.flags |= other.flags
@@ -191,5 +191,19 @@ def detect_and_set_game(cli_game_dir=u'', bash_ini_=None, name=None):
                   for g in foundGames}
     return game_icons.keys(), game_icons
 
+def init_worker_game(game_fsName, game_path_):
+    """Sets up the game in a worker process of the current one - e.g. those
+    of parsers.make_parse_pool. Processes that were forked inherit the game,
+    spawned ones start out without one (or a translation installed)."""
+    if game is not None: return
+    import __builtin__
+    if u'_' not in __builtin__.__dict__:
+        import gettext
+        gettext.NullTranslations().install(unicode=True)
+    detect_and_set_game(game_path_)
+    if game.fsName != game_fsName:
+        raise BoltError(u'Worker detected %s instead of %s' % (
+            game.fsName, game_fsName))
+
 def game_path(display_name): return foundGames[_display_fsName[display_name]]
 def get_display_name(fs_name): return _fsName_display[fs_name]
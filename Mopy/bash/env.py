@@ -30,8 +30,11 @@
 import re as _re
 import shutil as _shutil
 import stat
-from ctypes import byref, c_wchar_p, c_void_p, POINTER, Structure, windll, \
-    wintypes
+from ctypes import byref, c_wchar_p, c_void_p, POINTER, Structure
+try:
+    from ctypes import windll, wintypes
+except (ImportError, ValueError): # linux - wintypes raises a ValueError
+    windll = wintypes = None
 from uuid import UUID
 
 from .bolt import GPath, deprint, Path, decode, struct_unpack
@@ -779,21 +782,22 @@ def getJava():
 # https://gist.github.com/mkropat/7550097 by Michael Kropat
 # Modifications made for py3 compatibility and to conform to our code style
 # BEGIN MIT-LICENSED PART =====================================================
-# http://msdn.microsoft.com/en-us/library/windows/desktop/aa373931.aspx
-class GUID(Structure):
-    _fields_ = [
-        ("Data1", wintypes.DWORD),
-        ("Data2", wintypes.WORD),
-        ("Data3", wintypes.WORD),
-        ("Data4", wintypes.BYTE * 8)
-    ]
-
-    def __init__(self, uuid_):
-        super(GUID, self).__init__()
-        self.Data1, self.Data2, self.Data3, self.Data4[0], self.Data4[1], \
-        rest = uuid_.fields
-        for i in range(2, 8):
-            self.Data4[i] = rest>>(8 - i - 1)*8 & 0xff
+if windll: # the known folder functions below are Windows only
+    # http://msdn.microsoft.com/en-us/library/windows/desktop/aa373931.aspx
+    class GUID(Structure):
+        _fields_ = [
+            ("Data1", wintypes.DWORD),
+            ("Data2", wintypes.WORD),
+            ("Data3", wintypes.WORD),
+            ("Data4", wintypes.BYTE * 8)
+        ]
+
+        def __init__(self, uuid_):
+            super(GUID, self).__init__()
+            self.Data1, self.Data2, self.Data3, self.Data4[0], self.Data4[1], \
+            rest = uuid_.fields
+            for i in range(2, 8):
+                self.Data4[i] = rest>>(8 - i - 1)*8 & 0xff
 
 # http://msdn.microsoft.com/en-us/library/windows/desktop/dd378457.aspx
 class FOLDERID(object):
@@ -892,32 +896,33 @@ class FOLDERID(object):
     VideosLibrary           = UUID('{491E922F-5643-4AF4-A7EB-4E7A138D8174}')
     Windows                 = UUID('{F38BF404-1D43-42F2-9305-67DE0B28FC23}')
 
-# http://msdn.microsoft.com/en-us/library/windows/desktop/bb762188.aspx
-class UserHandle(object):
-    current = wintypes.HANDLE(0)
-    common  = wintypes.HANDLE(-1)
-
-# http://msdn.microsoft.com/en-us/library/windows/desktop/ms680722.aspx
-_CoTaskMemFree = windll.ole32.CoTaskMemFree
-_CoTaskMemFree.restype= None
-_CoTaskMemFree.argtypes = [c_void_p]
-
-# http://msdn.microsoft.com/en-us/library/windows/desktop/bb762188.aspx
-# http://web.archive.org/web/20111025090317/http://www.themacaque.com/?p=954
-_SHGetKnownFolderPath = windll.shell32.SHGetKnownFolderPath
-_SHGetKnownFolderPath.argtypes = [
-    POINTER(GUID), wintypes.DWORD, wintypes.HANDLE, POINTER(c_wchar_p)
-]
-
-def get_known_path(known_folder_id, user_handle=UserHandle.current):
-    kf_id = GUID(known_folder_id)
-    pPath = c_wchar_p()
-    S_OK = 0
-    if _SHGetKnownFolderPath(byref(kf_id), 0, user_handle,
-                             byref(pPath)) != S_OK:
-        raise RuntimeError(u"Failed to retrieve known folder path '%r'" %
-                           known_folder_id)
-    path = pPath.value
-    _CoTaskMemFree(pPath)
-    return path
+if windll:
+    # http://msdn.microsoft.com/en-us/library/windows/desktop/bb762188.aspx
+    class UserHandle(object):
+        current = wintypes.HANDLE(0)
+        common  = wintypes.HANDLE(-1)
+
+    # http://msdn.microsoft.com/en-us/library/windows/desktop/ms680722.aspx
+    _CoTaskMemFree = windll.ole32.CoTaskMemFree
+    _CoTaskMemFree.restype= None
+    _CoTaskMemFree.argtypes = [c_void_p]
+
+    # http://msdn.microsoft.com/en-us/library/windows/desktop/bb762188.aspx
+    # http://web.archive.org/web/20111025090317/http://www.themacaque.com/?p=954
+    _SHGetKnownFolderPath = windll.shell32.SHGetKnownFolderPath
+    _SHGetKnownFolderPath.argtypes = [
+        POINTER(GUID), wintypes.DWORD, wintypes.HANDLE, POINTER(c_wchar_p)
+    ]
+
+    def get_known_path(known_folder_id, user_handle=UserHandle.current):
+        kf_id = GUID(known_folder_id)
+        pPath = c_wchar_p()
+        S_OK = 0
+        if _SHGetKnownFolderPath(byref(kf_id), 0, user_handle,
+                                 byref(pPath)) != S_OK:
+            raise RuntimeError(u"Failed to retrieve known folder path '%r'" %
+                               known_folder_id)
+        path = pPath.value
+        _CoTaskMemFree(pPath)
+        return path
 # END MIT-LICENSED PART =======================================================
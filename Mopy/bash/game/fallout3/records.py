@@ -37,7 +37,7 @@
     MelRaceVoices, MelBounds, null1, null2, null3, null4, MelScriptVars, \
     MelSequential, MelTruncatedStruct, PartialLoadDecider, MelReadOnly, \
     MelCoordinates, MelIcons, MelIcons2, MelIcon, MelIco2, MelEdid, MelFull, \
-    MelArray, MelWthrColors, MreLeveledListBase
+    MelArray, MelWthrColors, MreLeveledListBase, MelStructArray
 from ...exception import BoltError, ModError, ModSizeError, StateError
 # Set MelModel in brec but only if unset
 if brec.MelModel is None:
@@ -125,6 +125,9 @@ def setDefault(self, record):
             MelStruct.setDefault(self, record)
             record.form1234 = 'iiII'
 
+        def getSlotsUsed(self):
+            return MelStruct.getSlotsUsed(self) + ('form1234',)
+
         def hasFids(self, formElements):
             formElements.add(self)
 
@@ -2033,13 +2036,11 @@ class MreNavm(MelRecord):
         MelEdid(),
         MelUInt32('NVER', ('version', 11)),
         MelStruct('DATA','I5I',(FID,'cell'),'vertexCount','triangleCount','enternalConnectionsCount','nvcaCount','doorsCount'),
-        MelArray('vertices',
-            MelStruct('NVVX', '3f', 'vertexX', 'vertexY', 'vertexZ'),
-        ),
-        MelArray('triangles',
-            MelStruct('NVTR', '6hI', 'vertex0', 'vertex1', 'vertex2',
-                      'triangle0', 'triangle1', 'triangle2', 'flags'),
-        ),
+        MelStructArray('NVVX', 'vertices', '3f', 'vertexX', 'vertexY',
+                       'vertexZ'),
+        MelStructArray('NVTR', 'triangles', '6hI', 'vertex0', 'vertex1',
+                       'vertex2', 'triangle0', 'triangle1', 'triangle2',
+                       'flags'),
         MelOptSInt16('NVCA', 'nvca_p'),
         MelArray('doors',
             MelStruct('NVDP', 'IH2s', (FID, 'doorReference'), 'door_triangle',
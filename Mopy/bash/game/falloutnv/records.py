@@ -37,8 +37,7 @@
     MelSInt16, MelSInt32, MelUInt8, MelUInt32, MelOptFid, MelOptFloat, \
     MelOptSInt32, MelOptUInt8, MelOptUInt16, MelOptUInt32, MelBounds, null1, \
     null2, null3, null4, MelTruncatedStruct, MelReadOnly, MelCoordinates, \
-    MelIcons, MelIcons2, MelIcon, MelIco2, MelEdid, MelFull, MelArray, \
-    MelObject
+    MelIcons, MelIcons2, MelIcon, MelIco2, MelEdid, MelFull, MelArray
 from ...exception import ModSizeError
 
 #------------------------------------------------------------------------------
@@ -1736,13 +1735,12 @@ def loadData(self, record, ins, sub_type, size_, readId):
                 # Copied and adjusted from MelArray. Yuck. See comment below
                 # docstring for some ideas for getting rid of this
                 append_entry = getattr(record, self.attr).append
-                entry_slots = self._element_old.attrs
+                entry_class = self._entry_class
                 entry_size = struct.calcsize('3Bs3Bs3Bs3Bs')
                 load_entry = self._element_old.loadData
                 for x in xrange(size_ // entry_size):
-                    arr_entry = MelObject()
+                    arr_entry = entry_class()
                     append_entry(arr_entry)
-                    arr_entry.__slots__ = entry_slots
                     load_entry(arr_entry, ins, sub_type, entry_size, readId)
             else:
                 _expected_sizes = (self._new_sizes[sub_type],
@@ -99,6 +99,9 @@ def setDefault(self, record):
             MelStruct.setDefault(self, record)
             record.form12 = 'ii'
 
+        def getSlotsUsed(self):
+            return MelStruct.getSlotsUsed(self) + ('form12',)
+
         def hasFids(self, formElements):
             formElements.add(self)
 
@@ -37,7 +37,8 @@
     MelOptSInt16, MelOptSInt32, MelOptUInt8, MelOptUInt16, MelOptUInt32, \
     MelOptFid, MelCounter, MelPartialCounter, MelBounds, null1, null2, null3, \
     null4, MelSequential, MelTruncatedStruct, MelIcons, MelIcons2, MelIcon, \
-    MelIco2, MelEdid, MelFull, MelArray, MelWthrColors, GameDecider
+    MelIco2, MelEdid, MelFull, MelArray, MelWthrColors, GameDecider, \
+    get_mel_object_class
 from ...exception import BoltError, ModError, ModSizeError, StateError
 # Set MelModel in brec but only if unset, otherwise we are being imported from
 # fallout4.records
@@ -221,6 +222,9 @@ def setDefault(self, record):
             MelStruct.setDefault(self, record)
             record.form12345 = 'iiIIi'
 
+        def getSlotsUsed(self):
+            return MelStruct.getSlotsUsed(self) + ('form12345',)
+
         def hasFids(self, formElements):
             formElements.add(self)
 
@@ -512,14 +516,8 @@ def make_new(self):
         try:
             return self._component_class()
         except AttributeError:
-            # TODO(inf) This seems to work - what we're currently doing in
-            #  records code, namely reassigning __slots__, does *nothing*:
-            #  https://stackoverflow.com/questions/27907373/dynamically-change-slots-in-python-3
-            #  Fix that by refactoring class creation like this for
-            #  MelBase/MelSet etc.!
-            class _MelComponentInstance(MelObject):
-                __slots__ = self.used_slots
-            self._component_class = _MelComponentInstance # create only once
+            # create only once
+            self._component_class = get_mel_object_class(self.used_slots)
             return self._component_class()
 
     # Note that there is no has_fids - components (e.g. properties) with fids
@@ -26,22 +26,29 @@
 and the Mod_Import/Export Mods menu."""
 from __future__ import division, print_function
 import ctypes
+from array import array
 from _ctypes import POINTER
 from ctypes import cast, c_ulong
 from operator import attrgetter, itemgetter
 from collections import defaultdict, Counter
+from itertools import chain
+from multiprocessing.pool import ThreadPool
+import cPickle
+import copy
+import multiprocessing
 import re
+import struct
+import zlib
 # Internal
 from . import bolt
 from . import bush # for game
 from . import env
 from . import load_order
-from .balt import Progress
 from .bolt import GPath, decode, deprint, CsvReader, csvFormat, SubProgress, \
-    struct_pack, struct_unpack
+    struct_pack, struct_unpack, get_struct
 from .bass import dirs, inisettings
-from .brec import MreRecord, MelObject, _coerce, genFid, ModReader, ModWriter, \
-    RecordHeader
+from .brec import MreRecord, MelObject, _coerce, genFid, MemoryModReader, \
+    ModWriter, RecordHeader, GrupHeader, FidCache, get_long_fids
 from .cint import ObCollection, FormID, aggregateTypes, validTypes, \
     MGEFCode, ActorValue, ValidateList, pickupables, ExtractExportList, \
     ValidateDict, IUNICODE, getattr_deep, setattr_deep
@@ -1707,6 +1714,7 @@ def writeToText(self,textPath,skip,folder,deprefix,esp,skipcomments):
         z = 0
         num = 0
         r = len(deprefix)
+        from .balt import Progress
         with Progress(_(u"Export Scripts")) as progress:
             for eid in sorted(eid_data, key=lambda b: (b, eid_data[b][1])):
                 text, longid = eid_data[eid]
@@ -1748,6 +1756,7 @@ def readFromMod(self, modInfo, file_):
         modFile = ModFile(modInfo,loadFactory)
         modFile.load(True)
         mapper = modFile.getLongMapper()
+        from .balt import Progress
         with Progress(_(u"Export Scripts")) as progress:
             records = modFile.SCPT.getActiveRecords()
             y = len(records)
@@ -1797,6 +1806,7 @@ def readFromText(self,textPath,modInfo):
         patches folder."""
         eid_data = self.eid_data
         textPath = GPath(textPath)
+        from .balt import Progress
         with Progress(_(u"Import Scripts")) as progress:
             for root_dir, dirs, files in textPath.walk():
                 y = len(files)
@@ -1831,6 +1841,7 @@ def readFromMod(self, modInfo, file_):
         with ObCollection(ModsPath=dirs['mods'].s) as Current:
             modFile = Current.addMod(modInfo.getPath().stail,LoadMasters=False)
             Current.load()
+            from .balt import Progress
             with Progress(_(u"Export Scripts")) as progress:
                 records = modFile.SCPT
                 y = len(records)
@@ -1874,6 +1885,7 @@ def readFromText(self,textPath,modInfo):
         patches folder."""
         eid_data = self.eid_data
         textPath = GPath(textPath)
+        from .balt import Progress
         with Progress(_(u"Import Scripts")) as progress:
             for root_dir, dirs, files in textPath.walk():
                 y = len(files)
@@ -3846,10 +3858,87 @@ def getOrdered(self):
         """Returns masters in proper load order."""
         return load_order.get_ordered(self)
 
+def _long_mapper(masters):
+    """Returns a mapping function to map short fids to long fids, for a
+    plugin with the specified masters followed by its own name. See
+    ModFile.getLongMapper."""
+    maxMaster = len(masters)-1
+    # Long fids are interned, see brec.get_long_fids
+    long_fids = [get_long_fids(master) for master in masters]
+    def mapper(fid):
+        if fid is None: return None
+        if isinstance(fid,tuple): return fid
+        mod,object = int(fid >> 24),int(fid & 0xFFFFFF)
+        mod = min(mod,maxMaster)
+        try:
+            return long_fids[mod][object]
+        except KeyError:
+            return long_fids[mod].setdefault(object,(masters[mod],object))
+    return mapper
+
+#--Parsing top groups in worker processes, see ModFile.load
+# Top groups smaller than this are parsed by the loading process itself,
+# sending them to a worker would cost more than it saves
+_min_parse_size = 256 * 1024
+# Groups holding lazily unpacked cell children can't convert their fids to
+# long in the workers - that gets queued as closures, see MobCell.convertFids.
+# Nor can they be parsed in the workers for localized plugins, the children
+# keep the string table (which holds the mapped strings files)
+_cell_tops = {'CELL', 'WRLD'}
+# (strings paths, language, their sizes and mtimes) and the StringTable last
+# loaded by this worker - kept unmapped between tasks, workers live as long
+# as their pool and must not keep the strings files open (locked on Windows)
+_worker_strings = [None, None]
+
+def make_parse_pool(processes=None):
+    """Returns a pool of worker processes for ModFile.load to parse top
+    groups in. Defaults to one worker per CPU. The workers set up the current
+    game for themselves if they don't inherit it, see
+    bush.init_worker_game."""
+    return multiprocessing.Pool(processes, bush.init_worker_game,
+                                (bush.game.fsName, bush.game.gamePath.s))
+
+def _parse_top_group(plugin_name, plugin_path, offset, loadFactory,
+                     strings_paths, strings_lang, long_masters):
+    """Parses the top group at offset in the specified plugin, in a worker
+    process of make_parse_pool. Converts its fids to long if long_masters,
+    the masters of the plugin followed by its name, are given. Returns the
+    group pickled, along with whether its fids were converted."""
+    strings = None
+    if strings_paths:
+        strings_key = (strings_paths, strings_lang,
+                       [path.size_mtime() for path in strings_paths])
+        if _worker_strings[0] != strings_key:
+            if _worker_strings[1] is not None: _worker_strings[1].clear()
+            strings = bolt.StringTable()
+            for path in strings_paths:
+                strings.loadFile(path, bolt.Progress(), strings_lang)
+            _worker_strings[:] = strings_key, strings
+        strings = _worker_strings[1]
+    try:
+        with MemoryModReader.from_path(plugin_name, plugin_path) as ins:
+            ins.setStringTable(strings)
+            ins.seek(offset)
+            header = ins.unpackRecHeader()
+            top_group = loadFactory.getTopClass(header.label)(header,
+                                                              loadFactory)
+            top_group.load(ins, True)
+    finally:
+        if strings is not None: strings.unmap()
+    converted = bool(long_masters) and header.label not in _cell_tops
+    if converted:
+        top_group.convertFids(FidCache(_long_mapper(long_masters)).__getitem__,
+                              True)
+    return cPickle.dumps(top_group, cPickle.HIGHEST_PROTOCOL), converted
+
 class LoadFactory(object):
     """Factory for mod representation objects."""
-    def __init__(self,keepAll,*recClasses):
+    def __init__(self,keepAll,*recClasses,**kwdargs):
+        """If the lazy_unpack keyword argument is True, records in plain top
+        groups only decode their subrecords when first accessed - see
+        brec.LAZY_UNPACK."""
         self.keepAll = keepAll
+        self.lazy_unpack = kwdargs.get('lazy_unpack', False)
         self.recTypes = set()
         self.topTypes = set()
         self.type_class = {}
@@ -3940,6 +4029,7 @@ def __init__(self, fileInfo,loadFactory=None):
         self.tops = {} #--Top groups.
         self.topsSkipped = set() #--Types skipped
         self.longFids = False
+        self._source_stat = None # Stat of the plugin when it was loaded
         #--Cached data
         self.mgef_school = None
         self.mgef_name = None
@@ -3953,7 +4043,7 @@ def __getattr__(self,topType):
             topClass = self.loadFactory.getTopClass(topType)
             try:
                 self.tops[topType] = topClass(
-                    RecordHeader('GRUP', 0, topType, 0, 0), self.loadFactory)
+                    GrupHeader(0, topType, 0, 0), self.loadFactory)
             except TypeError:
                 raise ModError(
                     self.fileInfo.name,
@@ -3966,22 +4056,65 @@ def __getattr__(self,topType):
         else:
             raise ArgumentError(u'Invalid top group type: '+topType)
 
-    def load(self, do_unpack=False, progress=None, loadStrings=True):
-        """Load file."""
-        from . import bosh
+    def load(self, do_unpack=False, progress=None, loadStrings=True,
+             threaded_decompress=False, strings_lang=None, parse_pool=None,
+             long_fids=False, decompress_pool=None):
+        """Load file. If threaded_decompress is True and records get unpacked,
+        the compressed records of each top group are decompressed by a pool
+        of worker threads while this thread parses the group. To share those
+        threads between loads, pass a ThreadPool as decompress_pool instead.
+        strings_lang is the language of the strings files to load, defaults
+        to the language set in the game ini.
+        If records get unpacked and parse_pool, a pool made by
+        make_parse_pool, is given, big top groups are parsed in its worker
+        processes while this one parses the rest. Their records are fully
+        unpacked, regardless of the lazy_unpack setting of the LoadFactory.
+        If long_fids is True, fids are converted to long format while loading
+        - by the workers, for most of the groups they parse."""
         progress = progress or bolt.Progress()
         progress.setFull(1.0)
-        with ModReader(self.fileInfo.name,self.fileInfo.getPath().open('rb')) as ins:
+        pool = decompress_pool if do_unpack else None
+        own_pool = pool is None and threaded_decompress and do_unpack
+        if own_pool: pool = ThreadPool()
+        try:
+            short_tops = self._load(do_unpack, progress, loadStrings, pool,
+                strings_lang, parse_pool if do_unpack else None, long_fids)
+        finally:
+            if own_pool:
+                pool.terminate()
+                pool.join()
+            # Don't keep the strings files mapped for the lifetime of this
+            # ModFile - only lazily unpacked records and cell children still
+            # need the strings
+            if self.loadFactory.lazy_unpack or not _cell_tops.isdisjoint(
+                    self.tops):
+                self.strings.unmap()
+            else: self.strings.clear()
+        if long_fids: self.convertToLongFids(short_tops)
+
+    def _load(self, do_unpack, progress, loadStrings, pool, strings_lang,
+              parse_pool, long_fids):
+        """Returns the labels of the unpacked top groups whose fids were not
+        converted to long by the parse workers."""
+        source_path = self.fileInfo.getPath()
+        self._source_stat = source_path.size_mtime_ctime()
+        short_tops = []
+        with MemoryModReader.from_path(self.fileInfo.name,
+                                       source_path) as ins:
             insRecHeader = ins.unpackRecHeader
             # Main header of the mod file - generally has 'TES4' signature
             header = insRecHeader()
             self.tes4 = bush.game.plugin_header_class(header,ins,True)
             # Check if we need to handle strings
             self.strings.clear()
+            stringsPaths = ()
             if do_unpack and self.tes4.flags1.hasStrings and loadStrings:
                 stringsProgress = SubProgress(progress,0,0.1) # Use 10% of progress bar for strings
-                lang = bosh.oblivionIni.get_ini_language()
-                stringsPaths = self.fileInfo.getStringsPaths(lang)
+                lang = strings_lang
+                if lang is None:
+                    from . import bosh
+                    lang = bosh.oblivionIni.get_ini_language()
+                stringsPaths = tuple(self.fileInfo.getStringsPaths(lang))
                 stringsProgress.setFull(max(len(stringsPaths),1))
                 for i,path in enumerate(stringsPaths):
                     self.strings.loadFile(path,SubProgress(stringsProgress,i,i+1),lang)
@@ -3990,7 +4123,17 @@ def load(self, do_unpack=False, progress=None, loadStrings=True):
                 subProgress = SubProgress(progress,0.1,1.0)
             else:
                 ins.setStringTable(None)
+                lang = None
                 subProgress = progress
+            if parse_pool is not None:
+                # The workers can't unpack lazily, records would hold on to
+                # the reader they were loaded from
+                parse_factory = copy.copy(self.loadFactory)
+                parse_factory.lazy_unpack = False
+                long_masters = long_fids and (
+                        self.tes4.masters + [self.fileInfo.name])
+            parsed = [] # (label, result) of the groups sent to workers
+            loaded = [] # labels of all groups, in file order
             #--Raw data read
             subProgress.setFull(ins.size)
             insAtEnd = ins.atEnd
@@ -4004,10 +4147,27 @@ def load(self, do_unpack=False, progress=None, loadStrings=True):
                     raise ModError(self.fileInfo.name,u'Improperly grouped file.')
                 label,size = header.label,header.size
                 topClass = self.loadFactory.getTopClass(label)
+                hsize = header.__class__.rec_header_size
                 try:
-                    if topClass:
+                    if (topClass and parse_pool is not None and
+                            topClass != MobBase and size >= _min_parse_size
+                            and not (stringsPaths and label in _cell_tops)):
+                        parsed.append((label, parse_pool.apply_async(
+                            _parse_top_group, (
+                                self.fileInfo.name, source_path,
+                                insTell() - hsize, parse_factory,
+                                stringsPaths, lang, long_masters))))
+                        loaded.append(label)
+                        insSeek(size - hsize, 1)
+                    elif topClass:
+                        if pool is not None and topClass != MobBase:
+                            ins.prefetch_decompressed(
+                                insTell() + size - hsize, pool)
                         self.tops[label] = topClass(header, self.loadFactory)
                         self.tops[label].load(ins, do_unpack and (topClass != MobBase))
+                        if do_unpack and topClass != MobBase:
+                            short_tops.append(label)
+                        loaded.append(label)
                     else:
                         self.topsSkipped.add(label)
                         insSeek(size-header.__class__.rec_header_size,1,type.encode('ascii') + b'.' + label)
@@ -4016,7 +4176,23 @@ def load(self, do_unpack=False, progress=None, loadStrings=True):
                             traceback=True)
                     break
                 subProgress(insTell())
+        #--Collect the groups parsed by the workers
+        for label, result in parsed:
+            try:
+                pickled, converted = result.get()
+                top_group = cPickle.loads(pickled)
+            except:
+                deprint(u'Error in %s' % self.fileInfo.name.s,
+                        traceback=True)
+                # Like above, drop this group and everything after it
+                for dropped in loaded[loaded.index(label):]:
+                    self.tops.pop(dropped, None)
+                break
+            top_group.loadFactory = self.loadFactory
+            self.tops[label] = top_group
+            if not converted: short_tops.append(label)
         #--Done Reading
+        return short_tops
 
     def load_unpack(self):
         """Unpacks blocks."""
@@ -4043,11 +4219,12 @@ def askSave(self,hasChanged=True):
         else:
             print(fileName.s,u'not saved.')
 
-    def safeSave(self):
-        """Save data to file safely.  Works under UAC."""
+    def safeSave(self, compression_level=6, threaded_compress=False):
+        """Save data to file safely.  Works under UAC. See save for the
+        parameters."""
         self.fileInfo.tempBackup()
         filePath = self.fileInfo.getPath()
-        self.save(filePath.temp)
+        self.save(filePath.temp, compression_level, threaded_compress)
         if self.fileInfo.mtime is not None: # fileInfo created before the file
             filePath.temp.mtime = self.fileInfo.mtime
         # FIXME If saving a locked (by xEdit f.i.) bashed patch a bogus UAC
@@ -4055,11 +4232,25 @@ def safeSave(self):
         env.shellMove(filePath.temp, filePath, parent=None) # silent=True just returns - no error!
         self.fileInfo.extras.clear()
 
-    def save(self,outPath=None):
+    def save(self, outPath=None, compression_level=6,
+             threaded_compress=False):
         """Save data to file.
-        outPath -- Path of the output file to write to. Defaults to original file path."""
+        outPath -- Path of the output file to write to. Defaults to original file path.
+        compression_level -- zlib level (0-9) used for changed compressed records.
+        threaded_compress -- If True, compress those in a pool of worker threads."""
         if not self.loadFactory.keepAll: raise StateError(u"Insufficient data to write file.")
         outPath = outPath or self.fileInfo.getPath()
+        raw_tops = self._read_raw_tops()
+        #--Compress records up front, the group sizes depend on the results
+        pool = ThreadPool() if threaded_compress else None
+        try:
+            MreRecord.pack_compressed(chain.from_iterable(
+                top.iter_loaded_records() for top in self.tops.itervalues()),
+                compression_level, pool)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
         with ModWriter(outPath.open('wb')) as out:
             #--Mod Record
             self.tes4.setChanged()
@@ -4069,19 +4260,36 @@ def save(self,outPath=None):
             #--Blocks
             selfTops = self.tops
             for rec_type in RecordHeader.topTypes:
-                if rec_type in selfTops:
+                if rec_type in raw_tops:
+                    out.write(raw_tops[rec_type])
+                elif rec_type in selfTops:
                     selfTops[rec_type].dump(out)
 
+    def _read_raw_tops(self):
+        """Returns a dict mapping the labels of the top groups that did not
+        change since they were loaded to their original bytes, read from the
+        plugin they were loaded from - see MobBase.get_raw_span. These can
+        be written as they are instead of dumping every record again."""
+        source_path = self.fileInfo.getPath()
+        try:
+            if source_path.size_mtime_ctime() != self._source_stat:
+                return {} # not loaded or modified since, can't copy from it
+        except OSError:
+            return {}
+        raw_spans = [(rec_type, top.get_raw_span()) for rec_type, top
+                     in self.tops.iteritems()]
+        raw_tops = {}
+        if any(span for rec_type, span in raw_spans):
+            with source_path.open('rb') as ins:
+                for rec_type, span in raw_spans:
+                    if span is None: continue
+                    ins.seek(span[0])
+                    raw_tops[rec_type] = ins.read(span[1])
+        return raw_tops
+
     def getLongMapper(self):
         """Returns a mapping function to map short fids to long fids."""
-        masters = self.tes4.masters+[self.fileInfo.name]
-        maxMaster = len(masters)-1
-        def mapper(fid):
-            if fid is None: return None
-            if isinstance(fid,tuple): return fid
-            mod,object = int(fid >> 24),int(fid & 0xFFFFFF)
-            return masters[min(mod,maxMaster)],object
-        return mapper
+        return _long_mapper(self.tes4.masters + [self.fileInfo.name])
 
     def getShortMapper(self):
         """Returns a mapping function to map long fids to short fids."""
@@ -4111,7 +4319,8 @@ def convertToLongFids(self,types=None):
         """Convert fids to long format (modname,objectindex).
         :type types: list[str] | tuple[str] | set[str]
         """
-        mapper = self.getLongMapper()
+        # Most fids are referenced many times, so only map each one once
+        mapper = FidCache(self.getLongMapper()).__getitem__
         if types is None: types = self.tops.keys()
         else: assert isinstance(types, (list, tuple, set))
         selfTops = self.tops
@@ -4192,10 +4401,183 @@ def getMgefName(self, _reload=False): # _reload param never used
     def __repr__(self):
         return u'ModFile<%s>' % self.fileInfo.name.s
 
+class ModHeaderIndex(object):
+    """Columnar index of the headers of every record and group in a plugin,
+    see ModHeaderReader.read_header_index. Entry i of each column describes
+    the i-th header in file order. Only plain numbers are stored, so even the
+    index of a big master stays small and cheap to filter.
+
+    For groups, fids holds the label as an unsigned integer (top groups thus
+    hold their packed record signature) and flags holds the group type. If
+    the index was read with EDIDs, eids holds the editor ID of each record
+    (an empty string for groups and records without one), else it is None.
+    eids_skipped holds the signatures of the top groups whose records had
+    their EDIDs skipped - they get empty strings too.
+
+    Pickles to a compact form, so that indexes can be cached on disk - see
+    ModInfo.get_header_index."""
+    __slots__ = ('signatures', 'offsets', 'sizes', 'flags', 'fids',
+                 'form_versions', 'parents', 'eids', 'eids_skipped')
+    # Name and typecode of every array column
+    _array_columns = (('offsets', 'I'), ('sizes', 'I'), ('flags', 'I'),
+                      ('fids', 'I'), ('form_versions', 'h'), ('parents', 'i'))
+
+    def __init__(self):
+        self.signatures = [] # Signature of each header, GRUP for groups
+        self.offsets = array('I') # File position of each header
+        self.sizes = array('I') # Data size for records, total size for groups
+        self.flags = array('I')
+        self.fids = array('I')
+        self.form_versions = array('h')
+        self.parents = array('i') # Index of the parent group, -1 if none
+        self.eids = None
+        self.eids_skipped = frozenset()
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __getstate__(self):
+        # Arrays pickle as lists of ints - store their raw bytes instead
+        return (b''.join(self.signatures),
+                [getattr(self, c).tostring() for c, _t in self._array_columns],
+                self.eids, self.eids_skipped)
+
+    def __setstate__(self, state):
+        sigs, column_bytes, self.eids, self.eids_skipped = state
+        self.signatures = [intern(sigs[i:i + 4])
+                           for i in xrange(0, len(sigs), 4)]
+        for (column, typecode), col_bytes in zip(self._array_columns,
+                                                 column_bytes):
+            col_array = array(typecode)
+            col_array.fromstring(col_bytes)
+            setattr(self, column, col_array)
+
+    def record_fids(self):
+        """Returns the FormIDs of all records, skipping groups."""
+        fids = self.fids
+        return [fids[i] for i, rec_sig in enumerate(self.signatures)
+                if rec_sig != b'GRUP']
+
 # TODO(inf) Use this for a bunch of stuff in mods_metadata.py (e.g. UDRs)
 class ModHeaderReader(object):
     """Allows very fast reading of a plugin's headers, skipping reading and
     decoding of anything but the headers."""
+    @staticmethod
+    def read_header_index(mod_info, read_eids=False,
+                          skip_eid_groups=frozenset(), progress=None):
+        """Reads the headers of every record and group in the specified mod
+        into a ModHeaderIndex. Unlike read_mod_headers, this does not create
+        an object per record. If read_eids is True, the EDID of every record
+        is read as well, which means decompressing compressed records -
+        except in the top groups with the signatures in skip_eid_groups.
+        progress is updated as each top group is reached.
+
+        :rtype: ModHeaderIndex"""
+        header_index = ModHeaderIndex()
+        if read_eids:
+            header_index.eids = []
+            header_index.eids_skipped = frozenset(skip_eid_groups)
+            add_eid = header_index.eids.append
+            read_eid = ModHeaderReader._read_eid
+            # Top group labels are the packed signatures, compare them as ints
+            skip_labels = {struct.unpack('=I', s)[0] for s in skip_eid_groups}
+        read_group_eids = read_eids
+        add_signature = header_index.signatures.append
+        add_offset = header_index.offsets.append
+        add_size = header_index.sizes.append
+        add_flags = header_index.flags.append
+        add_fid = header_index.fids.append
+        add_form_version = header_index.form_versions.append
+        add_parent = header_index.parents.append
+        header_struct = get_struct(RecordHeader.rec_pack_format_str)
+        header_size = RecordHeader.rec_header_size
+        record_types = RecordHeader.recordTypes
+        # Only games with a plugin form version store it in the headers
+        has_form_version = bool(RecordHeader.plugin_form_version)
+        # Stack of (end position, index) of the groups we're currently in
+        open_groups = []
+        with MemoryModReader.from_path(mod_info.name,
+                                       mod_info.abs_path) as ins:
+            try:
+                ins_at_end = ins.atEnd
+                ins_tell = ins.tell
+                ins_unpack = ins.unpack_struct
+                ins_seek = ins.seek
+                while not ins_at_end():
+                    header_pos = ins_tell()
+                    while open_groups and header_pos >= open_groups[-1][0]:
+                        open_groups.pop()
+                    header_args = ins_unpack(header_struct, header_size,
+                                             u'REC_HEADER')
+                    rec_sig, size = header_args[0], header_args[1]
+                    if rec_sig not in record_types:
+                        raise ModError(ins.inName, u'Bad header type: ' +
+                                       repr(rec_sig))
+                    if has_form_version:
+                        form_version = header_args[5] & 0xFFFF
+                        if form_version & 0x8000: form_version -= 0x10000
+                    else:
+                        form_version = 0
+                    add_signature(rec_sig)
+                    add_offset(header_pos)
+                    add_size(size)
+                    add_form_version(form_version)
+                    add_parent(open_groups[-1][1] if open_groups else -1)
+                    if rec_sig == b'GRUP':
+                        if not open_groups: # a top group
+                            label = header_args[2]
+                            if read_eids:
+                                read_group_eids = label not in skip_labels
+                            if progress is not None:
+                                progress(1.0 * header_pos / ins.size,
+                                         _(u'Scanning: ') +
+                                         struct.pack('=I', label))
+                        add_fid(header_args[2])
+                        add_flags(header_args[3])
+                        if read_eids: add_eid(u'')
+                        open_groups.append((header_pos + size,
+                                            len(header_index) - 1))
+                    else:
+                        add_flags(header_args[2])
+                        add_fid(header_args[3])
+                        if read_group_eids:
+                            add_eid(read_eid(ins, header_args[2], size))
+                        else:
+                            if read_eids: add_eid(u'')
+                            ins_seek(size, 1)
+            except (OSError, struct.error, zlib.error) as e:
+                # Bad sizes or compressed data of a corrupt record
+                raise ModError(ins.inName, u'Error scanning %s, file read '
+                                           u"pos: %i\nCaused by: '%r'" % (
+                    mod_info.name.s, ins.tell(), e))
+        return header_index
+
+    @staticmethod
+    def _read_eid(ins, flags, size):
+        """Reads the EDID of the record whose data starts at the current
+        position of ins, leaving ins at the end of that record. Returns an
+        empty string if the record has no EDID."""
+        rec_end = ins.tell() + size
+        if flags & 0x00040000: # compressed
+            size_check, = ins.unpack('I', 4, u'DECOMP_SIZE')
+            decomp = zlib.decompress(ins.read(size - 4))
+            if len(decomp) != size_check:
+                raise ModError(ins.inName,
+                    u'Mis-sized compressed data. Expected %d, got %d.' % (
+                        size_check, len(decomp)))
+            recs, recs_end = MemoryModReader(ins.inName, decomp), size_check
+        else:
+            recs, recs_end = ins, rec_end
+        eid = u''
+        while recs.tell() < recs_end:
+            sub_sig, sub_size = recs.unpackSubHeader()
+            if sub_sig == b'EDID':
+                eid = recs.readString(sub_size)
+                break
+            recs.seek(sub_size, 1)
+        ins.seek(rec_end)
+        return eid
+
     @staticmethod
     def read_mod_headers(mod_info):
         """Reads the headers of every record in the specified mod, returning
@@ -4205,7 +4587,8 @@ def read_mod_headers(mod_info):
 
         :rtype: defaultdict[str, list[RecordHeader]]"""
         ret_headers = defaultdict(list)
-        with ModReader(mod_info.name, mod_info.abs_path.open(u'rb')) as ins:
+        with MemoryModReader.from_path(mod_info.name,
+                                       mod_info.abs_path) as ins:
             try:
                 ins_at_end = ins.atEnd
                 ins_unpack_rec_header = ins.unpackRecHeader
@@ -24,6 +24,7 @@
 from __future__ import print_function
 import time
 from collections import defaultdict, Counter
+from multiprocessing.pool import ThreadPool
 from operator import attrgetter
 from .. import bush # for game etc
 from .. import bosh # for modInfos
@@ -31,7 +32,7 @@
 from ..balt import readme_url
 from .. import load_order
 from .. import bass
-from ..parsers import LoadFactory, ModFile, MasterSet
+from ..parsers import LoadFactory, ModFile, MasterSet, make_parse_pool
 from ..brec import MreRecord
 from ..bolt import GPath, SubProgress, deprint, Progress
 from ..cint import ObModFile, FormID, dump_record, ObCollection, MGEFCode
@@ -186,6 +187,14 @@ def keep(fid):
             return fid
         return keep
 
+    def getRecordByEid(self, top_type, eid, default=None):
+        """Returns the winning record of type top_type with the specified
+        eid among the records collected from the load order so far, or
+        default. Backed by the eid index of the patch's top group, so eids
+        are compared case insensitively - see MobObjects.getRecordByEid."""
+        if top_type not in self.tops: return default
+        return self.tops[top_type].getRecordByEid(eid, default)
+
     def init_patchers_data(self, progress):
         """Gives each patcher a chance to get its source data."""
         if not self._patcher_instances: return
@@ -205,13 +214,31 @@ def initFactories(self,progress):
                 MreRecord.type_class[x] for x in patcher.getReadClasses())
             writeClasses.update(
                 MreRecord.type_class[x] for x in patcher.getWriteClasses())
-        self.readFactory = LoadFactory(False, *readClasses)
+        # Patchers mostly look at a few attributes of the records they scan
+        self.readFactory = LoadFactory(False, *readClasses, lazy_unpack=True)
         self.loadFactory = LoadFactory(True, *writeClasses)
         #--Merge Factory
         self.mergeFactory = LoadFactory(False, *bush.game.mergeClasses)
 
     def scanLoadMods(self,progress):
         """Scans load+merge mods."""
+        # Parse the big top groups of the load mods in worker processes
+        parse_processes = bass.inisettings['PatchParseProcesses']
+        parse_pool = None
+        if parse_processes: # -1 means one worker per CPU
+            parse_pool = make_parse_pool(
+                parse_processes if parse_processes > 0 else None)
+        # Threads decompressing records, shared by all loads
+        decompress_pool = ThreadPool()
+        try:
+            self._scan_load_mods(progress, parse_pool, decompress_pool)
+        finally:
+            for pool in (parse_pool, decompress_pool):
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+
+    def _scan_load_mods(self, progress, parse_pool, decompress_pool):
         nullProgress = Progress()
         progress = progress.setFull(len(self.allMods))
         for index,modName in enumerate(self.allMods):
@@ -223,7 +250,10 @@ def scanLoadMods(self,progress):
                 loadFactory = (self.readFactory,self.mergeFactory)[modName in self.mergeSet]
                 progress(index,modName.s+u'\n'+_(u'Loading...'))
                 modFile = ModFile(modInfo,loadFactory)
-                modFile.load(True,SubProgress(progress,index,index+0.5))
+                modFile.load(True, SubProgress(progress, index, index + 0.5),
+                             decompress_pool=decompress_pool,
+                             parse_pool=parse_pool,
+                             long_fids=parse_pool is not None)
             except ModError as e:
                 deprint('load error:', traceback=True)
                 self.loadErrorMods.append((modName,e))
@@ -235,7 +265,10 @@ def scanLoadMods(self,progress):
                 # TODO adapt for other games
                 if bush.game.fsName == u'Oblivion' and 'SCPT' in \
                         modFile.tops and modName != GPath(u'Oblivion.esm'):
-                    gls = modFile.SCPT.getRecord(0x00025811)
+                    gls_fid = 0x00025811
+                    if modFile.longFids:
+                        gls_fid = modFile.getLongMapper()(gls_fid)
+                    gls = modFile.SCPT.getRecord(gls_fid)
                     if gls and gls.compiled_size == 4 and gls.last_index == 0:
                         self.compiledAllMods.append(modName)
                 pstate = index+0.5
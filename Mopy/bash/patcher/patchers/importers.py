@@ -66,7 +66,7 @@ def _init_data_loop(self, mapper, recClass, srcFile, srcMod, temp_id_data):
         for record in srcFile.tops[recClass.classType].getActiveRecords():
             fid = mapper(record.fid)
             temp_id_data[fid] = dict(
-                (attr, record.__getattribute__(attr)) for attr in recAttrs)
+                (attr, getattr(record, attr)) for attr in recAttrs)
 
     def initData(self, progress):
         """Common initData pattern.
@@ -115,7 +115,7 @@ def initData(self, progress):
                         fid = mapper(record.fid)
                         if fid not in temp_id_data: continue
                         for attr, value in temp_id_data[fid].iteritems():
-                            if value == record.__getattribute__(attr): continue
+                            if value == getattr(record, attr): continue
                             else:
                                 id_data[fid][attr] = value
             progress.plus()
@@ -141,7 +141,7 @@ def scanModFile(self, modFile, progress):
                 if not record.longFids: fid = mapper(fid)
                 if fid not in id_data: continue
                 for attr, value in id_data[fid].iteritems():
-                    if record.__getattribute__(attr) != value:
+                    if getattr(record, attr) != value:
                         patchBlock.setRecord(record.getTypeCopy(mapper))
                         break
 
@@ -176,7 +176,7 @@ def _inner_loop(self, keep, records, top_mod_rec, type_count):
             fid = record.fid
             if fid not in set_id_data: continue
             for attr, value in id_data[fid].iteritems():
-                if record.__getattribute__(attr) != value: break
+                if getattr(record, attr) != value: break
             else: continue
             for attr, value in id_data[fid].iteritems():
                 record.__setattr__(attr, value)
@@ -287,7 +287,7 @@ def importCellBlockData(cellBlock):
             to update the attribute values taken from the master files
             when creating cell_data.
             """
-            if not cellBlock.cell.flags1.ignored:
+            if not cellBlock.cell.flags1_int & MreRecord.ignored_mask:
                 fid = cellBlock.cell.fid
                 for attr in attrs:
                     tempCellData[fid][attr] = cellBlock.cell.__getattribute__(
@@ -303,7 +303,7 @@ def checkMasterCellBlockData(cellBlock):
             The attribute values in temp cell data are then used to
             update these records where the value is different.
             """
-            if not cellBlock.cell.flags1.ignored:
+            if not cellBlock.cell.flags1_int & MreRecord.ignored_mask:
                 fid = cellBlock.cell.fid
                 if fid not in tempCellData: return
                 for attr in attrs:
@@ -543,7 +543,7 @@ def _inner_loop(self, keep, records, top_mod_rec, type_count):
             fid = record.fid
             if fid not in set_id_data: continue
             for attr, value in id_data[fid].iteritems():
-                rec_attr = record.__getattribute__(attr)
+                rec_attr = getattr(record, attr)
                 if isinstance(rec_attr, str) and isinstance(value, str):
                     if rec_attr.lower() != value.lower():
                         break
@@ -608,7 +608,7 @@ def _init_data_loop(self, mapper, recClass, srcFile, srcMod, temp_id_data):
             fid = mapper(record.fid)
             if recFidAttrs:
                 attr_fidvalue = dict(
-                    (attr, record.__getattribute__(attr)) for attr in
+                    (attr, getattr(record, attr)) for attr in
                     recFidAttrs)
                 for fidvalue in attr_fidvalue.values():
                     if fidvalue and (fidvalue[0] is None or fidvalue[
@@ -620,12 +620,12 @@ def _init_data_loop(self, mapper, recClass, srcFile, srcMod, temp_id_data):
                         break
                 else:
                     temp_id_data[fid] = dict(
-                        (attr, record.__getattribute__(attr)) for attr in
+                        (attr, getattr(record, attr)) for attr in
                         recAttrs)
                     temp_id_data[fid].update(attr_fidvalue)
             else:
                 temp_id_data[fid] = dict(
-                    (attr, record.__getattribute__(attr)) for attr in recAttrs)
+                    (attr, getattr(record, attr)) for attr in recAttrs)
 
     def _inner_loop(self, keep, records, top_mod_rec, type_count):
         id_data = self.id_data
@@ -633,20 +633,20 @@ def _inner_loop(self, keep, records, top_mod_rec, type_count):
             fid = record.fid
             if fid not in id_data: continue
             for attr, value in id_data[fid].iteritems():
-                if isinstance(record.__getattribute__(attr),
+                if isinstance(getattr(record, attr),
                               basestring) and isinstance(value, basestring):
-                    if record.__getattribute__(attr).lower() != value.lower():
+                    if getattr(record, attr).lower() != value.lower():
                         break
                     continue
                 elif attr in bush.game.graphicsModelAttrs:
                     try:
-                        if record.__getattribute__(
-                                attr).modPath.lower() != value.modPath.lower():
+                        if getattr(record, attr).modPath.lower() != \
+                                value.modPath.lower():
                             break
                         continue
                     except: break  # assume they are not equal (ie they
                         # aren't __both__ NONE)
-                if record.__getattribute__(attr) != value: break
+                if getattr(record, attr) != value: break
             else: continue
             for attr, value in id_data[fid].iteritems():
                 record.__setattr__(attr, value)
@@ -2147,13 +2147,15 @@ def scanModFile(self, modFile, progress): # scanModFile0?
                 id_records = patchBlock.id_cellBlock
                 activeRecords = (cellBlock.cell for cellBlock in
                                  modFile.CELL.cellBlocks if
-                                 not cellBlock.cell.flags1.ignored)
+                                 not cellBlock.cell.flags1_int &
+                                 MreRecord.ignored_mask)
                 setter = patchBlock.setCell
             elif active_type == 'WRLD':
                 id_records = patchBlock.id_worldBlocks
                 activeRecords = (worldBlock.world for worldBlock in
                                  modFile.WRLD.worldBlocks if
-                                 not worldBlock.world.flags1.ignored)
+                                 not worldBlock.world.flags1_int &
+                                 MreRecord.ignored_mask)
                 setter = patchBlock.setWorld
             else:
                 id_records = patchBlock.id_records
@@ -2291,11 +2293,11 @@ def initData(self,progress):
                         fidattrs += ['eye']
                     if fidattrs:
                         attr_fidvalue = dict(
-                            (attr, npc.__getattribute__(attr)) for attr in
+                            (attr, getattr(npc, attr)) for attr in
                             fidattrs)
                     else:
                         attr_fidvalue = dict(
-                            (attr, npc.__getattribute__(attr)) for attr in
+                            (attr, getattr(npc, attr)) for attr in
                             ('eye', 'hair'))
                     for fidvalue in attr_fidvalue.values():
                         if fidvalue and (fidvalue[0] is None or fidvalue[0] not in self.patchFile.loadSet):
@@ -2304,12 +2306,12 @@ def initData(self,progress):
                     else:
                         if not fidattrs:
                             temp_faceData[npc.fid] = dict(
-                                (attr, npc.__getattribute__(attr)) for attr in
+                                (attr, getattr(npc, attr)) for attr in
                                 ('fggs_p', 'fgga_p', 'fgts_p', 'hairLength',
                                  'hairRed', 'hairBlue', 'hairGreen'))
                         else:
                             temp_faceData[npc.fid] = dict(
-                                (attr, npc.__getattribute__(attr)) for attr in
+                                (attr, getattr(npc, attr)) for attr in
                                 attrs)
                         temp_faceData[npc.fid].update(attr_fidvalue)
             if u'NpcFacesForceFullImport' in bashTags:
@@ -2330,7 +2332,7 @@ def initData(self,progress):
                     for npc in masterFile.NPC_.getActiveRecords():
                         if npc.fid not in temp_faceData: continue
                         for attr, value in temp_faceData[npc.fid].iteritems():
-                            if value == npc.__getattribute__(attr): continue
+                            if value == getattr(npc, attr): continue
                             if npc.fid not in faceData: faceData[
                                 npc.fid] = dict()
                             try:
@@ -2368,7 +2370,7 @@ def buildPatch(self,log,progress):# buildPatch3: one type
             if npc.fid in faceData:
                 changed = False
                 for attr, value in faceData[npc.fid].iteritems():
-                    if value != npc.__getattribute__(attr):
+                    if value != getattr(npc, attr):
                         npc.__setattr__(attr,value)
                         changed = True
                 if changed:
@@ -2569,7 +2571,7 @@ def scanModFile(self, modFile, progress): # scanModFile4: ?
                 if longid in id_records: continue
                 itemStats = fid_attr_value.get(longid,None)
                 if not itemStats: continue
-                oldValues = dict(zip(attrs,map(record.__getattribute__,attrs)))
+                oldValues = dict(zip(attrs,[getattr(record, a) for a in attrs]))
                 if oldValues != itemStats:
                     patchBlock.setRecord(record.getTypeCopy(mapper))
 
@@ -2588,7 +2590,7 @@ def buildPatch(self,log,progress):# buildPatch2 !!!!
                 fid = record.fid
                 itemStats = fid_attr_value.get(fid,None)
                 if not itemStats: continue
-                oldValues = dict(zip(attrs,map(record.__getattribute__,attrs)))
+                oldValues = dict(zip(attrs,[getattr(record, a) for a in attrs]))
                 if oldValues != itemStats:
                     for attr, value in itemStats.iteritems():
                         setattr(record,attr,value)
@@ -40,13 +40,10 @@ class GlobalsTweak(DynamicNamedTweak, MultiTweakItem):
     def buildPatch(self,patchFile,keep,log):
         """Build patch."""
         value = self.choiceValues[self.chosen][0]
-        for record in patchFile.GLOB.records:
-            if hasattr(record,'eid'):
-                if record.eid.lower() == self.key:
-                    if record.value != value:
-                        record.value = value
-                        keep(record.fid)
-                    break
+        record = patchFile.getRecordByEid('GLOB', self.key)
+        if record is not None and record.value != value:
+            record.value = value
+            keep(record.fid)
         log(u'* ' + _(u'%(label)s set to') % {
             'label': (u'%s ' % self.tweak_name)} + (u': %4.2f' % value))
 
@@ -90,13 +87,11 @@ def buildPatch(self,patchFile,keep,log):
                 deprint(_(u"GMST values can't be negative - currently %s - "
                           u"skipping setting GMST.") % value)
                 return
-            eidLower = eid.lower()
-            for record in patchFile.GMST.records:
-                if record.eid.lower() == eidLower:
-                    if record.value != value:
-                        record.value = value
-                        keep(record.fid)
-                    break
+            record = patchFile.getRecordByEid('GMST', eid)
+            if record is not None:
+                if record.value != value:
+                    record.value = value
+                    keep(record.fid)
             else:
                 gmst = MreRecord.type_class['GMST'](
                     RecordHeader('GMST', 0, 0, 0, 0))
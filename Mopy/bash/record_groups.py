@@ -25,10 +25,12 @@
 """Classes that group records."""
 # Python imports
 from __future__ import division, print_function
+from itertools import groupby
 from operator import itemgetter
 # Wrye Bash imports
-from .brec import ModReader, RecordHeader
-from .bolt import sio, struct_pack, struct_unpack
+from .brec import LAZY_UNPACK, GrupHeader, MelRecord, MemoryModReader, \
+    MreRecord, RecordHeader
+from .bolt import struct_pack, struct_unpack
 from . import bush # for fallout3/nv fsName
 from .exception import AbstractError, ArgumentError, ModError
 
@@ -47,12 +49,37 @@
     _(u'Cell Visible Distant Children'),
 ]
 
+def _convert_fids(records, mapper, toLong):
+    """Converts fids of records between formats according to mapper. Runs of
+    records of the same MelRecord class are converted in bulk, see
+    MelSet.convert_fids_bulk."""
+    for rec_class, class_records in groupby(records, type):
+        if rec_class.convertFids.__func__ is MelRecord.convertFids.__func__:
+            rec_class.melSet.convert_fids_bulk(class_records, mapper, toLong)
+        else:
+            for record in class_records:
+                record.convertFids(mapper,toLong)
+
+def _record_unchanged(record):
+    """Returns True if dumping record would write the same header it was
+    loaded with. Its data is compared separately, see MobBase.get_raw_span."""
+    header = record.header
+    if (record.changed or record.fid != header.fid or
+            record.size != header.size or
+            record.flags1_int != header.flags1):
+        return False
+    # Dumping stamps the plugin form version on the header
+    form_version = RecordHeader.plugin_form_version
+    return not form_version or (
+            header.extra & 0xFFFF == form_version & 0xFFFF)
+
 class MobBase(object):
     """Group of records and/or subgroups. This basic implementation does not
     support unpacking, but can report its number of records and be written."""
 
     __slots__ = ['header','size','label','groupType','stamp','debug','data',
-                 'changed','numRecords','loadFactory','inName']
+                 'changed','numRecords','loadFactory','inName','_raw_span',
+                 '_loaded_records','_loaded_datas']
 
     def __init__(self, header, loadFactory, ins=None, do_unpack=False):
         self.header = header
@@ -69,6 +96,7 @@ def __init__(self, header, loadFactory, ins=None, do_unpack=False):
         self.numRecords = -1
         self.loadFactory = loadFactory
         self.inName = ins and ins.inName
+        self._raw_span = self._loaded_records = self._loaded_datas = None
         if ins: self.load(ins, do_unpack)
 
     def load(self, ins=None, do_unpack=False):
@@ -79,8 +107,14 @@ def load(self, ins=None, do_unpack=False):
             self.data = ins.read(self.size - self.header.__class__.rec_header_size, type(self))
         #--Analyze ins.
         elif ins is not None:
-            self.loadData(ins,
-                          ins.tell() + self.size - self.header.__class__.rec_header_size)
+            hsize = self.header.__class__.rec_header_size
+            raw_start = ins.tell() - hsize
+            self.loadData(ins, ins.tell() + self.size - hsize)
+            if self.loadFactory.keepAll and self.groupType == 0:
+                # Remember what we loaded, see get_raw_span
+                self._raw_span = (raw_start, self.size)
+                self._loaded_records = list(self.iter_loaded_records())
+                self._loaded_datas = [r.data for r in self._loaded_records]
         #--Analyze internal buffer.
         else:
             with self.getReader() as reader:
@@ -94,6 +128,22 @@ def loadData(self,ins,endPos):
         """Loads data from input stream. Called by load()."""
         raise AbstractError
 
+    def get_raw_span(self):
+        """Returns (offset, size) of the bytes this group was unpacked from in
+        its plugin if dumping it would still write exactly those bytes, so
+        that they can be copied instead - else None. That is the case if no
+        record was added, removed, reordered or changed (see
+        _record_unchanged). Only tracked for top groups loaded by a keepAll
+        LoadFactory. Once a group did change, this keeps returning None,
+        since dumping it updates the headers of its records."""
+        if self._raw_span is None: return None
+        records = list(self.iter_loaded_records())
+        if (records != self._loaded_records or
+                [r.data for r in records] != self._loaded_datas or
+                not all(_record_unchanged(r) for r in records)):
+            self._raw_span = self._loaded_records = self._loaded_datas = None
+        return self._raw_span
+
     def setChanged(self,value=True):
         """Sets changed attribute to value. [Default = True.]"""
         self.changed = value
@@ -142,7 +192,18 @@ def dump(self,out):
 
     def getReader(self):
         """Returns a ModReader wrapped around self.data."""
-        return ModReader(self.inName,sio(self.data))
+        return MemoryModReader(self.inName, self.data)
+
+    def iter_records(self):
+        """Yields every record in this group, including the ones in its
+        subgroups. Groups that were not unpacked yield nothing."""
+        return iter(())
+
+    def iter_loaded_records(self):
+        """Like iter_records, but skips the children of cells that were not
+        unpacked yet (see MobCell) instead of unpacking them. The skipped
+        records did not change since they were loaded."""
+        return self.iter_records()
 
     def convertFids(self,mapper,toLong):
         """Converts fids between formats according to mapper.
@@ -163,6 +224,16 @@ class MobObjects(MobBase):
     def __init__(self, header, loadFactory, ins=None, do_unpack=False):
         self.records = []
         self.id_records = {}
+        # Positions of the records in id_records in the records list, so that
+        # setRecord can replace them without searching the list
+        self._id_positions = {}
+        # Lower case editor id -> record, built on first use by getRecordByEid
+        self._eid_records = {}
+        # Lower case editor ids shared by several records
+        self._eid_dupes = set()
+        # The records list and its length when _eid_records was built - kept
+        # in sync by setRecord, anything else makes the index stale
+        self._eid_indexed = (None, 0)
         MobBase.__init__(self, header, loadFactory, ins, do_unpack)
 
     def loadData(self,ins,endPos):
@@ -174,6 +245,7 @@ def loadData(self,ins,endPos):
         insAtEnd = ins.atEnd
         insRecHeader = ins.unpackRecHeader
         recordsAppend = records.append
+        do_unpack = LAZY_UNPACK if self.loadFactory.lazy_unpack else True
         while not insAtEnd(endPos,errLabel):
             #--Get record info and handle it
             header = insRecHeader()
@@ -181,13 +253,15 @@ def loadData(self,ins,endPos):
             if recType != expType:
                 raise ModError(ins.inName,u'Unexpected %s record in %s group.'
                                % (recType,expType))
-            record = recClass(header,ins,True)
+            record = recClass(header,ins,do_unpack)
             recordsAppend(record)
         self.setChanged()
 
     def getActiveRecords(self):
         """Returns non-ignored records."""
-        return [record for record in self.records if not record.flags1.ignored]
+        ignored_mask = MreRecord.ignored_mask
+        return [record for record in self.records
+                if not record.flags1_int & ignored_mask]
 
     def getNumRecords(self,includeGroups=True):
         """Returns number of records, including self."""
@@ -208,14 +282,14 @@ def getSize(self):
     def dump(self,out):
         """Dumps group header and then records."""
         if not self.changed:
-            out.write(RecordHeader('GRUP',self.size, self.label, 0,
-                                   self.stamp).pack())
+            out.write(GrupHeader(self.size, self.label, 0,
+                                 self.stamp).pack())
             out.write(self.data)
         else:
             size = self.getSize()
             if size == RecordHeader.rec_header_size: return
             out.write(
-                RecordHeader('GRUP', size, self.label, 0, self.stamp).pack())
+                GrupHeader(size, self.label, 0, self.stamp).pack())
             for record in self.records:
                 record.dump(out)
 
@@ -224,19 +298,42 @@ def updateMasters(self,masters):
         for record in self.records:
             record.updateMasters(masters)
 
+    def iter_records(self):
+        return iter(self.records)
+
     def convertFids(self,mapper,toLong):
         """Converts fids between formats according to mapper.
         toLong should be True if converting to long format or False if
         converting to short format."""
-        for record in self.records:
-            record.convertFids(mapper,toLong)
+        _convert_fids(self.records, mapper, toLong)
         self.id_records.clear()
+        self._id_positions.clear()
 
     def indexRecords(self):
         """Indexes records by fid."""
-        self.id_records.clear()
+        id_records = self.id_records
+        id_positions = self._id_positions
+        id_records.clear()
+        id_positions.clear()
+        for index, record in enumerate(self.records):
+            id_records[record.fid] = record
+            id_positions[record.fid] = index
+
+    def indexEids(self):
+        """Indexes records by lower case eid. If several records share an
+        eid, the first one is indexed. Has to be called after editing the
+        eids of records, see getRecordByEid."""
+        eid_records = self._eid_records
+        eid_records.clear()
+        eid_dupes = self._eid_dupes
+        eid_dupes.clear()
+        self._eid_indexed = (self.records, len(self.records))
         for record in self.records:
-            self.id_records[record.fid] = record
+            eid = getattr(record, 'eid', None)
+            if eid:
+                eid_key = eid.lower()
+                if eid_records.setdefault(eid_key, record) is not record:
+                    eid_dupes.add(eid_key)
 
     def getRecord(self,fid,default=None):
         """Gets record with corresponding id.
@@ -246,38 +343,102 @@ def getRecord(self,fid,default=None):
         return self.id_records.get(fid,default)
 
     def getRecordByEid(self,eid,default=None):
-        """Gets record by eid, or returns default."""
-        if not self.records: return default
-        for record in self.records:
-            if record.eid == eid:
-                return record
-        else:
-            return default
+        """Gets record by eid, or returns default. Unlike the linear search
+        this replaces, compares eids case insensitively, like the game does.
+
+        Backed by an index that is built on first use and kept up to date by
+        setRecord and keepRecords. Adding, removing or replacing records in
+        the records list directly is noticed as long as its length changes or
+        it is replaced as a whole - else call indexEids. The same goes for
+        editing the eid of a record: that record is only found under its old
+        eid (if at all) until indexEids is called."""
+        if not self.records or not eid: return default
+        eid_records = self._eid_records
+        indexed_records, indexed_count = self._eid_indexed
+        if (indexed_records is not self.records or
+                indexed_count != len(self.records)):
+            self.indexEids() # stale, see above
+        eid_key = eid.lower()
+        record = eid_records.get(eid_key)
+        if record is not None and (record.eid or u'').lower() != eid_key:
+            # The eid was edited since indexing
+            self.indexEids()
+            record = eid_records.get(eid_key)
+        return default if record is None else record
 
     def setRecord(self,record):
         """Adds record to record list and indexed."""
-        from . import bosh
         if self.records and not self.id_records:
             self.indexRecords()
         record_id = record.fid
         if record.isKeyedByEid:
+            from . import bosh
             if record_id == (bosh.modInfos.masterName, 0):
                 record_id = record.eid
-        if record_id in self.id_records:
-            oldRecord = self.id_records[record_id]
-            index = self.records.index(oldRecord)
-            self.records[index] = record
+        records = self.records
+        oldRecord = self.id_records.get(record_id)
+        if oldRecord is not None:
+            index = self._id_positions.get(record_id)
+            # The records list may have been edited directly since indexing
+            if (index is None or index >= len(records) or
+                    records[index] is not oldRecord):
+                index = records.index(oldRecord)
+            records[index] = record
         else:
-            self.records.append(record)
+            index = len(records)
+            records.append(record)
         self.id_records[record_id] = record
+        self._id_positions[record_id] = index
+        indexed_records, indexed_count = self._eid_indexed
+        if indexed_records is records and indexed_count == len(records) - (
+                oldRecord is None): # keep a clean eid index up to date
+            self._update_eid_index(oldRecord, record)
+
+    def _update_eid_index(self, oldRecord, record):
+        """Updates the eid index after setRecord replaced oldRecord with
+        record, or appended record if oldRecord is None. Marks the index as
+        stale if that may change which record an eid maps to."""
+        records = self.records
+        eid_records, eid_dupes = self._eid_records, self._eid_dupes
+        eid = getattr(record, 'eid', None)
+        eid_key = eid.lower() if eid else None
+        if oldRecord is not None:
+            old_eid = getattr(oldRecord, 'eid', None)
+            old_key = old_eid.lower() if old_eid else None
+            if old_key == eid_key:
+                if eid_records.get(eid_key) is oldRecord:
+                    eid_records[eid_key] = record
+                return
+            if old_key and eid_records.get(old_key) is oldRecord:
+                if old_key in eid_dupes: # a later record takes over old_key
+                    self._eid_indexed = (None, 0)
+                    return
+                del eid_records[old_key]
+        if eid_key:
+            if eid_key in eid_records:
+                eid_dupes.add(eid_key)
+                if oldRecord is not None: # record may precede the indexed one
+                    self._eid_indexed = (None, 0)
+                    return
+            else:
+                eid_records[eid_key] = record
+        self._eid_indexed = (records, len(records))
 
     def keepRecords(self,keepIds):
         """Keeps records with fid in set keepIds. Discards the rest."""
-        from . import bosh
-        self.records = [record for record in self.records if (record.fid == (
-            record.isKeyedByEid and bosh.modInfos.masterName,
-            0) and record.eid in keepIds) or record.fid in keepIds]
+        if self.records and self.records[0].isKeyedByEid:
+            from . import bosh
+            null_fid = (bosh.modInfos.masterName, 0)
+            self.records = [record for record in self.records if
+                            record.fid in keepIds or (
+                                record.fid == null_fid and
+                                record.eid in keepIds)]
+        else:
+            self.records = [record for record in self.records if
+                            record.fid in keepIds]
         self.id_records.clear()
+        self._id_positions.clear()
+        self._eid_records.clear()
         self.setChanged()
 
     def updateRecords(self,srcBlock,mapper,mergeIds):
@@ -365,25 +526,77 @@ def getNumRecords(self,includeGroups=1):
         )
         return self.numRecords
 
+    def iter_records(self):
+        for record in self.records:
+            yield record
+            for info in record.infos: yield info
+
 #------------------------------------------------------------------------------
+def _cell_children(attr):
+    """Returns a property for the children attribute attr of MobCell, which
+    unpacks the children of the cell when it is first accessed."""
+    slot = u'_' + attr
+    def _get(self):
+        if self.data is not None: self._load_children()
+        return getattr(self, slot)
+    def _set(self, value):
+        if self.data is not None: self._load_children()
+        setattr(self, slot, value)
+    return property(_get, _set, doc=u'The %s children of the cell. Accessing '
+                                    u'them unpacks the children.' % attr)
+
 class MobCell(MobBase):
     """Represents cell block structure -- including the cell and all
-    subrecords."""
-    __slots__ = ['cell','persistent','distant','temp', 'land','pgrd']
+    subrecords.
+
+    If loaded from a stream with do_unpack False, the children of the cell
+    are kept as raw data and only unpacked once one of them is accessed - see
+    _cell_children. Until then, fid conversions are queued up and the
+    children are written out unchanged. The string table of a localized
+    plugin is kept for unpacking them, like lazily unpacked records do."""
+    __slots__ = ['cell','_persistent','_distant','_temp','_land','_pgrd',
+                 '_fid_conversions','_strings']
 
     def __init__(self, header, loadFactory, cell, ins=None, do_unpack=False):
         self.cell = cell
-        self.persistent = []
-        self.distant = []
-        self.temp = []
-        self.land = None
-        self.pgrd = None
+        self._persistent = []
+        self._distant = []
+        self._temp = []
+        self._land = None
+        self._pgrd = None
+        self._fid_conversions = []
+        self._strings = ins.strings if ins is not None and ins.hasStrings \
+            else None
         MobBase.__init__(self, header, loadFactory, ins, do_unpack)
 
+    persistent = _cell_children(u'persistent')
+    distant = _cell_children(u'distant')
+    temp = _cell_children(u'temp')
+    land = _cell_children(u'land')
+    pgrd = _cell_children(u'pgrd')
+
+    def _load_children(self):
+        """Unpacks the raw children data, then applies the fid conversions
+        that were queued up until now."""
+        data, self.data = self.data, None
+        with MemoryModReader(self.inName, data) as reader:
+            if self._strings is not None:
+                reader.setStringTable(self._strings)
+                self._strings = None
+            self.loadData(reader, reader.size)
+        for mapper, toLong in self._fid_conversions:
+            self._convert_children(mapper, toLong)
+        del self._fid_conversions[:]
+
+    def _children_raw(self):
+        """Returns True if the children are still raw data that can be written
+        as it was loaded."""
+        return self.data is not None and not self._fid_conversions
+
     def loadData(self,ins,endPos):
         """Loads data from input stream. Called by load()."""
         cellType_class = self.loadFactory.getCellTypeClass()
-        persistent,temp,distant = self.persistent,self.temp,self.distant
+        persistent,temp,distant = self._persistent,self._temp,self._distant
         insAtEnd = ins.atEnd
         insRecHeader = ins.unpackRecHeader
         cellGet = cellType_class.get
@@ -420,9 +633,9 @@ def loadData(self,ins,endPos):
                 elif groupType ==  9: tempAppend(record)
                 elif groupType == 10: distantAppend(record)
             elif recType == 'LAND':
-                self.land = recClass(header,ins,False)
+                self._land = recClass(header,ins,False)
             elif recType == 'PGRD':
-                self.pgrd = recClass(header,ins,False)
+                self._pgrd = recClass(header,ins,False)
         self.setChanged()
 
     def getSize(self):
@@ -433,6 +646,8 @@ def getSize(self):
     def getChildrenSize(self):
         """Returns size of all children, including the group header.  This
         does not include the cell itself."""
+        if self._children_raw():
+            return self.size if self.data else 0
         size = self.getPersistentSize() + self.getTempSize() + \
                self.getDistantSize()
         return size + RecordHeader.rec_header_size * bool(size)
@@ -463,6 +678,17 @@ def getDistantSize(self):
     def getNumRecords(self,includeGroups=True):
         """Returns number of records, including self and all children."""
         count = 1 + includeGroups # Cell GRUP and CELL record
+        if self._children_raw():
+            # Count the headers in the raw data instead of unpacking it
+            with self.getReader() as reader:
+                while not reader.atEnd(reader.size, u'Cell Block'):
+                    header = reader.unpackRecHeader()
+                    if header.recType == 'GRUP':
+                        count += includeGroups
+                    else:
+                        count += 1
+                        reader.seek(header.size, 1)
+            return count
         if self.persistent:
             count += len(self.persistent) + includeGroups
         if self.temp or self.pgrd or self.land:
@@ -492,15 +718,23 @@ def dump(self,out):
         """Dumps group header and then records."""
         self.cell.getSize()
         self.cell.dump(out)
+        if self._children_raw():
+            if self.data:
+                out.write(self.header.pack())
+                out.write(self.data)
+            return
         childrenSize = self.getChildrenSize()
         if not childrenSize: return
-        out.writeGroup(childrenSize,self.cell.fid,6,self.stamp)
+        cell_fid, stamp = self.cell.fid, self.stamp
+        out.write(GrupHeader(childrenSize, cell_fid, 6, stamp).pack())
         if self.persistent:
-            out.writeGroup(self.getPersistentSize(),self.cell.fid,8,self.stamp)
+            out.write(GrupHeader(self.getPersistentSize(), cell_fid, 8,
+                                 stamp).pack())
             for record in self.persistent:
                 record.dump(out)
         if self.temp or self.pgrd or self.land:
-            out.writeGroup(self.getTempSize(),self.cell.fid,9,self.stamp)
+            out.write(GrupHeader(self.getTempSize(), cell_fid, 9,
+                                 stamp).pack())
             if self.pgrd:
                 self.pgrd.dump(out)
             if self.land:
@@ -508,26 +742,43 @@ def dump(self,out):
             for record in self.temp:
                 record.dump(out)
         if self.distant:
-            out.writeGroup(self.getDistantSize(),self.cell.fid,10,self.stamp)
+            out.write(GrupHeader(self.getDistantSize(), cell_fid, 10,
+                                 stamp).pack())
             for record in self.distant:
                 record.dump(out)
 
     #--Fid manipulation, record filtering ----------------------------------
+    def iter_records(self):
+        yield self.cell
+        for record in self.persistent: yield record
+        for record in self.temp: yield record
+        for record in self.distant: yield record
+        if self.land: yield self.land
+        if self.pgrd: yield self.pgrd
+
+    def iter_loaded_records(self):
+        if self.data is not None: return iter((self.cell,))
+        return self.iter_records()
+
     def convertFids(self,mapper,toLong):
         """Converts fids between formats according to mapper.
         toLong should be True if converting to long format or False if
         converting to short format."""
         self.cell.convertFids(mapper,toLong)
-        for record in self.temp:
-            record.convertFids(mapper,toLong)
-        for record in self.persistent:
-            record.convertFids(mapper,toLong)
-        for record in self.distant:
-            record.convertFids(mapper,toLong)
-        if self.land:
-            self.land.convertFids(mapper,toLong)
-        if self.pgrd:
-            self.pgrd.convertFids(mapper,toLong)
+        if self.data is not None:
+            self._fid_conversions.append((mapper, toLong))
+        else:
+            self._convert_children(mapper, toLong)
+
+    def _convert_children(self, mapper, toLong):
+        """Converts the fids of the children of the cell."""
+        _convert_fids(self._temp, mapper, toLong)
+        _convert_fids(self._persistent, mapper, toLong)
+        _convert_fids(self._distant, mapper, toLong)
+        if self._land:
+            self._land.convertFids(mapper,toLong)
+        if self._pgrd:
+            self._pgrd.convertFids(mapper,toLong)
 
     def updateMasters(self,masters):
         """Updates set of master names according to masters actually used."""
@@ -556,7 +807,7 @@ def updateRecords(self,srcBlock,mapper,mergeIds):
                 if myRecord.fid != mapper(record.fid):
                     raise ArgumentError(u"Fids don't match! %08x, %08x" % (
                         myRecord.fid,record.fid))
-                if not record.flags1.ignored:
+                if not record.flags1_int & MreRecord.ignored_mask:
                     record = record.getTypeCopy(mapper)
                     selfSetter(attr,record)
                     mergeDiscard(record.fid)
@@ -565,7 +816,8 @@ def updateRecords(self,srcBlock,mapper,mergeIds):
             fids = dict(
                 (record.fid,index) for index,record in enumerate(recordList))
             for record in srcGetter(attr):
-                if not record.flags1.ignored and mapper(record.fid) in fids:
+                if not record.flags1_int & MreRecord.ignored_mask and \
+                        mapper(record.fid) in fids:
                     record = record.getTypeCopy(mapper)
                     recordList[fids[record.fid]] = record
                     mergeDiscard(record.fid)
@@ -612,7 +864,7 @@ def setCell(self,cell):
         if fid in self.id_cellBlock:
             self.id_cellBlock[fid].cell = cell
         else:
-            cellBlock = MobCell(RecordHeader('GRUP', 0, 0, 6, self.stamp),
+            cellBlock = MobCell(GrupHeader(0, 0, 6, self.stamp),
                                 self.loadFactory, cell)
             cellBlock.setChanged()
             self.cellBlocks.append(cellBlock)
@@ -661,12 +913,12 @@ def dumpBlocks(self,out,bsbCellBlocks,bsb_size,blockGroupType,
             bsb0 = (block,None)
             if block != curBlock:
                 curBlock,curSubblock = bsb0
-                outWrite(RecordHeader('GRUP',bsb_size[bsb0],block,
-                                      blockGroupType,stamp).pack())
+                outWrite(GrupHeader(bsb_size[bsb0],block,
+                                    blockGroupType,stamp).pack())
             if subblock != curSubblock:
                 curSubblock = subblock
-                outWrite(RecordHeader('GRUP',bsb_size[bsb],subblock,
-                                      subBlockGroupType,stamp).pack())
+                outWrite(GrupHeader(bsb_size[bsb],subblock,
+                                    subBlockGroupType,stamp).pack())
             cellBlock.dump(out)
 
     def getNumRecords(self,includeGroups=1):
@@ -687,6 +939,14 @@ def keepRecords(self,keepIds):
         self.id_cellBlock.clear()
         self.setChanged()
 
+    def iter_records(self):
+        for cellBlock in self.cellBlocks:
+            for record in cellBlock.iter_records(): yield record
+
+    def iter_loaded_records(self):
+        for cellBlock in self.cellBlocks:
+            for record in cellBlock.iter_loaded_records(): yield record
+
     def convertFids(self,mapper,toLong):
         """Converts fids between formats according to mapper.
         toLong should be True if converting to long format or False if
@@ -758,9 +1018,9 @@ def loadData(self,ins,endPos):
                                            u'Cell subgroup (%X) does not '
                                            u'match CELL <%X> %s.' %
                                            (groupFid,cell.fid,cell.eid))
-                        if unpackCellBlocks:
+                        if unpackCellBlocks: # unpacked on first access
                             cellBlock = MobCell(header,selfLoadFactory,cell,
-                                                ins,True)
+                                                ins)
                         else:
                             cellBlock = MobCell(header,selfLoadFactory,cell)
                             insSeek(delta,1)
@@ -797,6 +1057,13 @@ def __init__(self, header, loadFactory, world, ins=None, do_unpack=False):
         self.world = world
         self.worldCellBlock = None
         self.road = None
+        # Spatial index of the exterior cell blocks - maps sub-block grid
+        # coordinates to lists of the cell blocks in that sub-block
+        self._grid_cellBlocks = {}
+        # Maps the indexed cell blocks to their sub-block grid coordinates
+        self._grid_subblock = {}
+        # The cellBlocks list and its length when the index was last updated
+        self._grid_indexed = None
         MobCells.__init__(self, header, loadFactory, ins, do_unpack)
 
     def loadData(self,ins,endPos):
@@ -805,7 +1072,8 @@ def loadData(self,ins,endPos):
         errLabel = u'World Block'
         cell = None
         block = None
-        # subblock = None # unused var
+        subblock = None
+        cell_subblock = {}
         endBlockPos = endSubblockPos = 0
         cellBlocks = self.cellBlocks
         unpackCellBlocks = self.loadFactory.getUnpackCellBlocks('WRLD')
@@ -823,7 +1091,7 @@ def loadData(self,ins,endPos):
             if curPos >= endBlockPos:
                 block = None
             if curPos >= endSubblockPos:
-                pass # subblock = None # unused var
+                subblock = None
             #--Get record info and handle it
             header = insRecHeader()
             recType,size = header.recType,header.size
@@ -847,6 +1115,7 @@ def loadData(self,ins,endPos):
                 cell = recClass(header,ins,True)
                 if isFallout: cells[cell.fid] = cell
                 if block:
+                    cell_subblock[cell.fid] = subblock
                     if cell:
                         cellBlock = MobCell(header, selfLoadFactory, cell)
                         if block:
@@ -870,10 +1139,8 @@ def loadData(self,ins,endPos):
                     block = (block[1],block[0])
                     endBlockPos = insTell() + delta
                 elif groupType == 5: # Exterior Cell Sub-Block
-                    # we don't actually care what the sub-block is, since
-                    # we never use that information here. So below was unused:
-                    # subblock = structUnpack('2h',structPack('I',groupFid))
-                    # subblock = (subblock[1],subblock[0]) # unused var
+                    subblock = struct_unpack('2h', struct_pack('I', groupFid))
+                    subblock = (subblock[1],subblock[0])
                     endSubblockPos = insTell() + delta
                 elif groupType == 6: # Cell Children
                     if isFallout: cell = cells.get(groupFid,None)
@@ -884,14 +1151,19 @@ def loadData(self,ins,endPos):
                                            u'match CELL <%s> %s.' %
                                            (hex(groupFid),hex(cell.fid),
                                             cell.eid))
-                        if unpackCellBlocks:
+                        if unpackCellBlocks: # unpacked on first access
                             cellBlock = MobCell(header,selfLoadFactory,cell,
-                                                ins,True)
+                                                ins)
                         else:
                             cellBlock = MobCell(header,selfLoadFactory,cell)
                             insSeek(delta,1)
                         if block:
-                            cellBlocksAppend(cellBlock)
+                            # Replace the block added for the cell record
+                            # above, if any - else the cell would be written
+                            # out twice
+                            if cellBlocks and cellBlocks[-1].cell is cell:
+                                cellBlocks[-1] = cellBlock
+                            else: cellBlocksAppend(cellBlock)
                         else:
                             if self.worldCellBlock:
                                 raise ModError(self.inName,
@@ -912,6 +1184,7 @@ def loadData(self,ins,endPos):
                 raise ModError(self.inName,
                                u'Unexpected %s record in world children '
                                u'group.' % recType)
+        self.indexGrid(cell_subblock)
         self.setChanged()
 
     def getNumRecords(self,includeGroups=True):
@@ -955,6 +1228,21 @@ def dump(self,out):
             return worldSize
 
     #--Fid manipulation, record filtering ----------------------------------
+    def iter_records(self):
+        yield self.world
+        if self.road: yield self.road
+        if self.worldCellBlock:
+            for record in self.worldCellBlock.iter_records(): yield record
+        for record in MobCells.iter_records(self): yield record
+
+    def iter_loaded_records(self):
+        yield self.world
+        if self.road: yield self.road
+        if self.worldCellBlock:
+            for record in self.worldCellBlock.iter_loaded_records():
+                yield record
+        for record in MobCells.iter_loaded_records(self): yield record
+
     def convertFids(self,mapper,toLong):
         """Converts fids between formats according to mapper.
         toLong should be True if converting to long format or False if
@@ -988,7 +1276,7 @@ def updateRecords(self,srcBlock,mapper,mergeIds):
                 if myRecord.fid != mapper(record.fid):
                     raise ArgumentError(u"Fids don't match! %08x, %08x" % (
                         myRecord.fid,record.fid))
-                if not record.flags1.ignored:
+                if not record.flags1_int & MreRecord.ignored_mask:
                     record = record.getTypeCopy(mapper)
                     selfSetter(attr,record)
                     mergeDiscard(record.fid)
@@ -1006,9 +1294,102 @@ def keepRecords(self,keepIds):
             if self.worldCellBlock.cell.fid not in keepIds:
                 self.worldCellBlock = None
         MobCells.keepRecords(self,keepIds)
+        self._grid_cellBlocks.clear()
+        self._grid_subblock.clear()
+        self._grid_indexed = None
         if self.road or self.worldCellBlock or self.cellBlocks:
             keepIds.add(self.world.fid)
 
+    #--Spatial index -------------------------------------------------------
+    @staticmethod
+    def _grid_pos(cellBlock):
+        """Returns the grid coordinates of the cell of cellBlock, treating
+        missing ones as 0 like getBsb does."""
+        cell = cellBlock.cell
+        return cell.posX or 0, cell.posY or 0
+
+    def _grid_current(self):
+        """Returns True if the spatial index is up to date with cellBlocks -
+        it is not if the list was replaced or resized directly."""
+        indexed = self._grid_indexed
+        return indexed is not None and indexed[0] is self.cellBlocks and \
+               indexed[1] == len(self.cellBlocks)
+
+    def indexGrid(self, cell_subblock=None):
+        """Indexes the exterior cell blocks by the grid coordinates of their
+        sub-blocks. When loading, cell_subblock maps cell fids to the
+        (x, y) labels of the sub-block groups they were read from, so the
+        cells' positions need not be looked at - other cells are placed by
+        their position. Call this after moving cells around in place."""
+        grid = self._grid_cellBlocks
+        grid.clear()
+        cellBlock_subblock = self._grid_subblock
+        cellBlock_subblock.clear()
+        get_label = (cell_subblock or {}).get
+        grid_pos = self._grid_pos
+        for cellBlock in self.cellBlocks:
+            subblock = get_label(cellBlock.cell.fid)
+            if subblock is None:
+                x, y = grid_pos(cellBlock)
+                subblock = (x // 8, y // 8)
+            grid.setdefault(subblock, []).append(cellBlock)
+            cellBlock_subblock[cellBlock] = subblock
+        self._grid_indexed = (self.cellBlocks, len(self.cellBlocks))
+
+    def setCell(self,cell):
+        """Adds record to record list and indexed."""
+        grid_current = self._grid_current()
+        MobCells.setCell(self, cell)
+        if not grid_current: return # rebuilt on next use
+        cellBlock = self.id_cellBlock[cell.fid]
+        x, y = self._grid_pos(cellBlock)
+        subblock = (x // 8, y // 8)
+        old_subblock = self._grid_subblock.get(cellBlock)
+        if subblock != old_subblock: # new cell, or the new record moved it
+            if old_subblock is not None:
+                self._grid_cellBlocks[old_subblock].remove(cellBlock)
+            self._grid_cellBlocks.setdefault(subblock, []).append(cellBlock)
+            self._grid_subblock[cellBlock] = subblock
+        self._grid_indexed = (self.cellBlocks, len(self.cellBlocks))
+
+    def _iter_region(self, min_x, min_y, max_x, max_y):
+        """Yields (grid coordinates, cell block) for the exterior cells in
+        the specified region, only looking at the sub-blocks it overlaps."""
+        if not self._grid_current(): self.indexGrid()
+        grid = self._grid_cellBlocks
+        grid_pos = self._grid_pos
+        for sub_x in xrange(min_x // 8, max_x // 8 + 1):
+            for sub_y in xrange(min_y // 8, max_y // 8 + 1):
+                for cellBlock in grid.get((sub_x, sub_y), ()):
+                    pos = grid_pos(cellBlock)
+                    if min_x <= pos[0] <= max_x and min_y <= pos[1] <= max_y:
+                        yield pos, cellBlock
+
+    def getCellBlockAt(self, x, y, default=None):
+        """Returns the block of the exterior cell at grid coordinates
+        (x, y), or default if there is none."""
+        for pos, cellBlock in self._iter_region(x, y, x, y):
+            return cellBlock
+        return default
+
+    def getCellBlocksInRegion(self, min_x, min_y, max_x, max_y):
+        """Returns the blocks of the exterior cells with grid coordinates
+        between (min_x, min_y) and (max_x, max_y), inclusive, sorted by their
+        coordinates."""
+        return [cellBlock for pos, cellBlock in sorted(
+            self._iter_region(min_x, min_y, max_x, max_y),
+            key=itemgetter(0))]
+
+    def getCellBlocksInRadius(self, x, y, radius):
+        """Returns the blocks of the exterior cells whose grid coordinates
+        are at most radius cells away from (x, y), sorted by their
+        coordinates."""
+        max_dist = radius * radius
+        return [cellBlock for pos, cellBlock in sorted(
+            self._iter_region(x - radius, y - radius, x + radius, y + radius),
+            key=itemgetter(0)) if
+                (pos[0] - x) ** 2 + (pos[1] - y) ** 2 <= max_dist]
+
 #------------------------------------------------------------------------------
 class MobWorlds(MobBase):
     """Tes4 top block for world records and related roads and cells. Consists
@@ -1081,7 +1462,7 @@ def dump(self,out):
         else:
             if not self.worldBlocks: return
             worldHeaderPos = out.tell()
-            header = RecordHeader('GRUP', 0, self.label, 0, self.stamp)
+            header = GrupHeader(0, self.label, 0, self.stamp)
             out.write(header.pack())
             totalSize = header.__class__.rec_header_size + sum(
                 x.dump(out) for x in self.worldBlocks)
@@ -1094,6 +1475,14 @@ def getNumRecords(self,includeGroups=True):
         count = sum(x.getNumRecords(includeGroups) for x in self.worldBlocks)
         return count + includeGroups * bool(count)
 
+    def iter_records(self):
+        for worldBlock in self.worldBlocks:
+            for record in worldBlock.iter_records(): yield record
+
+    def iter_loaded_records(self):
+        for worldBlock in self.worldBlocks:
+            for record in worldBlock.iter_loaded_records(): yield record
+
     def convertFids(self,mapper,toLong):
         """Converts fids between formats according to mapper.
         toLong should be True if converting to long format or False if
@@ -1130,7 +1519,7 @@ def setWorld(self, world, worldcellblock=None):
             self.id_worldBlocks[fid].world = world
             self.id_worldBlocks[fid].worldCellBlock = worldcellblock
         else:
-            worldBlock = MobWorld(RecordHeader('GRUP',0,0,1,self.stamp),
+            worldBlock = MobWorld(GrupHeader(0,0,1,self.stamp),
                                   self.loadFactory,world)
             worldBlock.setChanged()
             self.worldBlocks.append(worldBlock)
@@ -0,0 +1,820 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# GPL License and Copyright Notice ============================================
+#  This file is part of Wrye Bash.
+#
+#  Wrye Bash is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  Wrye Bash is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Wrye Bash; if not, write to the Free Software Foundation,
+#  Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#  Wrye Bash copyright (C) 2005-2009 Wrye, 2010-2020 Wrye Bash Team
+#  https://github.com/wrye-bash
+#
+# =============================================================================
+
+"""
+This script benchmarks the plugin reading and writing code of Wrye Bash. For
+each game it generates a synthetic plugin from the record definitions in
+'Mopy/bash/game/*/records.py' - every record type that lives in a plain top
+group, filled with random data, plus some interior and exterior cells with
+references - and then times loading it with and without unpacking the
+records, converting its fids to long format, copying its records and saving
+it. The script fails unless:
+- saving writes the plugin back byte for byte, whether it was loaded eagerly,
+  lazily or in a pool of processes
+- lazily and eagerly decoded records pack to the same data, as do records
+  parsed by the pool and by the loading process
+- the names of the map markers among the references load back, from the
+  strings files for localized plugins - also through lazily unpacked cells
+- looking up records by eid and exterior cells by their grid coordinates
+  finds the same ones as scanning for them, also after setRecord, setCell
+  and keepRecords
+No game install or GUI is needed, so this can run headless on any OS.
+"""
+
+from __future__ import absolute_import, division, print_function
+import argparse
+import gettext
+import importlib
+import logging
+import os
+import pkgutil
+import random
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import zlib
+from timeit import default_timer
+
+import utils
+
+LOGGER = logging.getLogger(__name__)
+
+SCRIPTS_PATH = os.path.dirname(os.path.abspath(__file__))
+LOGFILE = os.path.join(SCRIPTS_PATH, u"benchmark.log")
+MOPY_PATH = os.path.abspath(os.path.join(SCRIPTS_PATH, u"..", u"Mopy"))
+sys.path.append(MOPY_PATH)
+
+# Top groups that are not plain MobObjects - their records are not generated
+# like the others. CELL and WRLD get a few cells with references instead, see
+# PluginGenerator.generate_cells
+SKIPPED_TOP_GROUPS = {b"CELL", b"WRLD", b"DIAL"}
+STRINGS_LANGUAGE = u"English"
+
+
+def setup_parser(parser):
+    parser.add_argument(
+        "-l",
+        "--logfile",
+        default=LOGFILE,
+        help="Where to store the log. [default: {}]".format(utils.relpath(LOGFILE)),
+    )
+    parser.add_argument(
+        "-g",
+        "--game",
+        action="append",
+        dest="games",
+        help="Game to benchmark, e.g. 'Oblivion' or 'Skyrim Special "
+        "Edition'. Can be given more than once. [default: all games that "
+        "Wrye Bash can build patches for]",
+    )
+    parser.add_argument(
+        "-n",
+        "--records",
+        type=int,
+        default=100,
+        help="How many records of each type to generate. [default: 100]",
+    )
+    parser.add_argument(
+        "-c",
+        "--compress-every",
+        type=int,
+        default=3,
+        help="Compress every n-th record, 0 to not compress any. [default: 3]",
+    )
+    parser.add_argument(
+        "-s",
+        "--localized",
+        action="store_true",
+        help="Generate localized plugins with strings files, for the games "
+        "that support them.",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=3,
+        help="How often to repeat each timing, the best one is reported. "
+        "[default: 3]",
+    )
+    parser.add_argument(
+        "-p",
+        "--parse-processes",
+        type=int,
+        default=0,
+        help="Also time loading with a pool of this many processes parsing "
+        "the top groups. [default: 0, don't]",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed for the random record data. [default: 0]",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        help="Where to write the generated plugins. They are deleted "
+        "afterwards unless this is given.",
+    )
+
+
+def get_benchmarked_games():
+    """Returns the names of the games Wrye Bash can build patches for, i.e.
+    the ones with record definitions."""
+    from bash import game as game_init
+
+    game_names = []
+    for _importer, modname, ispkg in pkgutil.iter_modules(game_init.__path__):
+        if not ispkg:
+            continue
+        game_type = __import__(
+            "bash.game." + modname, fromlist=[modname]
+        ).GAME_TYPE
+        if game_type.Esp.canBash:
+            game_names.append(game_type.fsName)
+    return sorted(game_names)
+
+
+def set_game(game_name):
+    """Sets the game Wrye Bash runs for, using a mock install that only
+    contains its detection file."""
+    from bash import bush
+
+    game_install_path = tempfile.mkdtemp()
+    try:
+        bush._supportedGames()
+        detect_file = os.path.join(
+            game_install_path, *bush._allGames[game_name].game_detect_file
+        )
+        open(detect_file, "wb").close()
+        bush.detect_and_set_game(game_install_path)
+    finally:
+        shutil.rmtree(game_install_path)
+    if bush.game.fsName != game_name:
+        raise RuntimeError(u"Detected {} instead of {}".format(
+            bush.game.fsName, game_name))
+    return bush.game
+
+
+def get_record_classes():
+    """Returns the record classes Wrye Bash reads for the current game, plus
+    the class of its references - those are not read for every game, but the
+    generated cells hold some."""
+    from bash import bush
+    from bash.brec import MreRecord
+
+    rec_classes = MreRecord.type_class.values()
+    if b"REFR" not in MreRecord.type_class:
+        # Look in the records modules of the game and the ones it builds on
+        for game_type in type(bush.game).__mro__:
+            try:
+                records = importlib.import_module(
+                    game_type.__module__ + u".records")
+            except ImportError:
+                continue
+            if hasattr(records, "MreRefr"):
+                rec_classes.append(records.MreRefr)
+                break
+    return rec_classes
+
+
+class PluginInfo(object):
+    """The parts of bosh.ModInfo that ModFile needs, for plugins that are not
+    in a Data folder."""
+
+    def __init__(self, plugin_path):
+        from bash.bolt import GPath
+
+        self._plugin_path = GPath(plugin_path)
+        self.name = self._plugin_path.tail
+
+    def getPath(self):
+        return self._plugin_path
+
+    def getStringsPaths(self, lang):
+        from bash import bush
+
+        strings_paths = []
+        for join, format_str in bush.game.Esp.stringsFiles:
+            strings_path = self._plugin_path.head.join(*join).join(
+                format_str % {u"body": self.name.sbody,
+                              u"ext": self.name.cext[1:], u"language": lang}
+            )
+            if strings_path.exists():
+                strings_paths.append(strings_path)
+        return strings_paths
+
+
+def _struct_codes(struct_format):
+    """Returns the format character of every value packed by struct_format,
+    with strings and padding left out."""
+    codes = []
+    for count, code in re.findall(r"(\d*)([a-zA-Z?])", struct_format):
+        if code in "sp":
+            codes.append(None)
+        elif code != "x":
+            codes.extend(code * int(count or 1))
+    return codes
+
+
+_value_ranges = {
+    "b": (-0x80, 0x7F), "B": (0, 0xFF), "h": (-0x8000, 0x7FFF),
+    "H": (0, 0xFFFF), "i": (-0x80000000, 0x7FFFFFFF), "I": (0, 0xFFFFFFFF),
+    "l": (-0x80000000, 0x7FFFFFFF), "L": (0, 0xFFFFFFFF),
+}
+
+
+class PluginGenerator(object):
+    """Generates synthetic plugins for the currently set game."""
+
+    def __init__(self, records_per_type, compress_every, localized, seed):
+        from bash import bush
+
+        self.records_per_type = records_per_type
+        self.compress_every = compress_every
+        self.localized = localized and bool(bush.game.Esp.stringsFiles)
+        self._rnd = random.Random(seed)
+        self._strings = {}  # string id -> (strings file extension, text)
+        # fid -> map marker name of the generated references that have one
+        self.marker_names = {}
+
+    def _random_fid(self):
+        # Half of the references point to the master, half to the plugin
+        return (self._rnd.randint(0, 1) << 24) | self._rnd.randint(
+            0x800, 0x800 + self.records_per_type)
+
+    def _random_text(self):
+        return u"Text %d" % self._rnd.randint(0, 99999)
+
+    def _fill_record(self, record):
+        """Assigns random values to the elements of record that hold plain
+        values - everything else keeps its defaults."""
+        from bash import brec
+
+        rnd = self._rnd
+        elements = set(record.__class__.melSet.loaders.itervalues())
+        for element in elements:
+            element_type = type(element)
+            if element_type is brec.MelEdid:
+                record.eid = u"%s_%08X" % (record.recType, record.fid)
+            elif isinstance(element, brec.MelStrings):
+                setattr(record, element.attr, [self._random_text()])
+            elif isinstance(element, brec.MelString):
+                setattr(record, element.attr, self._random_text())
+            elif element_type is brec.MelFid:
+                setattr(record, element.attr, self._random_fid())
+            elif element_type in (brec.MelFids, brec.MelFidList,
+                                  brec.MelSortedFidList):
+                setattr(record, element.attr, [
+                    self._random_fid() for x in xrange(rnd.randint(1, 4))])
+            elif isinstance(element, brec.MelStruct):
+                codes = _struct_codes(element._static_struct.format)
+                if len(codes) != len(element.attrs):
+                    continue
+                for attr, code, action in zip(element.attrs, codes,
+                                              element.actions):
+                    if action or code is None:
+                        continue
+                    if attr in element.formAttrs:
+                        setattr(record, attr, self._random_fid())
+                    elif code in "fd":
+                        setattr(record, attr, rnd.uniform(-1000, 1000))
+                    elif code in _value_ranges:
+                        setattr(record, attr, rnd.randint(
+                            *_value_ranges[code]))
+
+    @staticmethod
+    def _pack(record):
+        """Returns the packed, uncompressed data of record, or None if it does
+        not load back to the same data."""
+        from bash import bolt, brec
+
+        try:
+            record.setChanged()
+            record.getSize()
+            packed = record.data
+            out = brec.ModWriter(bolt.sio())
+            record.dump(out)
+            ins = brec.ModReader(record.recType, bolt.sio(out.getvalue()))
+            reloaded = record.__class__(ins.unpackRecHeader(), ins, True)
+            reloaded.setChanged()
+            reloaded.getSize()
+        except Exception:
+            LOGGER.debug(u"Failed to pack %r", record, exc_info=True)
+            return None
+        return packed if reloaded.data == packed else None
+
+    def _localize(self, record, data):
+        """Replaces the localized strings in the packed data of record with
+        ids into the strings files."""
+        from bash import bolt, brec
+
+        lstring_sigs = set()
+        elements = list(record.__class__.melSet.elements)
+        while elements:  # look into groups as well
+            element = elements.pop()
+            if isinstance(element, brec.MelLString):
+                lstring_sigs.add(element.subType)
+            elements.extend(getattr(element, "elements", ()))
+        if not lstring_sigs:
+            return data
+        ins = brec.ModReader(record.recType, bolt.sio(data))
+        out = brec.ModWriter(bolt.sio())
+        while not ins.atEnd(len(data), record.recType):
+            sub_sig, sub_size = ins.unpackSubHeader(record.recType)
+            sub_data = ins.read(sub_size, record.recType)
+            if sub_sig in lstring_sigs and sub_size > 1:
+                string_id = len(self._strings) + 1
+                strings_ext = {b"FULL": u".STRINGS", b"DESC": u".DLSTRINGS"
+                               }.get(sub_sig, u".ILSTRINGS")
+                self._strings[string_id] = (strings_ext, sub_data[:-1])
+                sub_data = struct.pack("=I", string_id)
+            out.packSub(sub_sig, sub_data)
+        return out.getvalue()
+
+    def _write_strings_files(self, plugin_path):
+        strings_dir = os.path.join(os.path.dirname(plugin_path), u"Strings")
+        if not os.path.isdir(strings_dir):
+            os.makedirs(strings_dir)
+        plugin_body = os.path.splitext(os.path.basename(plugin_path))[0]
+        for strings_ext in (u".STRINGS", u".DLSTRINGS", u".ILSTRINGS"):
+            entries = sorted((string_id, text) for string_id, (ext, text)
+                             in self._strings.iteritems() if ext == strings_ext)
+            directory, data = [], []
+            offset = 0
+            for string_id, text in entries:
+                directory.append(struct.pack("=2I", string_id, offset))
+                if strings_ext == u".STRINGS":
+                    entry = text + b"\x00"
+                else:  # length prefixed
+                    entry = struct.pack("=I", len(text) + 1) + text + b"\x00"
+                data.append(entry)
+                offset += len(entry)
+            strings_path = os.path.join(strings_dir, u"%s_%s%s" % (
+                plugin_body, STRINGS_LANGUAGE, strings_ext))
+            with open(strings_path, "wb") as out:
+                out.write(struct.pack("=2I", len(entries), offset))
+                out.write(b"".join(directory))
+                out.write(b"".join(data))
+
+    def _new_record(self, rec_class, fid, index, customize=None):
+        """Returns a new record of rec_class with random values, or default
+        values if the random ones do not round trip - None if those do not
+        either. customize is called with the record before it gets packed.
+        The record holds its packed data, compressed if it is the index-th
+        one of its type and that one should be."""
+        from bash.brec import RecordHeader
+
+        rec_sig = rec_class.classType
+        record = rec_class(RecordHeader(rec_sig, 0, 0, fid, 0))
+        self._fill_record(record)
+        if customize:
+            customize(record)
+        packed = self._pack(record)
+        if packed is None:  # random values it can't handle
+            LOGGER.debug(u"Using default values for %s %08X", rec_sig, fid)
+            record = rec_class(RecordHeader(rec_sig, 0, 0, fid, 0))
+            if customize:
+                customize(record)
+            packed = self._pack(record)
+            if packed is None:
+                return None
+        if self.localized:
+            packed = self._localize(record, packed)
+        if self.compress_every and index % self.compress_every == 0:
+            record.flags1.compressed = True
+            packed = struct.pack("=I", len(packed)) + zlib.compress(packed, 6)
+        record.setData(packed)
+        return record
+
+    def generate_cells(self, mod_file, next_fid):
+        """Adds interior cells to the CELL group of mod_file and a worldspace
+        with exterior cells to its WRLD group, each cell with a few
+        references. Where references can be map markers, they get a name -
+        see marker_names. Returns the number of records added."""
+        type_class = {c.classType: c for c in get_record_classes()}
+        if not all(s in type_class for s in (b"CELL", b"WRLD", b"REFR")):
+            return 0
+        cell_class, refr_class = type_class[b"CELL"], type_class[b"REFR"]
+        marker_group = next((e for e in refr_class.melSet.elements
+                             if getattr(e, "attr", None) == "map_marker"),
+                            None)
+        if refr_class.melSet.loaders.get(b"FULL") is not marker_group:
+            marker_group = None  # another element loads the names
+        self.marker_names.clear()
+        fids = iter(xrange(next_fid, next_fid + 0x100000))
+        rnd = self._rnd
+        num_cells = max(self.records_per_type // 10, 2)
+        new_records = []
+
+        def add_marker(record):
+            if marker_group is None or rnd.randint(0, 1):
+                return
+            record.map_marker = marker_group.getDefault()
+            record.map_marker.full = self.marker_names[record.fid] = (
+                u"Marker %d" % rnd.randint(0, 99999))
+
+        def new_record(rec_class, customize=None):
+            record = self._new_record(rec_class, next(fids),
+                                      len(new_records), customize)
+            if record is None:
+                raise RuntimeError(u"%s records do not round trip" %
+                                   rec_class.classType)
+            new_records.append(record)
+            return record
+
+        def add_references(cell_block):
+            for index in xrange(rnd.randint(1, 4)):
+                children = (cell_block.persistent, cell_block.temp)[index % 2]
+                children.append(new_record(refr_class, add_marker))
+
+        def make_interior(cell):
+            cell.flags.isInterior = True
+
+        for index in xrange(num_cells):
+            cell = new_record(cell_class, make_interior)
+            mod_file.CELL.setCell(cell)
+            add_references(mod_file.CELL.id_cellBlock[cell.fid])
+        world = new_record(type_class[b"WRLD"])
+        mod_file.WRLD.setWorld(world)
+        world_block = mod_file.WRLD.id_worldBlocks[world.fid]
+        for index in xrange(num_cells):
+            def place_cell(cell, grid_pos=(index % 12 - 6, index // 12 - 6)):
+                cell.flags.isInterior = False
+                cell.posX, cell.posY = grid_pos
+            cell = new_record(cell_class, place_cell)
+            world_block.setCell(cell)
+            add_references(world_block.id_cellBlock[cell.fid])
+        return len(new_records)
+
+    def generate(self, plugin_path):
+        """Writes a synthetic plugin to plugin_path. Returns the number of
+        record types and records it contains."""
+        from bash import bush, parsers
+        from bash.bolt import GPath
+        from bash.brec import MreRecord, RecordHeader, MelRecord
+
+        mod_file = parsers.ModFile(PluginInfo(plugin_path), parsers.LoadFactory(
+            True, *get_record_classes()))
+        mod_file.tes4.masters = [GPath(bush.game.masterFiles[0])]
+        mod_file.tes4.author = u"Wrye Bash benchmark"
+        if self.localized:
+            mod_file.tes4.flags1.hasStrings = True
+        self._strings.clear()
+        next_fid = 0x01000800
+        num_types = num_records = 0
+        for rec_sig, rec_class in sorted(MreRecord.type_class.iteritems()):
+            if (rec_sig not in RecordHeader.topTypes or
+                    rec_sig in SKIPPED_TOP_GROUPS or
+                    not issubclass(rec_class, MelRecord)):
+                continue
+            records = []
+            for index in xrange(self.records_per_type):
+                record = self._new_record(rec_class, next_fid, index)
+                if record is None:
+                    break
+                records.append(record)
+                next_fid += 1
+            if len(records) != self.records_per_type:
+                LOGGER.debug(u"Skipping %s records, they do not round trip",
+                             rec_sig)
+                continue
+            getattr(mod_file, rec_sig).records.extend(records)
+            num_types += 1
+            num_records += len(records)
+        num_records += self.generate_cells(mod_file, next_fid)
+        mod_file.save(GPath(plugin_path))
+        if self.localized:
+            self._write_strings_files(plugin_path)
+        return num_types, num_records
+
+
+def _iter_references(mod_file):
+    """Yields the references in the cells of mod_file, unpacking them."""
+    cell_blocks = list(mod_file.CELL.cellBlocks)
+    for world_block in mod_file.WRLD.worldBlocks:
+        if world_block.worldCellBlock:
+            cell_blocks.append(world_block.worldCellBlock)
+        cell_blocks.extend(world_block.cellBlocks)
+    for cell_block in cell_blocks:
+        for reference in cell_block.persistent + cell_block.temp:
+            yield reference
+
+
+def check_marker_names(mod_file, generator):
+    """Returns True if the map markers among the references of mod_file got
+    the names they were generated with - looking them up in the strings files
+    for localized plugins."""
+    if not generator.marker_names:  # no cells or no map markers
+        return True
+    marker_names = {}
+    for reference in _iter_references(mod_file):
+        if reference.fid in generator.marker_names:
+            marker_names[reference.fid] = reference.map_marker.full
+    return marker_names == generator.marker_names
+
+
+def _grid_matches_scan(world_block):
+    """Returns True if the grid lookups of world_block find the same exterior
+    cells as scanning its cell blocks."""
+    def grid_pos(cell_block):
+        return cell_block.cell.posX or 0, cell_block.cell.posY or 0
+    cell_blocks = sorted(world_block.cellBlocks, key=grid_pos)
+    positions = [grid_pos(c) for c in cell_blocks]
+    min_x, max_x = min(p[0] for p in positions), max(p[0] for p in positions)
+    min_y, max_y = min(p[1] for p in positions), max(p[1] for p in positions)
+    for x in xrange(min_x - 1, max_x + 2):
+        for y in xrange(min_y - 1, max_y + 2):
+            expected = next((c for c in cell_blocks if grid_pos(c) == (x, y)),
+                            None)
+            if world_block.getCellBlockAt(x, y) is not expected:
+                return False
+    center_x, center_y = (min_x + max_x) // 2, (min_y + max_y) // 2
+    in_radius = [c for c, (x, y) in zip(cell_blocks, positions) if
+                 (x - center_x) ** 2 + (y - center_y) ** 2 <= 9]
+    in_region = [c for c, (x, y) in zip(cell_blocks, positions) if
+                 min_x < x <= max_x and min_y <= y < max_y]
+    return (world_block.getCellBlocksInRadius(center_x, center_y, 3) ==
+            in_radius and world_block.getCellBlocksInRegion(
+                min_x + 1, min_y, max_x, max_y - 1) == in_region)
+
+
+def check_cell_grid(mod_file):
+    """Returns True if looking up the exterior cells of mod_file by their
+    grid coordinates agrees with scanning them - after loading, after moving
+    a cell with setCell and after dropping cells with keepRecords."""
+    for world_block in getattr(mod_file.WRLD, "worldBlocks", ()):
+        if not world_block.cellBlocks:
+            continue
+        if not _grid_matches_scan(world_block):
+            return False
+        moved = world_block.cellBlocks[0].cell.getTypeCopy()
+        moved.posX, moved.posY = 20, -20
+        world_block.setCell(moved)
+        if not (_grid_matches_scan(world_block) and
+                world_block.getCellBlockAt(20, -20).cell is moved):
+            return False
+        world_block.keepRecords(
+            {c.cell.fid for c in world_block.cellBlocks[1::2]})
+        if world_block.cellBlocks and not _grid_matches_scan(world_block):
+            return False
+    return True
+
+
+def _eid_lookups_match_scan(top, seen_eids):
+    """Returns True if getRecordByEid finds the same records of the top group
+    top as scanning them for the first one with the eid, ignoring case. Looks
+    up the eids in the set seen_eids too, after adding the current ones."""
+    eid_record = {}
+    for record in top.records:
+        if record.eid:
+            eid_record.setdefault(record.eid.lower(), record)
+    seen_eids.update(eid_record)
+    seen_eids.add(u"nosucheditorid")
+    return all(top.getRecordByEid(eid.upper()) is eid_record.get(eid)
+               for eid in seen_eids)
+
+
+def check_eid_index(mod_file):
+    """Returns True if looking up the records of mod_file by eid agrees with
+    scanning them - after loading, after setRecord replaces and adds records
+    and after keepRecords drops records."""
+    for top in mod_file.tops.itervalues():
+        records = getattr(top, "records", None)
+        if not records or not hasattr(records[0], "eid") or (
+                records[0].isKeyedByEid):
+            continue
+        seen_eids = set()
+        if not _eid_lookups_match_scan(top, seen_eids):
+            return False
+        # Replace the first record with one with a new eid, then with one
+        # that takes over the eid of the last one, add one with a new eid and
+        # one with the eid of a middle one, then replace that middle one with
+        # one with a new eid
+        first, middle = records[0], records[len(records) // 2]
+        next_fid = max(r.fid for r in records) + 1
+        for record, fid, eid in (
+                (first, first.fid, u"Replaced_%s" % first.eid),
+                (first, first.fid, (records[-1].eid or u"").swapcase()),
+                (first, next_fid, u"Added_%s" % first.eid),
+                (first, next_fid + 1, middle.eid),
+                (middle, middle.fid, u"Renamed_%s" % middle.eid)):
+            record = record.getTypeCopy()
+            record.fid, record.eid = fid, eid
+            top.setRecord(record)
+            if not _eid_lookups_match_scan(top, seen_eids):
+                return False
+        top.keepRecords({r.fid for r in top.records[1::2]})
+        if not _eid_lookups_match_scan(top, seen_eids):
+            return False
+    return True
+
+
+def _dump_records(mod_file):
+    """Returns the records of mod_file as (signature, fid, data) tuples, their
+    data packed from their attributes. Looks up every attribute first, so
+    that lazily loaded records decode them one by one and pack none of their
+    original subrecords."""
+    dumped = []
+    for top in mod_file.tops.itervalues():
+        for record in top.iter_records():
+            mel_set = getattr(record, "melSet", None)
+            for attr in mel_set.getSlotsUsed() if mel_set else ():
+                getattr(record, attr, None)
+            record.setChanged()
+            record.getSize()
+            dumped.append((record.recType, record.fid, record.data))
+    return dumped
+
+
+def _time_best(repeat, setup, timed):
+    """Calls timed(setup()) repeat times and returns the best time and the
+    last result."""
+    best = None
+    for x in xrange(repeat):
+        setup_result = setup()
+        start = default_timer()
+        result = timed(setup_result)
+        elapsed = default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def benchmark_game(game_name, args, output_dir):
+    """Generates a plugin for game_name, benchmarks it and checks that it
+    loads and saves correctly. Returns True if all checks passed."""
+    game = set_game(game_name)
+    from bash import parsers
+    from bash.bolt import GPath
+
+    generator = PluginGenerator(args.records, args.compress_every,
+                                args.localized, args.seed)
+    plugin_path = os.path.join(output_dir, game.fsName.replace(u" ", u"")
+                               + u"Benchmark.esp")
+    num_types, num_records = generator.generate(plugin_path)
+    with open(plugin_path, "rb") as ins:
+        plugin_data = ins.read()
+    LOGGER.info(u"{}: {} records of {} types, {} bytes{}".format(
+        game_name, num_records, num_types, len(plugin_data),
+        u", localized" if generator.localized else u""))
+    plugin_info = PluginInfo(plugin_path)
+    rec_classes = get_record_classes()
+
+    def load(do_unpack, parse_pool=None, lazy_unpack=False):
+        mod_file = parsers.ModFile(plugin_info, parsers.LoadFactory(
+            True, *rec_classes, lazy_unpack=lazy_unpack))
+        mod_file.load(do_unpack, strings_lang=STRINGS_LANGUAGE,
+                      parse_pool=parse_pool)
+        return mod_file
+
+    def save(mod_file, all_changed):
+        if all_changed:
+            for top in mod_file.tops.itervalues():
+                for record in top.iter_records():
+                    record.setChanged()
+        mod_file.save(saved_path)
+        with open(saved_path.s, "rb") as ins:
+            return ins.read() == plugin_data
+
+    def copy_records(mod_file):
+        for top in mod_file.tops.itervalues():
+            for record in top.iter_records():
+                record.getTypeCopy()
+
+    saved_path = GPath(plugin_path + u".saved")
+    repeat = args.repeat
+    timings = [
+        (u"load", _time_best(repeat, lambda: False, load)[0]),
+        (u"load + unpack", _time_best(repeat, lambda: True, load)[0]),
+        (u"convertToLongFids", _time_best(
+            repeat, lambda: load(True), parsers.ModFile.convertToLongFids)[0]),
+        (u"getTypeCopy", _time_best(
+            repeat, lambda: load(True), copy_records)[0]),
+    ]
+    passed = [True]
+
+    def check(result, failure):
+        if not result:
+            LOGGER.error(u"{}: {}".format(game_name, failure))
+            passed[0] = False
+
+    check(check_marker_names(load(True), generator),
+          u"the map markers did not load with their names")
+    check(check_cell_grid(load(True)), u"looking up exterior cells by their "
+          u"grid coordinates did not find the right cells")
+    check(check_eid_index(load(True)),
+          u"looking up records by eid did not find the right records")
+    records = _dump_records(load(True))
+    mod_file = load(True, lazy_unpack=True)
+    check(save(mod_file, False), u"loading lazily did not write the plugin "
+          u"back byte for byte")
+    check(check_marker_names(mod_file, generator), u"loading lazily did not "
+          u"load the map markers with their names")
+    check(_dump_records(mod_file) == records, u"loading lazily did not decode "
+          u"the records like loading eagerly")
+    if args.parse_processes > 0:
+        parse_pool = parsers.make_parse_pool(args.parse_processes)
+        try:
+            parse_time, mod_file = _time_best(
+                repeat, lambda: parse_pool, lambda p: load(True, p))
+            # Groups below _min_parse_size are parsed by this process - send
+            # all of them to the workers to check what those parse
+            min_parse_size = parsers._min_parse_size
+            parsers._min_parse_size = 0
+            try:
+                all_parsed_file = load(True, parse_pool)
+            finally:
+                parsers._min_parse_size = min_parse_size
+        finally:
+            parse_pool.terminate()
+            parse_pool.join()
+        timings.insert(2, (u"load + unpack, {} processes".format(
+            args.parse_processes), parse_time))
+        check(check_marker_names(mod_file, generator), u"loading in {} "
+              u"processes did not load the map markers with their "
+              u"names".format(args.parse_processes))
+        check(save(mod_file, False), u"loading in {} processes did not "
+              u"write the plugin back byte for byte".format(
+            args.parse_processes))
+        check(save(all_parsed_file, False) and _dump_records(
+            all_parsed_file) == records, u"parsing all groups in {} "
+              u"processes did not load the plugin like parsing them in "
+              u"one".format(args.parse_processes))
+    for label, all_changed in ((u"save", False),
+                               (u"save all changed", True)):
+        save_time, saved_identical = _time_best(
+            repeat, lambda: load(True), lambda m: save(m, all_changed))
+        timings.append((label, save_time))
+        if all_changed and generator.localized:
+            # Wrye Bash can't write localized strings, they get inlined
+            continue
+        check(saved_identical, u"'{}' did not write the plugin back byte "
+              u"for byte".format(label))
+    for label, seconds in timings:
+        LOGGER.info(u"  {:<28} {:8.3f}s {:10.0f} records/s".format(
+            label, seconds, num_records / seconds if seconds else 0))
+    return passed[0]
+
+
+def main(args):
+    utils.setup_log(LOGGER, verbosity=args.verbosity, logfile=args.logfile)
+    # No GUI means no translations - install the same fallback localize uses
+    gettext.NullTranslations().install(unicode=True)
+    games = args.games or get_benchmarked_games()
+    output_dir = args.output_dir or tempfile.mkdtemp()
+    try:
+        if len(games) == 1:
+            return 0 if benchmark_game(games[0], args, output_dir) else 1
+        # The game can only be set once per process, run one per game
+        failed = []
+        for game_name in games:
+            game_args = [sys.executable, os.path.abspath(__file__),
+                         u"--game", game_name, u"--output-dir", output_dir,
+                         u"--logfile", args.logfile]
+            game_args.extend(a for a in sys.argv[1:] if a not in (
+                u"--game", u"-g", u"--output-dir", u"-o", u"--logfile",
+                u"-l") and a not in games and a not in (
+                args.output_dir, args.logfile))
+            if subprocess.call(game_args):
+                failed.append(game_name)
+        if failed:
+            LOGGER.error(u"Failed: {}".format(u", ".join(failed)))
+        return 1 if failed else 0
+    finally:
+        if not args.output_dir:
+            shutil.rmtree(output_dir)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    utils.setup_common_parser(argparser)
+    setup_parser(argparser)
+    parsed_args = argparser.parse_args()
+    sys.exit(main(parsed_args))